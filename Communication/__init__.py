@@ -0,0 +1,4 @@
+"""Code for talking to the surface computer.
+
+See ``Documentation/surface-to-pi-comms.md`` for a description of the protocol.
+"""
@@ -0,0 +1,142 @@
+"""Run the Pi-side command service.
+
+    python -m Communication [--host 0.0.0.0] [--port 5005] [--surface HOST]
+                            [--telemetry-rate HZ] [--telemetry-sensor ID]... [--telemetry-budget BYTES]
+                            [--worker MODULE[,MODULE...]]... [--link-stats PATH]
+                            [--record PATH [--record-size MB]] [--export DIR] [-v]
+"""
+import argparse
+import asyncio
+import logging
+
+from . import commands, topics, uplink  # noqa: F401  (registers the command specs)
+from .dispatch import build_registry
+from .link import LinkMonitor
+from .profiling import Profiler
+from .protocol import COMMAND_PORT, TELEMETRY_PORT
+from .recorder import FlightRecorder
+from .scheduler import BULK
+from .service import Ticker, poll_sensors, run_periodic, serve
+from .telemetry import TelemetryPublisher
+from .workers import WorkerProcess
+
+log = logging.getLogger('Communication')
+
+
+async def run(args):
+    recorder = None
+    if args.record:
+        recorder = FlightRecorder(args.record, int(args.record_size * (1 << 20)))
+        uplink.surface.recorder = recorder
+        log.info('recording traffic to %s', args.record)
+    if args.surface:
+        uplink.surface.connect(args.surface, args.surface_port)
+        log.info('sending to the surface at %s:%d', args.surface, args.surface_port)
+    uplink.surface.attach(asyncio.get_running_loop())
+    uplink.surface.scheduler.limit(BULK, args.telemetry_budget)
+    registry = build_registry()
+    for name, owner in registry.describe():
+        log.info('%s -> %s', name, owner)
+    handlers = registry.handlers
+    workers = [WorkerProcess(modules.split(',')) for modules in args.worker]
+    for worker in workers:
+        handlers = worker.forwarders(registry, handlers)
+        worker.start()
+        log.info('running %s in process %d', ', '.join(worker.modules), worker.process.pid)
+    link = LinkMonitor(uplink.surface, args.heartbeat_interval)
+    profiler = Profiler(uplink.surface.send)
+    transport, _ = await serve(handlers, args.host, args.port, acknowledge=uplink.surface.send,
+                               heartbeat=link.echo, profiler=profiler, recorder=recorder)
+    log.info('listening on %s:%d', args.host, args.port)
+
+    from Peripherals.Motors import setpoints
+    from Peripherals.Sensors import sampling
+
+    publisher = None
+    if args.telemetry_rate:
+        sensors = args.telemetry_sensor or sorted(sampling.buffers)
+        for sensor in set(sensors) - set(sampling.buffers):
+            log.warning('no sensor %d to send in telemetry', sensor)
+        publisher = TelemetryPublisher({sensor: sampling.buffers[sensor] for sensor in sensors
+                                        if sensor in sampling.buffers}, uplink.surface, args.telemetry_rate)
+        log.info('sending %d telemetry channels at %g Hz', len(publisher.layout), publisher.rate)
+    else:
+        log.info('telemetry is off')
+    exporter = None
+    if args.export:
+        from Peripherals.Sensors.export import ColumnarExporter
+
+        exporter = ColumnarExporter(sampling.buffers, args.export)
+        exporter.start()
+        log.info('exporting sensor samples to %s', args.export)
+    tasks = [asyncio.ensure_future(worker.run()) for worker in workers]
+    tickers = [Ticker(func, rate) for func, rate in registry.periodic]
+    tasks.append(asyncio.ensure_future(run_periodic(tickers)))
+    tasks.append(asyncio.ensure_future(poll_sensors()))
+    tasks.append(asyncio.ensure_future(topics.publisher.run()))
+    tasks.append(asyncio.ensure_future(link.run(path=args.link_stats)))
+    if publisher is not None:
+        tasks.append(asyncio.ensure_future(publisher.run()))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        transport.close()
+        for task in tasks:
+            task.cancel()
+        for ticker in tickers:
+            log.info('%s', ticker.describe())
+        for line in setpoints.report(registry.modules):
+            log.info('%s', line)
+        log.info('%s', link.describe())
+        for line in profiler.describe():
+            log.info('%s', line)
+        for worker in workers:
+            worker.stop()
+        if exporter is not None:
+            exporter.stop()
+            log.info('%s', exporter.describe())
+        if recorder is not None:
+            uplink.surface.recorder = None
+            recorder.close()
+            log.info('recorded %d frames to %s, %d dropped', recorder.records, args.record, recorder.dropped)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Receive commands from the surface computer.')
+    parser.add_argument('--host', default='0.0.0.0', help='address to listen on (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=COMMAND_PORT, help='port to listen on (default: %(default)s)')
+    parser.add_argument('--surface', help='address of the surface computer to send telemetry to')
+    parser.add_argument('--surface-port', type=int, default=TELEMETRY_PORT,
+                        help='port the surface computer listens on (default: %(default)s)')
+    parser.add_argument('--telemetry-rate', type=float, default=10,
+                        help='telemetry frames per second, 0 for none (default: %(default)s)')
+    parser.add_argument('--telemetry-sensor', type=int, action='append', metavar='ID',
+                        help='send only this sensor in telemetry, so the others are only polled when subscribed '
+                             'to; may be repeated (default: every sensor)')
+    parser.add_argument('--telemetry-budget', type=float, default=32000,
+                        help='bytes per second telemetry may use on the tether (default: %(default)s)')
+    parser.add_argument('--worker', action='append', default=[], metavar='MODULE[,MODULE...]',
+                        help='run these peripheral modules in a worker process; may be repeated')
+    parser.add_argument('--heartbeat-interval', type=float, default=0.2,
+                        help='seconds between heartbeats to the surface (default: %(default)s)')
+    parser.add_argument('--link-stats', metavar='PATH',
+                        help='write link statistics to this Prometheus text file every second')
+    parser.add_argument('--record', metavar='PATH',
+                        help='record all traffic to this flight recorder log (see Communication.replay)')
+    parser.add_argument('--record-size', type=float, default=64, metavar='MB',
+                        help='size the flight recorder log is preallocated to (default: %(default)s)')
+    parser.add_argument('--export', metavar='DIR',
+                        help='write every sensor sample to compressed column files in this directory')
+    parser.add_argument('-v', '--verbose', action='store_true', help='log every command')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format='%(asctime)s %(name)s %(levelname)s: %(message)s')
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,4 @@
+"""Benchmarks for the communication stack.
+
+Each module can be run directly, e.g. ``python -m Communication.benchmarks.codec``.
+"""
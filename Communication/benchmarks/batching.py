@@ -0,0 +1,71 @@
+"""Compare batched and unbatched command throughput over a loopback socket.
+
+    python -m Communication.benchmarks.batching [--batch 8] [--count 20000]
+
+The same commands are sent either one per datagram or ``--batch`` per batch
+frame, received on a loopback UDP socket and dispatched through
+:class:`~Communication.service.CommandProtocol` to no-op handlers.  Sending
+and receiving alternate in windows small enough to fit in the socket buffer,
+so no datagrams are dropped and the numbers are repeatable.
+"""
+import argparse
+import asyncio
+import socket
+import time
+
+from . import traffic
+from ..protocol import encode_batch, registered_specs
+from ..service import CommandProtocol
+
+WINDOW = 64
+
+
+def throughput(datagrams, commands):
+    """Return commands/sec for sending and dispatching ``datagrams``."""
+    protocol = CommandProtocol({spec.opcode: lambda *values: None for spec in registered_specs()})
+    protocol.connection_made(None)
+
+    rx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    rx.bind(('127.0.0.1', 0))
+    tx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    tx.connect(rx.getsockname())
+    try:
+        start = time.perf_counter()
+        for first in range(0, len(datagrams), WINDOW):
+            window = datagrams[first:first + WINDOW]
+            for datagram in window:
+                tx.send(datagram)
+            for _ in window:
+                data, addr = rx.recvfrom(2048)
+                protocol.datagram_received(data, addr)
+        elapsed = time.perf_counter() - start
+    finally:
+        rx.close()
+        tx.close()
+    return commands / elapsed
+
+
+async def run(frames, batch, repeat):
+    batches = [encode_batch(frames[i:i + batch]) for i in range(0, len(frames), batch)]
+    single = max(throughput(frames, len(frames)) for _ in range(repeat))
+    batched = max(throughput(batches, len(frames)) for _ in range(repeat))
+    return single, batched, len(batches)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    traffic.add_arguments(parser)
+    parser.add_argument('--batch', type=int, default=8, help='commands per batch frame (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per mode, best is reported (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    frames = traffic.load(args)
+    single, batched, datagrams = asyncio.run(run(frames, args.batch, args.repeat))
+    print('{} commands'.format(len(frames)))
+    print('unbatched: {:>10,.0f} commands/sec  ({} datagrams)'.format(single, len(frames)))
+    print('batched:   {:>10,.0f} commands/sec  ({} datagrams of {})'.format(batched, datagrams, args.batch))
+    print('batching is {:.1f}x faster'.format(batched / single))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Compare packets/sec of the struct codec and the Scapy layers.
+
+    python -m Communication.benchmarks.codec [--pcap capture.pcap] [--count N]
+
+Both paths decode the same frames and touch every field value.
+"""
+import argparse
+import time
+
+from . import traffic
+from ..protocol import decode_frame
+
+
+def decode_struct(frames):
+    for frame in frames:
+        decode_frame(frame)
+
+
+def decode_scapy(frames):
+    from ..scapy_layers import Command
+
+    for frame in frames:
+        packet = Command(frame)
+        payload = packet.payload
+        for field in payload.fields_desc:
+            payload.getfieldval(field.name)
+
+
+def rate(decode, frames, repeat):
+    """Return the best packets/sec of ``repeat`` runs of ``decode``."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        decode(frames)
+        best = min(best, time.perf_counter() - start)
+    return len(frames) / best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    traffic.add_arguments(parser)
+    parser.add_argument('--repeat', type=int, default=3, help='runs per codec, best is reported (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    frames = traffic.load(args)
+    print('{} frames'.format(len(frames)))
+    fast = rate(decode_struct, frames, args.repeat)
+    print('struct: {:>12,.0f} packets/sec'.format(fast))
+    slow = rate(decode_scapy, frames, args.repeat)
+    print('scapy:  {:>12,.0f} packets/sec'.format(slow))
+    print('struct is {:.1f}x faster'.format(fast / slow))
+
+
+if __name__ == '__main__':
+    main()
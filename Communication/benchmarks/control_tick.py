@@ -0,0 +1,67 @@
+"""Bus time and tick jitter of the actuator control loop.
+
+    python -m Communication.benchmarks.control_tick [--servos 8] [--rate 200] [--seconds 5]
+
+Streams position setpoints for ``--servos`` servos at ``--rate`` setpoints a
+second each through the simulator, with the servos on a simulated PCA9685
+(``--latency`` per I2C transaction plus ``--channel-time`` per extra
+channel).  Reports how many setpoints were coalesced away, how much bus time
+the batched writes of the control tick used, what the same writes would have
+cost as one transaction per command, and how late the control ticks started.
+"""
+import argparse
+import time
+
+from Peripherals.Motors import Servo
+from Peripherals.backends import SimulatedActuator
+
+from ..commands import SERVO_POSITION
+from ..simulator import Simulator
+from ..surface import Surface
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--servos', type=int, default=8, help='servos to command (default: %(default)s)')
+    parser.add_argument('--rate', type=float, default=200,
+                        help='setpoints per second sent to each servo (default: %(default)s)')
+    parser.add_argument('--seconds', type=float, default=5, help='how long to run (default: %(default)s)')
+    parser.add_argument('--latency', type=float, default=0.00015,
+                        help='seconds per I2C transaction (default: %(default)s)')
+    parser.add_argument('--channel-time', type=float, default=0.00009,
+                        help='seconds per extra channel in a transaction (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    surface = Surface(listen=('127.0.0.1', 0))
+    simulator = Simulator(telemetry_rate=10)
+    surface.pi = simulator.start(surface.address)
+    backend = Servo.backend = SimulatedActuator(args.latency, channel_time=args.channel_time)
+    setpoints = Servo.setpoints
+    received, dropped = setpoints.received, setpoints.dropped
+    try:
+        period = 1.0 / args.rate
+        start = time.monotonic()
+        for tick in range(int(args.seconds * args.rate)):
+            delay = start + tick * period - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            surface.send_batch([(SERVO_POSITION, (servo, 1000 + tick % 1000)) for servo in range(args.servos)])
+        time.sleep(0.1)
+        elapsed = time.monotonic() - start
+    finally:
+        simulator.stop()
+        surface.close()
+
+    received, dropped = setpoints.received - received, setpoints.dropped - dropped
+    print('{:,} setpoints received, {:,} coalesced away ({:.0%})'.format(
+        received, dropped, dropped / received if received else 0))
+    print('{:,} channel writes in {:,} bus transactions'.format(backend.writes, backend.transactions))
+    unbatched = received * args.latency
+    print('bus time: {:.1f} ms/s batched, {:.1f} ms/s with one transaction per command ({:.1f}x)'.format(
+        backend.busy / elapsed * 1e3, unbatched / elapsed * 1e3, unbatched / backend.busy if backend.busy else 0))
+    for ticker in simulator.tickers:
+        print(ticker.describe())
+
+
+if __name__ == '__main__':
+    main()
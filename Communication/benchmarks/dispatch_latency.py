@@ -0,0 +1,84 @@
+"""Dispatch latency of the asyncio command service under a 1 kHz stream.
+
+    python -m Communication.benchmarks.dispatch_latency [--rate 1000] [--seconds 5]
+
+A sender thread paces ``ServoPosition`` frames at ``--rate`` over loopback,
+using the position field as a sequence number.  Every tenth frame is followed
+by a slow ``Gripper`` command (coroutine) and a slow ``MotorThrottle`` command
+(blocking, run in the executor) so the report shows whether slow handlers
+hold up the fast path.  Latency is measured from just before ``sendto`` to
+the moment the servo handler runs.
+"""
+import argparse
+import asyncio
+import socket
+import threading
+import time
+
+from . import stats
+from ..commands import GRIPPER, MOTOR_THROTTLE, SERVO_POSITION
+from ..service import blocking, serve
+
+
+def send_stream(port, rate, count, sent):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    period = 1.0 / rate
+    start = time.perf_counter()
+    for seq in range(count):
+        deadline = start + seq * period
+        delay = deadline - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        sent[seq] = time.perf_counter_ns()
+        sock.sendto(SERVO_POSITION.encode(0, seq), ('127.0.0.1', port))
+        if seq % 10 == 0:
+            sock.sendto(GRIPPER.encode(0, 1), ('127.0.0.1', port))
+            sock.sendto(MOTOR_THROTTLE.encode(0, 0), ('127.0.0.1', port))
+    sock.close()
+
+
+async def run(rate, seconds, slow_ms):
+    count = int(rate * seconds)
+    sent = [0] * count
+    received = [0] * count
+
+    def servo(servo, position):
+        received[position] = time.perf_counter_ns()
+
+    async def gripper(gripper, closed):
+        await asyncio.sleep(slow_ms / 1000.0)
+
+    @blocking
+    def motor(motor, throttle):
+        time.sleep(slow_ms / 1000.0)
+
+    handlers = {SERVO_POSITION.opcode: servo, GRIPPER.opcode: gripper, MOTOR_THROTTLE.opcode: motor}
+    transport, protocol = await serve(handlers, host='127.0.0.1', port=0)
+    port = transport.get_extra_info('sockname')[1]
+
+    sender = threading.Thread(target=send_stream, args=(port, rate, count, sent))
+    sender.start()
+    while sender.is_alive():
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(0.1)
+    await protocol.drain()
+    transport.close()
+
+    return [r - s for s, r in zip(sent, received) if r], count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rate', type=float, default=1000, help='servo commands per second (default: %(default)s)')
+    parser.add_argument('--seconds', type=float, default=5, help='length of the stream (default: %(default)s)')
+    parser.add_argument('--slow-ms', type=float, default=20,
+                        help='duration of the slow handlers (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    latencies, count = asyncio.run(run(args.rate, args.seconds, args.slow_ms))
+    print('{} of {} servo commands dispatched'.format(len(latencies), count))
+    print('dispatch latency: ' + stats.summary(latencies))
+
+
+if __name__ == '__main__':
+    main()
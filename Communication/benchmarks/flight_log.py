@@ -0,0 +1,111 @@
+"""Seeking in and extracting from a flight recorder log, with and without its index.
+
+    python -m Communication.benchmarks.flight_log [--minutes 60]
+
+Records a synthetic dive of ``--minutes`` (servo setpoints at 50 Hz, a
+sensor statistics reply at 20 Hz and heartbeats at 5 Hz, with simulated
+timestamps) and compares finding the records at a given time and pulling out
+every ``SensorStats`` command by a linear scan decoding each record in Python
+against the sparse time index and the command index with a NumPy gather.
+Statistics replies are batches of one ``SensorStats`` per field, as
+:func:`Peripherals.Sensors.stats_frame` sends them.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from .. import recorder
+from ..commands import SENSOR_STATS, SERVO_POSITION
+from ..protocol import BATCH, HEARTBEAT, decode_batch, encode_batch
+from ..recorder import INBOUND, OUTBOUND, FlightLog, FlightRecorder
+
+#: Fields of the sensor whose statistics are requested, like the IMU's six axes.
+FIELDS = 6
+
+
+def stats_reply(i):
+    """Statistics of every field of a sensor, batched like :func:`Peripherals.Sensors.stats_frame`."""
+    return encode_batch(SENSOR_STATS.encode(0, field, 10, i * 0.5, 0.0, i * 1.0, i * 0.25 + field)
+                        for field in range(FIELDS))
+
+#: ``(direction, rate, frame for sample i)`` of the synthetic traffic.
+TRAFFIC = [
+    (INBOUND, 50, lambda i: SERVO_POSITION.encode(i % 4, 1000 + i % 1000)),
+    (OUTBOUND, 20, stats_reply),
+    (OUTBOUND, 5, lambda i: bytes([HEARTBEAT]) + bytes(12)),
+]
+
+
+def record(path, minutes):
+    """Write the synthetic dive to ``path``, returning the number of records."""
+    events = []
+    for direction, rate, frame in TRAFFIC:
+        stamps = np.arange(int(minutes * 60 * rate)) * int(1e9 / rate)
+        events.extend((stamp, direction, frame, i) for i, stamp in enumerate(stamps.tolist()))
+    events.sort(key=lambda event: event[0])
+    frames = [frame(i) for _, _, frame, i in events]
+    size = sum(len(data) + recorder.RECORD.size for data in frames)
+    commands = sum(map(recorder.command_count, frames))
+    now = [1]
+    flight = FlightRecorder(path, size + recorder.index_size(len(events), commands) + recorder.FILE_HEADER.size,
+                            clock=lambda: now[0])
+    for (stamp, direction, _, _), data in zip(events, frames):
+        now[0] = stamp + 1
+        flight.record(direction, data)
+    flight.close()
+    return len(events)
+
+
+def scan_seek(flight, timestamp):
+    for stamp, _, _ in flight.read():
+        if stamp >= timestamp:
+            return stamp
+
+
+def scan_extract(flight):
+    rows = []
+    for stamp, direction, frame in flight.read():
+        if direction != OUTBOUND:
+            continue
+        if frame[0] == BATCH:
+            rows.extend((stamp,) + values for spec, values in decode_batch(frame) if spec is SENSOR_STATS)
+        elif frame[0] == SENSOR_STATS.opcode and len(frame) == SENSOR_STATS.size:
+            rows.append((stamp,) + SENSOR_STATS.decode(frame))
+    return rows
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--minutes', type=float, default=60, help='length of the synthetic dive (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'dive.log')
+        records = record(path, args.minutes)
+        flight = FlightLog(path)
+        target = int(args.minutes * 60e9 * 0.9)
+        print('{:,} records, {:.1f} MB'.format(records, os.path.getsize(path) / 1e6))
+        scan, found = timed(scan_seek, flight, target)
+        indexed, offset = timed(flight.seek, target)
+        assert next(flight.read(target))[0] == found
+        print('{:<28}  scan {:>8.1f} ms   index {:>8.3f} ms'.format('seek to 90%', scan * 1e3, indexed * 1e3))
+        scan, rows = timed(scan_extract, flight)
+        indexed, table = timed(flight.extract, SENSOR_STATS, OUTBOUND)
+        assert len(rows) == len(table) and rows[-1][-1] == table['last'][-1]
+        print('{:<28}  scan {:>8.1f} ms   index {:>8.3f} ms'.format(
+            'extract {:,} SensorStats'.format(len(table)), scan * 1e3, indexed * 1e3))
+        del table
+        flight.close()
+
+
+if __name__ == '__main__':
+    main()
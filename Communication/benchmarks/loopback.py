@@ -0,0 +1,129 @@
+"""End-to-end benchmark of the surface to Pi path in the loopback simulator.
+
+    python -m Communication.benchmarks.loopback [--rate 1000] [--seconds 5] [--count 50000] [--profile]
+
+Reports, for the full path (surface socket, UDP, the Pi's receive loop,
+dispatch and the peripheral handlers):
+
+- throughput in commands/sec received by the Pi, sending in windows as fast
+  as it keeps up, and the share of frames lost on the way,
+- end-to-end latency percentiles for a paced stream of ``--rate`` commands
+  per second, from ``sendto`` on the surface to the handler finishing, and
+- CPU time per command of the Pi-side thread.
+
+Add ``--batch N`` to send commands in batch frames of N, and e.g.
+``--actuator-latency 0.0003`` to see what slow peripherals do to the whole
+pipeline.  ``--profile`` switches on dispatch profiling from the surface
+(see :mod:`Communication.profiling`) for both runs and prints the Pi's
+per-opcode report, which also shows what profiling costs.
+"""
+import argparse
+import time
+
+from . import stats
+from .. import profiling
+from ..commands import HANDLER_PROFILE, PROFILE, SERVO_POSITION
+from ..protocol import encode_batch
+from ..simulator import Simulator, add_arguments, backend_options
+from ..surface import Surface
+
+WINDOW = 32
+
+
+def wait_for(simulator, count, timeout=1.0):
+    deadline = time.monotonic() + timeout
+    while simulator.protocol.received < count and time.monotonic() < deadline:
+        time.sleep(0)
+
+
+def throughput(surface, simulator, count, batch):
+    """Return ``(commands/sec received, fraction of frames lost, Pi CPU seconds per command received)``."""
+    frames = [SERVO_POSITION.encode(1, seq & 0xFFFF) for seq in range(count)]
+    if batch > 1:
+        frames = [encode_batch(frames[i:i + batch]) for i in range(0, count, batch)]
+    start_received = simulator.protocol.received
+    start_cpu = simulator.cpu_time()
+    start = time.perf_counter()
+    for first in range(0, len(frames), WINDOW):
+        for frame in frames[first:first + WINDOW]:
+            surface.send_frame(frame)
+        wait_for(simulator, start_received + min(first + WINDOW, len(frames)))
+    elapsed = time.perf_counter() - start
+    frames_received = simulator.protocol.received - start_received
+    received = min(frames_received * batch, count)
+    return (received / elapsed, 1.0 - frames_received / float(len(frames)),
+            (simulator.cpu_time() - start_cpu) / max(received, 1))
+
+
+def latency(surface, simulator, rate, seconds):
+    """Return end-to-end latencies in nanoseconds of a paced stream."""
+    count = min(int(rate * seconds), 0x10000)
+    sent = [0] * count
+    simulator.dispatched.clear()
+    period = 1.0 / rate
+    start = time.perf_counter()
+    for seq in range(count):
+        delay = start + seq * period - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        sent[seq] = time.perf_counter_ns()
+        surface.send(SERVO_POSITION, 0, seq)
+    time.sleep(0.2)
+    return [done - sent[values[1]] for opcode, values, done in list(simulator.dispatched)
+            if opcode == SERVO_POSITION.opcode and values[0] == 0]
+
+
+def receive_profile(surface, timeout=2.0):
+    """Return the values of the ``HandlerProfile`` frames the Pi sends back."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        received = surface.receive(timeout=deadline - time.monotonic())
+        if received is None:
+            break
+        kind, data = received
+        if kind == 'commands':
+            report = [values for spec, values in data if spec is HANDLER_PROFILE]
+            if report:
+                return report
+    return []
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rate', type=float, default=1000, help='paced commands per second (default: %(default)s)')
+    parser.add_argument('--seconds', type=float, default=5, help='length of the paced stream (default: %(default)s)')
+    parser.add_argument('--count', type=int, default=50000,
+                        help='commands for the throughput run (default: %(default)s)')
+    parser.add_argument('--batch', type=int, default=1,
+                        help='commands per frame in the throughput run (default: %(default)s)')
+    parser.add_argument('--profile', action='store_true', help='profile dispatch on the Pi during the runs')
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    surface = Surface(listen=('127.0.0.1', 0))
+    simulator = Simulator(telemetry_rate=10, **backend_options(args))
+    surface.pi = simulator.start(surface.address)
+    report = []
+    try:
+        if args.profile:
+            surface.send(PROFILE, profiling.ON, reliable=True)
+        rate, lost, cpu = throughput(surface, simulator, args.count, args.batch)
+        latencies = latency(surface, simulator, args.rate, args.seconds)
+        if args.profile:
+            surface.send(PROFILE, profiling.OFF, reliable=True)
+            report = receive_profile(surface)
+    finally:
+        simulator.stop()
+        surface.close()
+
+    print('throughput:      {:>10,.0f} commands/sec received, {:.2%} of frames lost'.format(rate, lost))
+    print('Pi CPU:          {:>10.1f} us/command'.format(cpu * 1e6))
+    print('end-to-end:      ' + stats.summary(latencies))
+    for values in report:
+        print('  0x{:02X}: {:>7,} runs, parse p50 {:.1f} us, queue p50 {:.1f} us  p99 {:.1f} us, '
+              'run p50 {:.1f} us  p99 {:.1f} us'.format(values[0], values[1], values[2], values[4], values[5],
+                                                      values[6], values[7]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Bytes per command and decode throughput of struct batches and bit-packed frames.
+
+    python -m Communication.benchmarks.packing [--count 20000] [--repeat 3]
+
+Each scenario is a list of datagrams of typical surface traffic, encoded
+once as struct command frames (one per datagram, or batches) and once as
+packed frames.  Bytes per command include 28 bytes of IP and UDP header per
+datagram.  Decoding is timed for struct batches, for packed frames decoded
+in pure Python, and for packed frames with long runs decoded with NumPy.
+"""
+import argparse
+import random
+import time
+
+from ..commands import GRIPPER, MOTOR_THROTTLE, SENSOR_REQUEST, SERVO_POSITION, SUBSCRIBE
+from ..packed import VECTOR_RUN, decode_packed, encode_packed
+from ..protocol import MAX_BATCH, decode, encode_batch
+
+UDP_OVERHEAD = 28
+
+
+def control_tick(rng):
+    """One tick of the pilot's controls: 8 servos, 6 thrusters and a gripper."""
+    return ([(SERVO_POSITION, (servo, rng.randint(1000, 2000))) for servo in range(8)]
+            + [(MOTOR_THROTTLE, (motor, int(rng.gauss(0, 3000)))) for motor in range(6)]
+            + [(GRIPPER, (0, rng.random() < 0.5))])
+
+
+def scenarios(count, seed=0):
+    """Return ``{name: [datagram commands, ...]}`` with about ``count`` commands each."""
+    rng = random.Random(seed)
+    single = []
+    for _ in range(count):
+        choice = rng.random()
+        if choice < 0.6:
+            single.append([(SERVO_POSITION, (rng.randrange(16), rng.randint(1000, 2000)))])
+        elif choice < 0.9:
+            single.append([(MOTOR_THROTTLE, (rng.randrange(8), int(rng.gauss(0, 3000))))])
+        elif choice < 0.95:
+            single.append([(SENSOR_REQUEST, (rng.randrange(2), rng.choice([0, 100, 1000])))])
+        else:
+            single.append([(SUBSCRIBE, (rng.randrange(2), rng.choice([0, 10, 50])))])
+    ticks = [control_tick(rng) for _ in range(count // 15)]
+    servos = [[(SERVO_POSITION, (rng.randrange(16), rng.randint(1000, 2000))) for _ in range(MAX_BATCH)]
+              for _ in range(count // MAX_BATCH)]
+    return {'single commands': single, 'control ticks (15)': ticks, 'servo runs (255)': servos}
+
+
+def struct_frame(commands):
+    """A lone command as its own frame, several as a batch."""
+    if len(commands) == 1:
+        spec, values = commands[0]
+        return spec.encode(*values)
+    return encode_batch(spec.encode(*values) for spec, values in commands)
+
+
+def rate(decode, frames, commands, repeat):
+    """Return the best commands/sec of ``repeat`` runs of ``decode`` over ``frames``."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for frame in frames:
+            decode(frame)
+        best = min(best, time.perf_counter() - start)
+    return commands / best
+
+
+def per_command(frames, commands):
+    return sum(len(frame) + UDP_OVERHEAD for frame in frames) / commands, sum(map(len, frames)) / commands
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=20000, help='commands per scenario (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs per decoder, best is reported (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    print('{:<20}  {:>14}  {:>14}  {:>14}  {:>14}  {:>14}'.format(
+        '', 'struct B/cmd', 'packed B/cmd', 'struct cmd/s', 'packed cmd/s', 'NumPy cmd/s'))
+    for name, datagrams in scenarios(args.count).items():
+        commands = sum(map(len, datagrams))
+        plain = [struct_frame(datagram) for datagram in datagrams]
+        packed = [encode_packed(datagram) for datagram in datagrams]
+        for frame, expected in zip(packed, datagrams):
+            assert decode_packed(frame) == expected
+        struct_bytes, struct_payload = per_command(plain, commands)
+        packed_bytes, packed_payload = per_command(packed, commands)
+        print('{:<20}  {:>6.1f} ({:>5.2f})  {:>6.1f} ({:>5.2f})  {:>14,.0f}  {:>14,.0f}  {:>14,.0f}'.format(
+            name, struct_bytes, struct_payload, packed_bytes, packed_payload,
+            rate(decode, plain, commands, args.repeat),
+            rate(lambda frame: decode_packed(frame, vector_run=MAX_BATCH + 1), packed, commands, args.repeat),
+            rate(decode_packed, packed, commands, args.repeat)))
+    print('bytes per command with headers (without); NumPy decodes runs of {} or more'.format(VECTOR_RUN))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Time from a command reaching the Pi to its actuator write, for several bus latencies.
+
+    python -m Communication.benchmarks.peripheral_latency [--latencies 0 0.0001 0.0003 0.001] [--rate 40]
+
+For each simulated actuator write latency (in seconds) the surface sends a
+paced stream of ``Gripper`` commands, which are written as they arrive, and
+of ``ServoPosition`` setpoints, which wait for the next control tick.  The
+Pi stamps every command frame as it is received and every backend write as
+it finishes, and the percentiles of the time between the two are reported
+for each command.  Setpoints replaced before a tick are never written and
+are left out.
+"""
+import argparse
+import collections
+import time
+
+from Peripherals.Motors import Gripper, Servo
+from Peripherals.backends import SimulatedActuator
+
+from . import stats
+from ..commands import GRIPPER, SERVO_POSITION
+from ..protocol import SPECS
+from ..recorder import INBOUND
+from ..simulator import Simulator
+from ..surface import Surface
+
+
+class Receipts(object):
+    """Stands in for the flight recorder to stamp every command frame the Pi receives."""
+
+    def __init__(self):
+        self.stamps = collections.defaultdict(collections.deque)
+
+    def record(self, direction, data):
+        stamp = time.perf_counter_ns()
+        spec = SPECS[data[0]] if direction == INBOUND and len(data) else None
+        if spec is not None and len(data) == spec.size:
+            self.stamps[(spec.opcode,) + spec.decode(data)].append(stamp)
+
+
+class StampedActuator(SimulatedActuator):
+    """Simulated actuator that stamps every channel write as it finishes."""
+
+    def __init__(self, opcode, latency):
+        SimulatedActuator.__init__(self, latency)
+        self.opcode = opcode
+        self.stamps = []
+
+    def write(self, channel, value):
+        SimulatedActuator.write(self, channel, value)
+        self.stamps.append(((self.opcode, channel, value), time.perf_counter_ns()))
+
+    def write_many(self, outputs):
+        SimulatedActuator.write_many(self, outputs)
+        stamp = time.perf_counter_ns()
+        self.stamps.extend(((self.opcode, channel, value), stamp) for channel, value in outputs.items())
+
+
+def latencies(receipts, backend):
+    """Nanoseconds from receipt to write of every command ``backend`` wrote, in order of receipt."""
+    found = []
+    for key, written in backend.stamps:
+        received = receipts.stamps.get(key)
+        if received:
+            found.append(written - received.popleft())
+    return found
+
+
+def run(latency, rate, seconds):
+    """Return ``{command name: latencies}`` with actuator writes taking ``latency`` seconds."""
+    receipts = Receipts()
+    surface = Surface(listen=('127.0.0.1', 0))
+    simulator = Simulator(telemetry_rate=10, sensor_rate=0, actuator_latency=latency, recorder=receipts)
+    surface.pi = simulator.start(surface.address)
+    gripper = Gripper.backend = StampedActuator(GRIPPER.opcode, latency)
+    servo = Servo.backend = StampedActuator(SERVO_POSITION.opcode, latency)
+    try:
+        period = 1.0 / rate
+        start = time.perf_counter()
+        for seq in range(int(rate * seconds)):
+            delay = start + seq * period - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            surface.send(GRIPPER, seq % 16, 1)
+            surface.send(SERVO_POSITION, 0, seq)
+        time.sleep(0.1)
+    finally:
+        simulator.stop()
+        surface.close()
+    return {GRIPPER.name: latencies(receipts, gripper), SERVO_POSITION.name: latencies(receipts, servo)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latencies', type=float, nargs='+', default=[0.0, 0.0001, 0.0003, 0.001],
+                        help='actuator write latencies to try, in seconds (default: %(default)s)')
+    parser.add_argument('--rate', type=float, default=40,
+                        help='commands of each kind per second (default: %(default)s)')
+    parser.add_argument('--seconds', type=float, default=2, help='length of each run (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    for latency in args.latencies:
+        for name, found in run(latency, args.rate, args.seconds).items():
+            print('{:>7.0f} us  {:<14}  {}'.format(latency * 1e6, name, stats.summary(found)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Latency on a shared tether while telemetry floods it, with and without the priority scheduler.
+
+    python -m Communication.benchmarks.priority [--link 125000] [--flood 200000] [--seconds 10]
+
+A discrete-event simulation of the tether as a FIFO of ``--link`` bytes per
+second.  MAVLink sends 40 byte messages at 50 Hz straight onto the link, the
+Pi sends a stop acknowledgement (safety) every 100 ms and floods telemetry at
+``--flood`` bytes per second, more than the link can carry.  Without the
+scheduler all frames go straight onto the link; with it they go through a
+:class:`~Communication.scheduler.PriorityScheduler` whose telemetry budget is
+``--budget``.  Latency is from the moment a frame is produced until its last
+byte leaves the link.
+"""
+import argparse
+
+from . import stats
+from ..commands import STOP
+from ..protocol import TELEMETRY
+from ..scheduler import BULK, PriorityScheduler
+
+STEP = 0.001
+MAVLINK_SIZE = 40
+STOP_SIZE = 8
+TELEMETRY_SIZE = 200
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Link(object):
+    """FIFO link that serializes frames at ``rate`` bytes per second."""
+
+    def __init__(self, rate, clock):
+        self.rate = rate
+        self.clock = clock
+        self.free_at = 0.0
+        self.latencies = {}
+
+    def send(self, kind, size, born):
+        start = max(self.clock(), self.free_at)
+        self.free_at = start + size / self.rate
+        self.latencies.setdefault(kind, []).append((self.free_at - born) * 1e6)
+
+
+def simulate(link_rate, flood, budget, seconds, scheduled):
+    clock = Clock()
+    link = Link(link_rate, clock)
+    # Frames carry a serial number so the time each was produced can be looked up.
+    born = {}
+
+    def produce(opcode, size, serial):
+        frame = bytes([opcode]) + serial.to_bytes(4, 'big') + bytes(size - 5)
+        born[frame] = clock.now
+        return frame
+
+    def transmit(frame):
+        kind = 'safety' if frame[0] == STOP.opcode else 'telemetry'
+        link.send(kind, len(frame), born.pop(frame))
+
+    scheduler = PriorityScheduler(transmit, clock=clock)
+    scheduler.limit(BULK, budget)
+
+    telemetry_per_step = flood * STEP / TELEMETRY_SIZE
+    owed = 0.0
+    serial = 0
+    for step in range(int(seconds / STEP)):
+        clock.now = step * STEP
+        if step % 20 == 0:
+            link.send('mavlink', MAVLINK_SIZE, clock.now)
+        frames = []
+        if step % 100 == 0:
+            frames.append(produce(STOP.opcode, STOP_SIZE, serial))
+            serial += 1
+        owed += telemetry_per_step
+        while owed >= 1:
+            frames.append(produce(TELEMETRY, TELEMETRY_SIZE, serial))
+            serial += 1
+            owed -= 1
+        for frame in frames:
+            if scheduled:
+                scheduler.submit(frame)
+            else:
+                transmit(frame)
+        if scheduled:
+            scheduler.flush()
+    return link.latencies, scheduler.dropped[BULK] if scheduled else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--link', type=float, default=125000, help='tether bytes per second (default: %(default)s)')
+    parser.add_argument('--flood', type=float, default=200000,
+                        help='telemetry bytes per second produced (default: %(default)s)')
+    parser.add_argument('--budget', type=float, default=32000,
+                        help='telemetry budget of the scheduler in bytes per second (default: %(default)s)')
+    parser.add_argument('--seconds', type=float, default=10, help='simulated time (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    for scheduled in (False, True):
+        latencies, dropped = simulate(args.link, args.flood, args.budget, args.seconds, scheduled)
+        print('with scheduler' if scheduled else 'without scheduler')
+        for kind in ('mavlink', 'safety', 'telemetry'):
+            print('  {:<10} {}'.format(kind, stats.summary(latencies.get(kind, []), scale=1e-3, unit='ms')))
+        if scheduled:
+            print('  {} stale telemetry frames dropped'.format(dropped))
+
+
+if __name__ == '__main__':
+    main()
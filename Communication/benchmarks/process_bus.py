@@ -0,0 +1,176 @@
+"""Latency and throughput of handing commands to a peripheral worker process.
+
+    python -m Communication.benchmarks.process_bus [--count 20000] [--window 64] [--work-us 0]
+
+Compares three ways of getting a frame to the code that handles it and an
+answer back:
+
+- ``in-process``: a direct call, as when the handler runs in the
+  Communication process,
+- ``pipe``: a ``multiprocessing.Pipe`` to a worker process, and
+- ``shm``: a pair of :class:`~Communication.shm.SharedRing` buffers to a
+  worker process, as used by :mod:`Communication.workers`.
+
+The handler decodes the frame, spends ``--work-us`` of CPU (standing in for a
+sensor filter) and echoes the frame back.  Round-trip latency is measured one
+frame at a time; throughput keeps up to ``--window`` frames in flight, which
+is where a worker on another core overlaps its work with the sender's.
+"""
+import argparse
+import collections
+import multiprocessing
+import os
+import time
+
+from . import stats
+from ..commands import SERVO_POSITION
+from ..protocol import decode_frame
+from ..shm import SharedRing
+
+
+def handle(frame, work):
+    decode_frame(frame)
+    if work:
+        end = time.perf_counter() + work
+        while time.perf_counter() < end:
+            pass
+
+
+def echo_pipe(conn, work):
+    while True:
+        frame = conn.recv_bytes()
+        if not frame:
+            break
+        handle(frame, work)
+        conn.send_bytes(frame)
+
+
+def echo_ring(requests_name, requests_lock, replies_name, replies_lock, work, spin, stopped):
+    requests = SharedRing.attach(requests_name, requests_lock)
+    replies = SharedRing.attach(replies_name, replies_lock)
+    while not stopped.is_set():
+        if not requests.wait(0.1, spin):
+            continue
+        view = requests.peek()
+        handle(view, work)
+        while not replies.put(view):
+            pass
+        view.release()
+        requests.advance()
+    requests.close()
+    replies.close()
+
+
+class InProcess(object):
+    def __init__(self, context, work, spin):
+        self.work = work
+        self.replies = collections.deque()
+
+    def send(self, frame):
+        handle(frame, self.work)
+        self.replies.append(frame)
+
+    def receive(self):
+        return self.replies.popleft()
+
+    def close(self):
+        pass
+
+
+class Pipe(object):
+    def __init__(self, context, work, spin):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=echo_pipe, args=(child, work), daemon=True)
+        self.process.start()
+
+    def send(self, frame):
+        self.conn.send_bytes(frame)
+
+    def receive(self):
+        return self.conn.recv_bytes()
+
+    def close(self):
+        self.conn.send_bytes(b'')
+        self.process.join()
+
+
+class Shm(object):
+    def __init__(self, context, work, spin):
+        self.spin = spin
+        self.requests = SharedRing.create(lock=context.Lock())
+        self.replies = SharedRing.create(lock=context.Lock())
+        self.stopped = context.Event()
+        self.process = context.Process(target=echo_ring, daemon=True,
+                                       args=(self.requests.name, self.requests.lock, self.replies.name,
+                                             self.replies.lock, work, spin, self.stopped))
+        self.process.start()
+
+    def send(self, frame):
+        while not self.requests.put(frame):
+            pass
+
+    def receive(self):
+        self.replies.wait(spin=self.spin)
+        return self.replies.get()
+
+    def close(self):
+        self.stopped.set()
+        self.process.join()
+        self.requests.close()
+        self.replies.close()
+
+
+MODES = {'in-process': InProcess, 'pipe': Pipe, 'shm': Shm}
+
+
+def latency(bus, frame, count):
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter_ns()
+        bus.send(frame)
+        bus.receive()
+        samples.append(time.perf_counter_ns() - start)
+    return samples
+
+
+def throughput(bus, frame, count, window):
+    sent = received = 0
+    start = time.perf_counter()
+    while received < count:
+        while sent < count and sent - received < window:
+            bus.send(frame)
+            sent += 1
+        bus.receive()
+        received += 1
+    return count / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=20000, help='frames per measurement (default: %(default)s)')
+    parser.add_argument('--window', type=int, default=64,
+                        help='frames in flight for the throughput run (default: %(default)s)')
+    parser.add_argument('--work-us', type=float, default=0.0,
+                        help='CPU time the handler spends per frame, in microseconds (default: %(default)s)')
+    parser.add_argument('--spin', type=int, default=2000 if os.cpu_count() > 1 else 0,
+                        help='checks of a shared ring before sleeping (default: %(default)s)')
+    parser.add_argument('--modes', nargs='+', choices=sorted(MODES), default=list(MODES),
+                        help='transports to measure (default: all)')
+    args = parser.parse_args(argv)
+
+    context = multiprocessing.get_context('spawn')
+    frame = SERVO_POSITION.encode(0, 1500)
+    for mode in args.modes:
+        bus = MODES[mode](context, args.work_us * 1e-6, args.spin)
+        try:
+            latency(bus, frame, min(args.count, 1000))  # warm up
+            samples = latency(bus, frame, args.count)
+            rate = throughput(bus, frame, args.count, args.window)
+        finally:
+            bus.close()
+        print('{:<10}  round trip {}'.format(mode, stats.summary(samples)))
+        print('{:<10}  {:,.0f} frames/sec with {} in flight'.format('', rate, args.window))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Delivery of critical commands over a lossy link, with and without the reliable channel.
+
+    python -m Communication.benchmarks.reliable [--loss 0.1] [--count 500]
+
+Sends ``--count`` commands through the simulator while dropping ``--loss`` of
+the datagrams in each direction, first fire-and-forget and then with
+``reliable=True``.  Each command is a ``ServoPosition`` whose position is its
+index, so the report can check that every command ran exactly once, and
+gives the delivery latency, retransmissions and the retransmission timeout
+the sender settled on.
+"""
+import argparse
+import collections
+import random
+import time
+
+from . import stats
+from ..commands import SERVO_POSITION
+from ..simulator import Simulator
+from ..surface import Surface
+
+
+def lossy(func, loss, rng):
+    def maybe(*args):
+        if rng.random() >= loss:
+            func(*args)
+    return maybe
+
+
+def run(count, loss, reliable, interval, seed=0):
+    rng = random.Random(seed)
+    surface = Surface(listen=('127.0.0.1', 0))
+    simulator = Simulator(telemetry_rate=1, sensor_rate=0)
+    surface.pi = simulator.start(surface.address)
+    sender = surface.reliable
+    sender.transmit = lossy(sender.transmit, loss, rng)
+    sender.ack = lossy(sender.ack, loss, rng)
+    sent = {}
+    try:
+        for index in range(count):
+            sent[index] = time.perf_counter_ns()
+            if reliable:
+                surface.send(SERVO_POSITION, 0, index, reliable=True)
+            elif rng.random() >= loss:
+                surface.send(SERVO_POSITION, 0, index)
+            surface.receive(timeout=interval)
+        deadline = time.monotonic() + 5
+        while sender.pending and time.monotonic() < deadline:
+            surface.receive(timeout=0.01)
+        time.sleep(0.2)
+    finally:
+        simulator.stop()
+        surface.close()
+
+    runs = collections.Counter(values[1] for opcode, values, _ in simulator.dispatched
+                               if opcode == SERVO_POSITION.opcode)
+    latencies = [stamp - sent[values[1]] for opcode, values, stamp in simulator.dispatched
+                 if opcode == SERVO_POSITION.opcode and runs[values[1]] == 1]
+    return runs, latencies, sender
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--loss', type=float, default=0.1, help='fraction of datagrams dropped (default: %(default)s)')
+    parser.add_argument('--count', type=int, default=500, help='commands to send (default: %(default)s)')
+    parser.add_argument('--interval', type=float, default=0.002,
+                        help='seconds between commands (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    for reliable in (False, True):
+        runs, latencies, sender = run(args.count, args.loss, reliable, args.interval)
+        print('{}:'.format('reliable' if reliable else 'fire-and-forget'))
+        print('  ran once {:,}, twice or more {:,}, never {:,}'.format(
+            sum(1 for n in runs.values() if n == 1), sum(1 for n in runs.values() if n > 1),
+            args.count - len(runs)))
+        print('  latency  {}'.format(stats.summary(latencies)))
+        if reliable:
+            print('  {:,} retransmissions, {} given up, srtt {:.0f} us, rto {:.1f} ms'.format(
+                sender.retransmitted, sender.failed, (sender.srtt or 0) * 1e6, sender.rto * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Sample rate of sensors sharing one I2C bus, by how their registers are read.
+
+    python -m Communication.benchmarks.sensor_bus [--clock 400000] [--seconds 2]
+
+Polls a typical set of ROV sensors on a simulated I2C bus (see
+:class:`Peripherals.Sensors.bus.SimulatedBus`) as fast as possible, all of
+them due on every poll, reading
+registers one byte per transaction, one burst read per sensor, and every
+sensor's burst read in one combined transaction, and reports the total sample
+rate each achieves with the same bus clock.
+"""
+import argparse
+import struct
+import time
+
+from Peripherals.Sensors.bus import MODES, BusManager, BusSensor, SimulatedBus
+
+#: ``(name, address, register, struct format)`` of the simulated sensors.
+SENSORS = [
+    ('imu', 0x28, 0x08, '<6h'),
+    ('magnetometer', 0x1E, 0x03, '>3h'),
+    ('depth', 0x76, 0x00, '>I'),
+    ('water temperature', 0x48, 0x00, '>h'),
+    ('leak', 0x49, 0x00, '>H'),
+    ('power', 0x40, 0x01, '>2h'),
+]
+
+
+def rate(mode, clock, overhead, seconds):
+    bus = SimulatedBus(clock, overhead)
+    manager = BusManager(bus, mode)
+    sensors = [BusSensor(manager, address, register, fmt) for _, address, register, fmt in SENSORS]
+    samples = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for sensor in sensors:
+            sensor.expect()
+        for sensor in sensors:
+            sensor.read()
+        samples += len(sensors)
+    elapsed = time.perf_counter() - start
+    return samples / elapsed, bus.transfers / elapsed, bus.busy / elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clock', type=int, default=400000, help='I2C clock in Hz (default: %(default)s)')
+    parser.add_argument('--overhead', type=float, default=0.00005,
+                        help='seconds of fixed cost per transaction (default: %(default)s)')
+    parser.add_argument('--seconds', type=float, default=2, help='how long to poll in each mode (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    print('{} sensors, {} register bytes per poll, {:g} kHz bus'.format(
+        len(SENSORS), sum(struct.calcsize(fmt) for _, _, _, fmt in SENSORS), args.clock / 1e3))
+    print('{:>10}  {:>12}  {:>16}  {:>10}'.format('mode', 'samples/sec', 'transactions/sec', 'bus busy'))
+    for mode in MODES:
+        samples, transfers, busy = rate(mode, args.clock, args.overhead, args.seconds)
+        print('{:>10}  {:>12,.0f}  {:>16,.0f}  {:>9.0%}'.format(mode, samples, transfers, busy))
+
+
+if __name__ == '__main__':
+    main()
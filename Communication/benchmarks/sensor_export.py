@@ -0,0 +1,81 @@
+"""Exporting sensor ring buffers to columnar chunk files while sampling continues.
+
+    python -m Communication.benchmarks.sensor_export [--rate 1000] [--seconds 10]
+
+A sampling thread pushes IMU-like samples (six 16-bit readings scaled to
+float, as :class:`~Peripherals.Sensors.bus.BusSensor` produces) and depth
+samples into ring buffers at ``--rate`` and ``--rate / 10`` Hz while a
+:class:`~Peripherals.Sensors.export.ColumnarExporter` writes them out in the
+background.  The report checks that every sample was exported exactly once,
+and gives the compression achieved, the exporter's CPU time and the time to
+load one column back.
+"""
+import argparse
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from Peripherals.Sensors import export
+from Peripherals.Sensors.sampling import RingBuffer
+
+#: ``(sensor, fields, rate divisor)`` of the simulated sensors.
+SENSORS = [
+    (1, ('ax', 'ay', 'az', 'gx', 'gy', 'gz'), 1),
+    (0, ('depth', 'temperature'), 10),
+]
+
+
+def sample(rings, rate, seconds, seed=0):
+    """Push samples into ``rings`` at ``rate`` Hz for ``seconds``, returning how many each got."""
+    rng = np.random.default_rng(seed)
+    pushed = {sensor: 0 for sensor in rings}
+    period = 1.0 / rate
+    start = time.perf_counter()
+    for tick in range(int(rate * seconds)):
+        delay = start + tick * period - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        for sensor, fields, divisor in SENSORS:
+            if tick % divisor == 0:
+                raw = rng.integers(-200, 200, len(fields)) + 1000 * sensor
+                rings[sensor].push(raw * 0.01)
+                pushed[sensor] += 1
+    return pushed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rate', type=float, default=1000, help='IMU samples per second (default: %(default)s)')
+    parser.add_argument('--seconds', type=float, default=10, help='how long to sample (default: %(default)s)')
+    parser.add_argument('--rows', type=int, default=65536, help='samples per chunk file (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    rings = {sensor: RingBuffer(fields) for sensor, fields, _ in SENSORS}
+    with tempfile.TemporaryDirectory() as directory:
+        exporter = export.ColumnarExporter(rings, directory, rows=args.rows, interval=args.seconds / 4)
+        results = []
+        exporter.start()
+        sampler = threading.Thread(target=lambda: results.append(sample(rings, args.rate, args.seconds)))
+        sampler.start()
+        sampler.join()
+        exporter.stop()
+        pushed = results[0]
+
+        raw = sum(pushed[sensor] * (len(fields) + 1) * 8 for sensor, fields, _ in SENSORS)
+        print('{:,} samples pushed, {:,} exported in {} files, {:,} missing'.format(
+            sum(pushed.values()), exporter.samples, exporter.files, exporter.missing))
+        print('{:,} bytes raw, {:,} compressed ({:.1f}x)'.format(raw, exporter.bytes, raw / exporter.bytes))
+        print('exporter CPU {:.1f} ms, {:.2f} us per sample'.format(
+            exporter.cpu * 1e3, exporter.cpu / max(exporter.samples, 1) * 1e6))
+        for sensor, fields, _ in SENSORS:
+            table = export.load(directory, sensor)
+            assert len(table) == pushed[sensor] and (np.diff(table['timestamp']) > 0).all()
+        start = time.perf_counter()
+        table = export.load(directory, 1, fields=['az'])
+        print('load one IMU column of {:,} samples: {:.1f} ms'.format(len(table), (time.perf_counter() - start) * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,17 @@
+"""Small helpers for summarising benchmark samples."""
+
+
+def percentile(samples, pct):
+    """Return the ``pct`` percentile of ``samples`` (nearest rank)."""
+    if not samples:
+        return float('nan')
+    ordered = sorted(samples)
+    rank = int(round(pct / 100.0 * (len(ordered) - 1)))
+    return ordered[rank]
+
+
+def summary(samples, scale=1e-3, unit='us'):
+    """Format p50/p99/max of ``samples`` (nanoseconds by default)."""
+    return 'p50 {:.1f} {unit}  p99 {:.1f} {unit}  max {:.1f} {unit}  (n={})'.format(
+        percentile(samples, 50) * scale, percentile(samples, 99) * scale,
+        max(samples) * scale if samples else float('nan'), len(samples), unit=unit)
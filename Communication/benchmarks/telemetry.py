@@ -0,0 +1,95 @@
+"""Tether bytes/sec of telemetry for a simulated set of 20 sensors.
+
+    python -m Communication.benchmarks.telemetry [--rate 20] [--seconds 60]
+
+Compares three ways of sending the latest value of every sensor each tick:
+one ``SensorStats`` packet per sensor field, one telemetry frame with every
+channel, and one delta-encoded telemetry frame.  Byte counts include the
+28 bytes of IPv4 and UDP headers per datagram.
+"""
+import argparse
+
+import numpy as np
+
+from Peripherals.Sensors.sampling import RingBuffer
+
+from ..commands import SENSOR_STATS
+from ..telemetry import TelemetryPublisher
+
+UDP_OVERHEAD = 28
+
+
+class Counter(object):
+    """Uplink stand-in that only counts what would be sent."""
+
+    def __init__(self):
+        self.packets = 0
+        self.bytes = 0
+
+    def send(self, frame):
+        self.packets += 1
+        self.bytes += len(frame) + UDP_OVERHEAD
+        return True
+
+
+def simulated_sensors(rng):
+    """Return 20 sensors with a mix of noisy, drifting and static channels, and a step function."""
+    buffers = {}
+    kinds = ['imu'] * 2 + ['analog'] * 8 + ['switch'] * 10
+    for sensor, kind in enumerate(kinds):
+        fields = ('ax', 'ay', 'az', 'gx', 'gy', 'gz') if kind == 'imu' else ('value',)
+        buffers[sensor] = RingBuffer(fields, capacity=256)
+    state = rng.normal(size=len(kinds))
+
+    def step(t):
+        for sensor, kind in enumerate(kinds):
+            ring = buffers[sensor]
+            if kind == 'imu':
+                ring.push(rng.normal(0, 0.05, 6), t)
+            elif kind == 'analog':
+                # Slow drift quantized like an ADC reading.
+                state[sensor] += rng.normal(0, 0.002)
+                ring.push(round(state[sensor], 2), t)
+            else:
+                if rng.random() < 0.002:
+                    state[sensor] = not state[sensor] > 0
+                ring.push(float(state[sensor] > 0), t)
+    return buffers, step
+
+
+def run(mode, rate, seconds, deadband, seed=0):
+    rng = np.random.default_rng(seed)
+    buffers, step = simulated_sensors(rng)
+    counter = Counter()
+    publisher = TelemetryPublisher(buffers, counter, rate, deadband=deadband)
+    if mode == 'full':
+        publisher.encoder.keyframe_interval = 1
+    for tick in range(int(rate * seconds)):
+        step(int(tick * 1e9 / rate))
+        if mode == 'per sensor':
+            for sensor in sorted(buffers):
+                stats = buffers[sensor].stats(n=1)
+                for field in range(len(buffers[sensor].fields)):
+                    counter.send(SENSOR_STATS.encode(sensor, field, 1, stats.last[field], stats.last[field],
+                                                     stats.last[field], stats.last[field]))
+        else:
+            publisher.tick()
+    return counter.bytes / seconds, counter.packets / seconds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rate', type=float, default=20, help='telemetry ticks per second (default: %(default)s)')
+    parser.add_argument('--seconds', type=float, default=60, help='simulated time (default: %(default)s)')
+    parser.add_argument('--deadband', type=float, default=0.01,
+                        help='smallest change that is sent in delta mode (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    for mode, deadband in (('per sensor', 0.0), ('full', 0.0), ('delta', 0.0), ('delta', args.deadband)):
+        rate, packets = run(mode, args.rate, args.seconds, deadband)
+        label = mode if mode != 'delta' else 'delta (deadband {:g})'.format(deadband)
+        print('{:<24} {:>9,.0f} bytes/sec  {:>6,.0f} packets/sec'.format(label, rate, packets))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Tether bytes of raw sensor samples versus topics reduced on the Pi.
+
+    python -m Communication.benchmarks.topics [--seconds 10] [--rate 10]
+
+Simulates an IMU polled at 200 Hz and a depth sensor at 50 Hz and sends
+their samples as topics, first with every sample as it is taken (what a raw
+telemetry stream would ship) and then as ``--rate`` Hz means.  Time is
+simulated, so the run is instant and repeatable.  Bytes include 28 bytes of
+IP and UDP header per datagram.
+"""
+import argparse
+
+import numpy as np
+
+from Peripherals.Sensors.sampling import RingBuffer
+
+from .. import topics
+from ..topics import LAST, MEAN, TopicPublisher
+
+UDP_OVERHEAD = 28
+
+#: ``(name, sensor, fields, rate)`` of the simulated sensors.
+SENSORS = [
+    ('imu', 1, 6, 200.0),
+    ('depth', 0, 2, 50.0),
+]
+
+
+class Counter(object):
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+
+    def send(self, frame):
+        self.frames += 1
+        self.bytes += len(frame) + UDP_OVERHEAD
+
+
+def run(seconds, rate, reduction, seed=0):
+    """Return ``(frames, bytes)`` sent per second with topics at ``rate`` Hz, or raw with ``rate=None``."""
+    rng = np.random.default_rng(seed)
+    now = [0.0]
+    uplink = Counter()
+    publisher = TopicPublisher(uplink, clock=lambda: now[0])
+    rings = []
+    for topic, (_, sensor, fields, sensor_rate) in enumerate(SENSORS):
+        ring = RingBuffer(['f{}'.format(field) for field in range(fields)], capacity=4096)
+        rings.append((ring, fields, sensor_rate, [0.0]))
+        publisher.subscribe(topic, sensor, ring, rate or sensor_rate, reduction)
+    step = 0.0005
+    for tick in range(int(seconds / step)):
+        now[0] = tick * step
+        for ring, fields, sensor_rate, due in rings:
+            if due[0] <= now[0]:
+                ring.push(rng.normal(size=fields), int(now[0] * 1e9))
+                due[0] += 1.0 / sensor_rate
+        publisher.tick()
+    for topic in range(len(SENSORS)):
+        publisher.subscribe(topic, None, None, 0)
+    return uplink.frames / seconds, uplink.bytes / seconds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=10, help='simulated seconds (default: %(default)s)')
+    parser.add_argument('--rate', type=float, default=10, help='rate of the reduced topics (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    print('{:<24}  {:>12}  {:>14}'.format('', 'frames/sec', 'bytes/sec'))
+    for name, rate, reduction in [('raw samples', None, LAST),
+                                  ('{:g} Hz {}'.format(args.rate, topics.REDUCTIONS[MEAN]), args.rate, MEAN)]:
+        frames, sent = run(args.seconds, rate, reduction)
+        print('{:<24}  {:>12,.0f}  {:>14,.0f}'.format(name, frames, sent))
+
+
+if __name__ == '__main__':
+    main()
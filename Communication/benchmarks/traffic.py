@@ -0,0 +1,60 @@
+"""Command traffic shared by the benchmarks.
+
+Traffic is either generated deterministically from the registered specs or
+loaded from a pcap captured on the tether, so every codec is measured on the
+same frames.
+"""
+import random
+import struct
+
+from ..commands import surface_commands
+from ..protocol import COMMAND_PORT
+
+
+def random_values(spec, rng):
+    """Return a random value for every field of ``spec``."""
+    values = []
+    for _, fmt in spec.fields:
+        if fmt in 'fd':
+            values.append(rng.uniform(-1000.0, 1000.0))
+            continue
+        bits = struct.calcsize(fmt) * 8
+        if fmt.islower():
+            values.append(rng.randint(-(1 << (bits - 1)), (1 << (bits - 1)) - 1))
+        else:
+            values.append(rng.randint(0, (1 << bits) - 1))
+    return values
+
+
+def synthetic(count, seed=0, specs=None):
+    """Return ``count`` encoded command frames drawn from ``specs``."""
+    rng = random.Random(seed)
+    specs = list(specs or surface_commands())
+    frames = []
+    for _ in range(count):
+        spec = rng.choice(specs)
+        frames.append(spec.encode(*random_values(spec, rng)))
+    return frames
+
+
+def from_pcap(path, port=COMMAND_PORT):
+    """Return the UDP payloads sent to ``port`` in the capture at ``path``."""
+    from scapy.layers.inet import UDP
+    from scapy.utils import rdpcap
+
+    return [bytes(packet[UDP].payload) for packet in rdpcap(path)
+            if UDP in packet and packet[UDP].dport == port]
+
+
+def add_arguments(parser):
+    """Add the traffic selection options to an ``argparse`` parser."""
+    parser.add_argument('--pcap', help='replay command frames from this capture instead of generating them')
+    parser.add_argument('--count', type=int, default=20000, help='number of synthetic frames (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the synthetic traffic (default: %(default)s)')
+
+
+def load(args):
+    """Return the frames selected by :func:`add_arguments` options."""
+    if args.pcap:
+        return from_pcap(args.pcap)
+    return synthetic(args.count, args.seed)
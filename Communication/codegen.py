@@ -0,0 +1,301 @@
+"""Generate the packet modules from :mod:`Communication.schema`.
+
+    python -m Communication.codegen [--check]
+
+Writes :mod:`Communication.commands`, :mod:`Communication.scapy_commands`
+and :mod:`Communication.encoders`.  Everything about a packet's layout is
+worked out here, so the generated modules are plain definitions and
+straight-line functions: nothing walks a field list while a packet is
+encoded or decoded.  With ``--check`` nothing is written, and the exit
+status is 1 if any generated module differs from what the schema gives.
+"""
+import argparse
+import os
+
+from . import schema
+from .packed import PackedSpec
+from .protocol import PacketSpec, ProtocolError
+
+HEADER = '# Generated from Communication/schema.py by python -m Communication.codegen; do not edit.\n'
+
+#: Opcodes from here up are sent by the Pi; only those below get packed codecs and encoders.
+UPLINK_OPCODES = 0x80
+
+#: Names the generated packed codecs use for themselves, which fields must not take.
+RESERVED = frozenset(['data', 'offset', 'end', 'word'])
+
+#: Scapy field class for each struct format character.  Scapy fields are
+#: big-endian, matching :data:`Communication.protocol.BYTE_ORDER`.
+SCAPY_FIELDS = {
+    'b': 'SignedByteField',
+    'B': 'ByteField',
+    'h': 'SignedShortField',
+    'H': 'ShortField',
+    'i': 'SignedIntField',
+    'I': 'IntField',
+    'q': 'SignedLongField',
+    'Q': 'LongField',
+    'f': 'IEEEFloatField',
+    'd': 'IEEEDoubleField',
+}
+
+LINE_LENGTH = 120
+
+
+def wrap(head, items, tail=')'):
+    """Return ``head`` followed by ``items`` separated by commas, wrapped under the first item."""
+    lines = [head]
+    for index, item in enumerate(items):
+        item += tail if index == len(items) - 1 else ','
+        if lines[-1] != head and len(lines[-1]) + 1 + len(item) > LINE_LENGTH:
+            lines.append(' ' * len(head) + item)
+        else:
+            lines[-1] += item if lines[-1] == head else ' ' + item
+    if not items:
+        lines[-1] += tail
+    return '\n'.join(lines)
+
+
+def imports(module, names):
+    line = 'from {} import {}'.format(module, ', '.join(names))
+    return line if len(line) <= LINE_LENGTH else wrap('from {} import ('.format(module), names)
+
+
+def as_tuple(names):
+    return '({},)'.format(names[0]) if len(names) == 1 else '({})'.format(', '.join(names))
+
+
+def specs(packets):
+    """Check ``packets`` and return ``[(packet, spec, packed spec or None), ...]``."""
+    seen = {}
+    checked = []
+    for packet in packets:
+        if packet.opcode in seen:
+            raise ProtocolError('opcode 0x{:02X} is used by both {} and {}'.format(
+                packet.opcode, seen[packet.opcode], packet.name))
+        seen[packet.opcode] = packet.name
+        spec = PacketSpec(packet.name, packet.opcode, [(field.name, field.format) for field in packet.fields])
+        packed = None
+        if packet.opcode < UPLINK_OPCODES:
+            for field in packet.fields:
+                if field.name in RESERVED:
+                    raise ProtocolError('{}.{} is a reserved name'.format(packet.name, field.name))
+            packed = PackedSpec(spec, {field.name: field.packed for field in packet.fields})
+        checked.append((packet, spec, packed))
+    return checked
+
+
+def encoder_source(packet, packed):
+    """Source of the straight-line packed encoder of ``packet``."""
+    names = [field.name for field in packet.fields]
+    conditions = []
+    parts = []
+    for index, shift, mask, sign in packed.fixed:
+        name = names[index]
+        if sign:
+            conditions.append('{} <= {} <= {}'.format(-sign, name, sign - 1))
+            value = '({} & 0x{:X})'.format(name, mask)
+        else:
+            conditions.append('0 <= {} <= 0x{:X}'.format(name, mask))
+            value = name
+        parts.append('{} << {}'.format(value, shift) if shift else value)
+    for index, signed, low, high in packed.varints:
+        conditions.append('{} <= {} <= {}'.format(low, names[index], high))
+    if packed.fixed_size:
+        word = ' | '.join(parts) if len(parts) == 1 and parts[0].isidentifier() else '({})'.format(' | '.join(parts))
+        payload = ["{}.to_bytes({}, 'big')".format(word, packed.fixed_size)]
+    else:
+        payload = ["b''"] if not packed.varints else []
+    for index, signed, low, high in packed.varints:
+        payload.append('encode_varint({})'.format('zigzag({})'.format(names[index]) if signed else names[index]))
+
+    lines = ['def _encode_{}({}):'.format(packet.constant.lower(), ', '.join(names))]
+    if conditions:
+        lines.append('    if not ({}):'.format(' and '.join(conditions)))
+        lines.append('        {}_PACKED.check({})'.format(packet.constant, as_tuple(names)))
+    lines.append('    return {}'.format(' + '.join(payload)))
+    return '\n'.join(lines)
+
+
+def decoder_source(packet, packed):
+    """Source of the straight-line packed decoder of ``packet``."""
+    names = [field.name for field in packet.fields]
+    lines = ['def _decode_{}(data, offset):'.format(packet.constant.lower())]
+    if packed.fixed_size:
+        lines += ['    end = offset + {}'.format(packed.fixed_size),
+                  '    if end > len(data):',
+                  "        raise ProtocolError('{} truncated inside packed frame')".format(packet.name)]
+        if packed.fixed_size == 1:
+            lines.append('    word = data[offset]')
+        else:
+            lines.append("    word = int.from_bytes(data[offset:end], 'big')")
+    elif packed.varints:
+        lines.append('    end = offset')
+    else:
+        return '\n'.join(lines + ['    return (), offset'])
+    for index, shift, mask, sign in packed.fixed:
+        value = 'word >> {}'.format(shift) if shift else 'word'
+        if shift + mask.bit_length() < packed.fixed_size * 8:
+            value += ' & 0x{:X}'.format(mask)
+        lines.append('    {} = {}'.format(names[index], value))
+        if sign:
+            lines += ['    if {} & 0x{:X}:'.format(names[index], sign),
+                      '        {} -= 0x{:X}'.format(names[index], sign << 1)]
+    for index, signed, low, high in packed.varints:
+        name = names[index]
+        lines.append('    {}, end = decode_varint(data, end)'.format(name))
+        if signed:
+            lines.append('    {} = unzigzag({})'.format(name, name))
+            check = 'not {} <= {} <= {}'.format(low, name, high)
+        else:
+            check = '{} > {}'.format(name, high)
+        lines += ['    if {}:'.format(check),
+                  "        raise ProtocolError('{}.{} = {{}} is out of range'.format({}))".format(
+                      packet.name, name, name)]
+    lines.append('    return {}, end'.format(as_tuple(names)))
+    return '\n'.join(lines)
+
+
+def generate_commands(packets):
+    checked = specs(packets)
+    out = [HEADER + '''"""Packets sent between the surface computer and the Pi.
+
+Every packet is described in :mod:`Communication.schema`, which also lists
+the opcode ranges.  This module defines the
+:class:`~Communication.protocol.PacketSpec` of each, which registers it in
+the opcode table the receive loop dispatches from, and gives every command
+the surface sends its bit-packed encoding (see :mod:`Communication.packed`)
+with straight-line functions to encode and decode it.
+"""
+from .packed import decode_varint, encode_varint, pack, unzigzag, zigzag  # noqa: F401
+from .protocol import ProtocolError, define, registered_specs
+
+#: Opcodes from here up (until framing) are sent from the Pi to the surface.
+UPLINK_OPCODES = 0x{:02X}
+'''.format(UPLINK_OPCODES)]
+    group = None
+    for packet, spec, packed in checked:
+        if group is not None and packet.opcode >> 4 != group:
+            out.append('')
+        group = packet.opcode >> 4
+        out.append(wrap('{} = define('.format(packet.constant),
+                        [repr(packet.name), '0x{:02X}'.format(packet.opcode)]
+                        + ['({!r}, {!r})'.format(field.name, field.format) for field in packet.fields]))
+    for packet, spec, packed in checked:
+        if packed is None:
+            continue
+        out.append('\n\n' + encoder_source(packet, packed))
+        out.append('\n\n' + decoder_source(packet, packed))
+        out.append('\n\n' + wrap('{}_PACKED = pack('.format(packet.constant),
+                                 [packet.constant] + ['{}={!r}'.format(field.name, field.packed)
+                                                      for field in packet.fields]))
+        out.append('{0}_PACKED.specialize(_encode_{1}, _decode_{1})'.format(packet.constant, packet.constant.lower()))
+    out.append('''
+
+def surface_commands():
+    """Return the specs of every packet the surface sends to the Pi."""
+    return [spec for spec in registered_specs() if spec.opcode < UPLINK_OPCODES]
+''')
+    return '\n'.join(out)
+
+
+def generate_scapy(packets):
+    checked = specs(packets)
+    fields = sorted(set(SCAPY_FIELDS[field.format] for packet in packets for field in packet.fields))
+    out = [HEADER + '''"""Scapy layers of the packets in :mod:`Communication.schema`.
+
+Use them through :mod:`Communication.scapy_layers`, which binds them under
+its ``Command`` header.
+"""
+''' + imports('scapy.fields', fields) + '''
+from scapy.packet import Packet
+
+
+class FixedSize(Packet):
+    """Base of the packet layers.  Packets have a fixed size; anything after one is the next packet."""
+
+    def extract_padding(self, s):
+        return b'', s
+''']
+    for packet, spec, packed in checked:
+        out.append('\nclass {}(FixedSize):\n    """{}"""\n'.format(packet.name, packet.doc))
+        out.append('    name = {!r}'.format(packet.name))
+        if packet.fields:
+            out.append('    fields_desc = [')
+            out += ['        {}({!r}, 0),'.format(SCAPY_FIELDS[field.format], field.name) for field in packet.fields]
+            out.append('    ]\n')
+        else:
+            out.append('    fields_desc = []\n')
+    out.append('\n#: Scapy layer for each packet, keyed by its name.\nlayers = {')
+    out += ['    {!r}: {},'.format(packet.name, packet.name) for packet in packets]
+    out.append('}\n')
+    return '\n'.join(out)
+
+
+def generate_encoders(packets):
+    checked = [(packet, spec) for packet, spec, packed in specs(packets) if packed is not None]
+    out = [HEADER + '''"""Surface-side encoders, one function per command the surface sends.
+
+Each returns the full frame, e.g.::
+
+    surface.send_frame(encoders.servo_position(2, 1500))
+
+with one precompiled ``struct`` pack, like :meth:`PacketSpec.encode
+<Communication.protocol.PacketSpec.encode>` without looking up the spec.
+"""
+import struct
+
+from .protocol import BYTE_ORDER, ProtocolError
+''']
+    for packet, spec in checked:
+        out.append('_{} = struct.Struct(BYTE_ORDER + {!r})'.format(packet.constant, spec.frame.format[1:]))
+    for packet, spec in checked:
+        names = ', '.join(field.name for field in packet.fields)
+        out.append('''
+
+def {}({}):
+    """{}"""
+    try:
+        return _{}.pack(0x{:02X}{})
+    except struct.error as err:
+        raise ProtocolError('cannot encode {}: {{}}'.format(err))'''.format(
+            packet.constant.lower(), names, packet.doc, packet.constant, packet.opcode,
+            ', ' + names if names else '', packet.name))
+    return '\n'.join(out) + '\n'
+
+
+#: Generated modules and the functions that generate them.
+OUTPUTS = [
+    ('commands.py', generate_commands),
+    ('scapy_commands.py', generate_scapy),
+    ('encoders.py', generate_encoders),
+]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--check', action='store_true', help='only check that the generated modules are up to date')
+    args = parser.parse_args(argv)
+
+    stale = []
+    for name, generate in OUTPUTS:
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+        source = generate(schema.PACKETS)
+        try:
+            with open(path) as f:
+                current = f.read()
+        except FileNotFoundError:
+            current = None
+        if current == source:
+            continue
+        stale.append(name)
+        if not args.check:
+            with open(path, 'w') as f:
+                f.write(source)
+            print('wrote {}'.format(path))
+    if args.check and stale:
+        parser.exit(1, 'out of date, run python -m Communication.codegen: {}\n'.format(', '.join(stale)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+# Generated from Communication/schema.py by python -m Communication.codegen; do not edit.
+"""Packets sent between the surface computer and the Pi.
+
+Every packet is described in :mod:`Communication.schema`, which also lists
+the opcode ranges.  This module defines the
+:class:`~Communication.protocol.PacketSpec` of each, which registers it in
+the opcode table the receive loop dispatches from, and gives every command
+the surface sends its bit-packed encoding (see :mod:`Communication.packed`)
+with straight-line functions to encode and decode it.
+"""
+from .packed import decode_varint, encode_varint, pack, unzigzag, zigzag  # noqa: F401
+from .protocol import ProtocolError, define, registered_specs
+
+#: Opcodes from here up (until framing) are sent from the Pi to the surface.
+UPLINK_OPCODES = 0x80
+
+STOP = define('Stop', 0x01)
+
+SERVO_POSITION = define('ServoPosition', 0x10, ('servo', 'B'), ('position', 'H'))
+MOTOR_THROTTLE = define('MotorThrottle', 0x11, ('motor', 'B'), ('throttle', 'h'))
+GRIPPER = define('Gripper', 0x12, ('gripper', 'B'), ('closed', 'B'))
+MARKER_RELEASE = define('MarkerRelease', 0x13, ('marker', 'B'))
+
+SENSOR_REQUEST = define('SensorRequest', 0x30, ('sensor', 'B'), ('window_ms', 'H'))
+SUBSCRIBE = define('Subscribe', 0x31, ('sensor', 'B'), ('rate', 'H'))
+SUBSCRIBE_TOPIC = define('SubscribeTopic', 0x32, ('topic', 'B'), ('sensor', 'B'), ('rate', 'H'), ('reduction', 'B'))
+
+PROFILE = define('Profile', 0x50, ('mode', 'B'))
+
+SENSOR_STATS = define('SensorStats', 0x80, ('sensor', 'B'), ('field', 'B'), ('count', 'I'), ('mean', 'f'), ('min', 'f'),
+                      ('max', 'f'), ('last', 'f'))
+LINK_STATS = define('LinkStats', 0x83, ('heartbeats', 'I'), ('lost', 'I'), ('late', 'I'), ('reordered', 'I'),
+                    ('rtt_p50_us', 'f'), ('rtt_p99_us', 'f'), ('jitter_us', 'f'), ('queue_depth', 'H'),
+                    ('queue_peak', 'H'))
+HANDLER_PROFILE = define('HandlerProfile', 0x84, ('opcode', 'B'), ('count', 'I'), ('parse_p50_us', 'f'),
+                         ('parse_p99_us', 'f'), ('queue_p50_us', 'f'), ('queue_p99_us', 'f'), ('run_p50_us', 'f'),
+                         ('run_p99_us', 'f'), ('run_max_us', 'f'))
+
+
+def _encode_stop():
+    return b''
+
+
+def _decode_stop(data, offset):
+    return (), offset
+
+
+STOP_PACKED = pack(STOP)
+STOP_PACKED.specialize(_encode_stop, _decode_stop)
+
+
+def _encode_servo_position(servo, position):
+    if not (0 <= servo <= 0xF and 0 <= position <= 0xFFF):
+        SERVO_POSITION_PACKED.check((servo, position))
+    return (servo << 12 | position).to_bytes(2, 'big')
+
+
+def _decode_servo_position(data, offset):
+    end = offset + 2
+    if end > len(data):
+        raise ProtocolError('ServoPosition truncated inside packed frame')
+    word = int.from_bytes(data[offset:end], 'big')
+    servo = word >> 12
+    position = word & 0xFFF
+    return (servo, position), end
+
+
+SERVO_POSITION_PACKED = pack(SERVO_POSITION, servo='u4', position='u12')
+SERVO_POSITION_PACKED.specialize(_encode_servo_position, _decode_servo_position)
+
+
+def _encode_motor_throttle(motor, throttle):
+    if not (0 <= motor <= 0xF and -32768 <= throttle <= 32767):
+        MOTOR_THROTTLE_PACKED.check((motor, throttle))
+    return (motor << 4).to_bytes(1, 'big') + encode_varint(zigzag(throttle))
+
+
+def _decode_motor_throttle(data, offset):
+    end = offset + 1
+    if end > len(data):
+        raise ProtocolError('MotorThrottle truncated inside packed frame')
+    word = data[offset]
+    motor = word >> 4
+    throttle, end = decode_varint(data, end)
+    throttle = unzigzag(throttle)
+    if not -32768 <= throttle <= 32767:
+        raise ProtocolError('MotorThrottle.throttle = {} is out of range'.format(throttle))
+    return (motor, throttle), end
+
+
+MOTOR_THROTTLE_PACKED = pack(MOTOR_THROTTLE, motor='u4', throttle='ivar')
+MOTOR_THROTTLE_PACKED.specialize(_encode_motor_throttle, _decode_motor_throttle)
+
+
+def _encode_gripper(gripper, closed):
+    if not (0 <= gripper <= 0xF and 0 <= closed <= 0x1):
+        GRIPPER_PACKED.check((gripper, closed))
+    return (gripper << 4 | closed << 3).to_bytes(1, 'big')
+
+
+def _decode_gripper(data, offset):
+    end = offset + 1
+    if end > len(data):
+        raise ProtocolError('Gripper truncated inside packed frame')
+    word = data[offset]
+    gripper = word >> 4
+    closed = word >> 3 & 0x1
+    return (gripper, closed), end
+
+
+GRIPPER_PACKED = pack(GRIPPER, gripper='u4', closed='u1')
+GRIPPER_PACKED.specialize(_encode_gripper, _decode_gripper)
+
+
+def _encode_marker_release(marker):
+    if not (0 <= marker <= 0xFF):
+        MARKER_RELEASE_PACKED.check((marker,))
+    return marker.to_bytes(1, 'big')
+
+
+def _decode_marker_release(data, offset):
+    end = offset + 1
+    if end > len(data):
+        raise ProtocolError('MarkerRelease truncated inside packed frame')
+    word = data[offset]
+    marker = word
+    return (marker,), end
+
+
+MARKER_RELEASE_PACKED = pack(MARKER_RELEASE, marker='u8')
+MARKER_RELEASE_PACKED.specialize(_encode_marker_release, _decode_marker_release)
+
+
+def _encode_sensor_request(sensor, window_ms):
+    if not (0 <= sensor <= 0xFF and 0 <= window_ms <= 65535):
+        SENSOR_REQUEST_PACKED.check((sensor, window_ms))
+    return sensor.to_bytes(1, 'big') + encode_varint(window_ms)
+
+
+def _decode_sensor_request(data, offset):
+    end = offset + 1
+    if end > len(data):
+        raise ProtocolError('SensorRequest truncated inside packed frame')
+    word = data[offset]
+    sensor = word
+    window_ms, end = decode_varint(data, end)
+    if window_ms > 65535:
+        raise ProtocolError('SensorRequest.window_ms = {} is out of range'.format(window_ms))
+    return (sensor, window_ms), end
+
+
+SENSOR_REQUEST_PACKED = pack(SENSOR_REQUEST, sensor='u8', window_ms='uvar')
+SENSOR_REQUEST_PACKED.specialize(_encode_sensor_request, _decode_sensor_request)
+
+
+def _encode_subscribe(sensor, rate):
+    if not (0 <= sensor <= 0xFF and 0 <= rate <= 65535):
+        SUBSCRIBE_PACKED.check((sensor, rate))
+    return sensor.to_bytes(1, 'big') + encode_varint(rate)
+
+
+def _decode_subscribe(data, offset):
+    end = offset + 1
+    if end > len(data):
+        raise ProtocolError('Subscribe truncated inside packed frame')
+    word = data[offset]
+    sensor = word
+    rate, end = decode_varint(data, end)
+    if rate > 65535:
+        raise ProtocolError('Subscribe.rate = {} is out of range'.format(rate))
+    return (sensor, rate), end
+
+
+SUBSCRIBE_PACKED = pack(SUBSCRIBE, sensor='u8', rate='uvar')
+SUBSCRIBE_PACKED.specialize(_encode_subscribe, _decode_subscribe)
+
+
+def _encode_subscribe_topic(topic, sensor, rate, reduction):
+    if not (0 <= topic <= 0xFF and 0 <= sensor <= 0xFF and 0 <= reduction <= 0x3 and 0 <= rate <= 65535):
+        SUBSCRIBE_TOPIC_PACKED.check((topic, sensor, rate, reduction))
+    return (topic << 16 | sensor << 8 | reduction << 6).to_bytes(3, 'big') + encode_varint(rate)
+
+
+def _decode_subscribe_topic(data, offset):
+    end = offset + 3
+    if end > len(data):
+        raise ProtocolError('SubscribeTopic truncated inside packed frame')
+    word = int.from_bytes(data[offset:end], 'big')
+    topic = word >> 16
+    sensor = word >> 8 & 0xFF
+    reduction = word >> 6 & 0x3
+    rate, end = decode_varint(data, end)
+    if rate > 65535:
+        raise ProtocolError('SubscribeTopic.rate = {} is out of range'.format(rate))
+    return (topic, sensor, rate, reduction), end
+
+
+SUBSCRIBE_TOPIC_PACKED = pack(SUBSCRIBE_TOPIC, topic='u8', sensor='u8', rate='uvar', reduction='u2')
+SUBSCRIBE_TOPIC_PACKED.specialize(_encode_subscribe_topic, _decode_subscribe_topic)
+
+
+def _encode_profile(mode):
+    if not (0 <= mode <= 0x3):
+        PROFILE_PACKED.check((mode,))
+    return (mode << 6).to_bytes(1, 'big')
+
+
+def _decode_profile(data, offset):
+    end = offset + 1
+    if end > len(data):
+        raise ProtocolError('Profile truncated inside packed frame')
+    word = data[offset]
+    mode = word >> 6
+    return (mode,), end
+
+
+PROFILE_PACKED = pack(PROFILE, mode='u2')
+PROFILE_PACKED.specialize(_encode_profile, _decode_profile)
+
+
+def surface_commands():
+    """Return the specs of every packet the surface sends to the Pi."""
+    return [spec for spec in registered_specs() if spec.opcode < UPLINK_OPCODES]
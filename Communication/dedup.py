@@ -0,0 +1,61 @@
+"""Bounded cache of command IDs that have already run.
+
+Retransmission means the Pi can receive the same reliable command more than
+once, e.g. when its acknowledgement is lost.  :class:`DedupCache` remembers
+each ``(session, sequence)`` that ran for ``ttl`` seconds so a retried
+command never runs twice, even if the reliable channel's per-session state
+has been reset in the meantime.
+
+Entries live in a preallocated ring of ``capacity`` slots with a dict from
+key to slot, so a lookup or insert is O(1) and memory is fixed however long
+the Pi runs: adding a key reuses the oldest slot, and an entry older than
+``ttl`` counts as absent.  ``capacity`` should cover ``ttl`` seconds of
+reliable commands at the highest rate the surface sends them;
+:attr:`DedupCache.early` counts entries that had to be overwritten before
+their ``ttl`` ran out.
+"""
+import time
+
+
+class DedupCache(object):
+    """Keys seen in the last ``ttl`` seconds, at most ``capacity`` of them."""
+
+    def __init__(self, capacity=4096, ttl=30.0, clock=time.monotonic):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.clock = clock
+        self.keys = [None] * capacity
+        self.times = [0.0] * capacity
+        self.slots = {}
+        self.head = 0
+        #: Keys that were already present when added.
+        self.hits = 0
+        #: Live entries overwritten before their ``ttl`` ran out.
+        self.early = 0
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, key):
+        slot = self.slots.get(key)
+        return slot is not None and self.clock() - self.times[slot] <= self.ttl
+
+    def add(self, key):
+        """Record ``key``, returning ``False`` if it was already recorded within ``ttl``."""
+        now = self.clock()
+        slot = self.slots.get(key)
+        if slot is not None and now - self.times[slot] <= self.ttl:
+            self.hits += 1
+            return False
+        slot = self.head
+        self.head = (slot + 1) % self.capacity
+        old = self.keys[slot]
+        # The old key may have been re-added since and now live in another slot.
+        if old is not None and self.slots.get(old) == slot:
+            del self.slots[old]
+            if now - self.times[slot] <= self.ttl:
+                self.early += 1
+        self.keys[slot] = key
+        self.times[slot] = now
+        self.slots[key] = slot
+        return True
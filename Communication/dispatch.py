@@ -0,0 +1,118 @@
+"""Registry mapping command opcodes to the peripheral handlers that run them.
+
+Peripheral modules mark their handlers with :func:`handler`::
+
+    from Communication.commands import SERVO_POSITION
+    from Communication.dispatch import handler
+
+    @handler(SERVO_POSITION)
+    def set_position(servo, position):
+        ...
+
+:func:`build_registry` imports the peripheral modules once at startup and
+collects the marked functions into a flat 256 entry table, so routing a
+packet is a single list index rather than a chain of type checks.  Two
+handlers claiming the same opcode is an error at build time.
+
+Functions marked with :func:`periodic` are collected too, for the service
+to call at a fixed rate (see :class:`Communication.service.Ticker`).
+"""
+import importlib
+import pkgutil
+
+from .protocol import SPECS
+
+
+class DispatchError(Exception):
+    """Raised when the handler registry cannot be built."""
+
+
+def handler(command):
+    """Mark the decorated function as the handler for ``command``.
+
+    ``command`` is a :class:`~Communication.protocol.PacketSpec` or a raw
+    opcode.  The decorator may be stacked to handle several commands.
+    """
+    opcode = getattr(command, 'opcode', command)
+
+    def mark(func):
+        func.opcodes = getattr(func, 'opcodes', ()) + (opcode,)
+        return func
+    return mark
+
+
+def periodic(rate):
+    """Mark the decorated function to be called ``rate`` times a second."""
+    def mark(func):
+        func.rate = rate
+        return func
+    return mark
+
+
+def _defined(module):
+    """``(name, function)`` for every callable defined in ``module``, not imported from elsewhere."""
+    return [(name, obj) for name, obj in sorted(vars(module).items())
+            if callable(obj) and getattr(obj, '__module__', None) == module.__name__]
+
+
+class Registry(object):
+    """Opcode to handler table built from a set of modules.
+
+    :attr:`periodic` holds ``(function, rate)`` for every function marked
+    with :func:`periodic`.
+    """
+
+    def __init__(self):
+        self.table = [None] * 256
+        self.owners = [None] * 256
+        self.modules = []
+        self.periodic = []
+
+    def add(self, opcode, func, owner):
+        """Register ``func`` for ``opcode``, failing if it is already taken."""
+        if self.table[opcode] is not None:
+            raise DispatchError('opcode 0x{:02X} is handled by both {} and {}'.format(
+                opcode, self.owners[opcode], owner))
+        self.table[opcode] = func
+        self.owners[opcode] = owner
+
+    def add_module(self, module):
+        """Register every function in ``module`` marked with :func:`handler` or :func:`periodic`."""
+        self.modules.append(module)
+        for name, obj in _defined(module):
+            for opcode in getattr(obj, 'opcodes', ()):
+                self.add(opcode, obj, '{}.{}'.format(module.__name__, name))
+        self.add_periodic(module)
+
+    def add_periodic(self, module):
+        """Register only the functions in ``module`` marked with :func:`periodic`."""
+        for name, obj in _defined(module):
+            if getattr(obj, 'rate', None):
+                self.periodic.append((obj, obj.rate))
+
+    @property
+    def handlers(self):
+        """``{opcode: handler}`` for every registered opcode."""
+        return {opcode: func for opcode, func in enumerate(self.table) if func is not None}
+
+    def describe(self):
+        """Return ``(command name, owner)`` for every registered opcode."""
+        return [(SPECS[opcode].name if SPECS[opcode] else '0x{:02X}'.format(opcode), owner)
+                for opcode, owner in enumerate(self.owners) if owner is not None]
+
+
+def peripheral_modules(package='Peripherals'):
+    """Return the names of ``package`` and every module below it."""
+    root = importlib.import_module(package)
+    names = [package]
+    for info in pkgutil.walk_packages(root.__path__, package + '.'):
+        names.append(info.name)
+    return names
+
+
+def build_registry(modules=None):
+    """Import ``modules`` (all peripheral modules by default) and register their handlers."""
+    registry = Registry()
+    for name in modules if modules is not None else peripheral_modules():
+        registry.add_module(importlib.import_module(name))
+    return registry
@@ -0,0 +1,95 @@
+# Generated from Communication/schema.py by python -m Communication.codegen; do not edit.
+"""Surface-side encoders, one function per command the surface sends.
+
+Each returns the full frame, e.g.::
+
+    surface.send_frame(encoders.servo_position(2, 1500))
+
+with one precompiled ``struct`` pack, like :meth:`PacketSpec.encode
+<Communication.protocol.PacketSpec.encode>` without looking up the spec.
+"""
+import struct
+
+from .protocol import BYTE_ORDER, ProtocolError
+
+_STOP = struct.Struct(BYTE_ORDER + 'B')
+_SERVO_POSITION = struct.Struct(BYTE_ORDER + 'BBH')
+_MOTOR_THROTTLE = struct.Struct(BYTE_ORDER + 'BBh')
+_GRIPPER = struct.Struct(BYTE_ORDER + 'BBB')
+_MARKER_RELEASE = struct.Struct(BYTE_ORDER + 'BB')
+_SENSOR_REQUEST = struct.Struct(BYTE_ORDER + 'BBH')
+_SUBSCRIBE = struct.Struct(BYTE_ORDER + 'BBH')
+_SUBSCRIBE_TOPIC = struct.Struct(BYTE_ORDER + 'BBBHB')
+_PROFILE = struct.Struct(BYTE_ORDER + 'BB')
+
+
+def stop():
+    """Stop every actuator at once."""
+    try:
+        return _STOP.pack(0x01)
+    except struct.error as err:
+        raise ProtocolError('cannot encode Stop: {}'.format(err))
+
+
+def servo_position(servo, position):
+    """Move a servo to a pulse width in microseconds."""
+    try:
+        return _SERVO_POSITION.pack(0x10, servo, position)
+    except struct.error as err:
+        raise ProtocolError('cannot encode ServoPosition: {}'.format(err))
+
+
+def motor_throttle(motor, throttle):
+    """Set an auxiliary motor throttle, from -32768 (full reverse) to 32767."""
+    try:
+        return _MOTOR_THROTTLE.pack(0x11, motor, throttle)
+    except struct.error as err:
+        raise ProtocolError('cannot encode MotorThrottle: {}'.format(err))
+
+
+def gripper(gripper, closed):
+    """Open or close a gripper."""
+    try:
+        return _GRIPPER.pack(0x12, gripper, closed)
+    except struct.error as err:
+        raise ProtocolError('cannot encode Gripper: {}'.format(err))
+
+
+def marker_release(marker):
+    """Release a marker."""
+    try:
+        return _MARKER_RELEASE.pack(0x13, marker)
+    except struct.error as err:
+        raise ProtocolError('cannot encode MarkerRelease: {}'.format(err))
+
+
+def sensor_request(sensor, window_ms):
+    """Ask for the statistics of a sensor over the last window_ms milliseconds."""
+    try:
+        return _SENSOR_REQUEST.pack(0x30, sensor, window_ms)
+    except struct.error as err:
+        raise ProtocolError('cannot encode SensorRequest: {}'.format(err))
+
+
+def subscribe(sensor, rate):
+    """Poll a sensor at least rate times a second (0 to unsubscribe)."""
+    try:
+        return _SUBSCRIBE.pack(0x31, sensor, rate)
+    except struct.error as err:
+        raise ProtocolError('cannot encode Subscribe: {}'.format(err))
+
+
+def subscribe_topic(topic, sensor, rate, reduction):
+    """Publish a reduction of a sensor at rate Hz as a topic (rate 0 to unsubscribe)."""
+    try:
+        return _SUBSCRIBE_TOPIC.pack(0x32, topic, sensor, rate, reduction)
+    except struct.error as err:
+        raise ProtocolError('cannot encode SubscribeTopic: {}'.format(err))
+
+
+def profile(mode):
+    """Switch dispatch profiling off (0) or on (1), or ask for a report (2)."""
+    try:
+        return _PROFILE.pack(0x50, mode)
+    except struct.error as err:
+        raise ProtocolError('cannot encode Profile: {}'.format(err))
@@ -0,0 +1,192 @@
+"""Link quality measured with timestamped heartbeats.
+
+Every ``interval`` seconds the Pi sends the surface a heartbeat::
+
+    0xF3 | sequence (uint32) | Pi clock when sent, in ns (uint64)
+
+which the surface sends straight back unchanged (see
+:meth:`Communication.surface.Surface.receive`).  Both ends of every round
+trip are timed on the Pi's clock, so no clock synchronisation is needed.
+From the echoes :class:`LinkMonitor` keeps
+
+- round trip time percentiles over the last ``history`` echoes,
+- jitter, the smoothed change between successive round trips (RFC 3550),
+- loss, heartbeats not echoed within ``timeout`` (an echo arriving later
+  still counts as lost, and is counted as late as well),
+- reordering, echoes that arrive after the echo of a later heartbeat, and
+- queue depth, frames waiting in the uplink's priority scheduler, sampled
+  at every heartbeat.
+
+Every ``report`` seconds the statistics are sent to the surface as a
+``LinkStats`` frame and, if a path is given, written to a Prometheus text
+file that node_exporter's textfile collector (or a plain ``cat``) can read.
+"""
+import asyncio
+import collections
+import logging
+import os
+import struct
+import time
+
+import numpy as np
+
+from .commands import LINK_STATS
+from .protocol import BYTE_ORDER, HEARTBEAT, ProtocolError
+
+log = logging.getLogger(__name__)
+
+FRAME = struct.Struct(BYTE_ORDER + 'BIQ')
+
+LinkStats = collections.namedtuple('LinkStats', 'heartbeats echoed lost late reordered rtt_p50 rtt_p99 rtt_max '
+                                                'jitter queue_depth queue_peak')
+LinkStats.__doc__ = """Heartbeat counters, round trip times and jitter (seconds) and uplink queue depth."""
+
+#: ``(name, type, help)`` of each metric in the Prometheus text file.
+METRICS = [
+    ('rov_link_heartbeats_total', 'counter', 'Heartbeats sent to the surface.'),
+    ('rov_link_heartbeats_lost_total', 'counter', 'Heartbeats not echoed within the timeout.'),
+    ('rov_link_heartbeats_late_total', 'counter', 'Echoes that arrived after the timeout, or twice.'),
+    ('rov_link_heartbeats_reordered_total', 'counter', 'Echoes that arrived after the echo of a later heartbeat.'),
+    ('rov_link_rtt_seconds', 'summary', 'Round trip time of heartbeats.'),
+    ('rov_link_jitter_seconds', 'gauge', 'Smoothed change between successive round trip times.'),
+    ('rov_link_queue_depth', 'gauge', 'Frames queued for the surface at the last heartbeat.'),
+    ('rov_link_queue_peak', 'gauge', 'Most frames queued for the surface at a heartbeat since the last report.'),
+]
+
+
+def prometheus(stats):
+    """Format :class:`LinkStats` in the Prometheus text exposition format."""
+    values = {
+        'rov_link_heartbeats_total': [('', stats.heartbeats)],
+        'rov_link_heartbeats_lost_total': [('', stats.lost)],
+        'rov_link_heartbeats_late_total': [('', stats.late)],
+        'rov_link_heartbeats_reordered_total': [('', stats.reordered)],
+        'rov_link_rtt_seconds': [('{quantile="0.5"}', stats.rtt_p50), ('{quantile="0.99"}', stats.rtt_p99),
+                                 ('{quantile="1"}', stats.rtt_max)],
+        'rov_link_jitter_seconds': [('', stats.jitter)],
+        'rov_link_queue_depth': [('', stats.queue_depth)],
+        'rov_link_queue_peak': [('', stats.queue_peak)],
+    }
+    lines = []
+    for name, kind, text in METRICS:
+        lines.append('# HELP {} {}'.format(name, text))
+        lines.append('# TYPE {} {}'.format(name, kind))
+        lines.extend('{}{} {}'.format(name, labels, value) for labels, value in values[name])
+    return '\n'.join(lines) + '\n'
+
+
+class LinkMonitor(object):
+    """Sends heartbeats over ``uplink`` and measures the link from their echoes.
+
+    ``uplink`` is an :class:`~Communication.uplink.Uplink`; heartbeats are
+    only counted while it is connected.  Pass :meth:`echo` to
+    :func:`~Communication.service.serve` as ``heartbeat``.
+    """
+
+    def __init__(self, uplink, interval=0.2, timeout=1.0, history=256, clock=time.monotonic_ns):
+        self.uplink = uplink
+        self.interval = interval
+        self.timeout = int(timeout * 1e9)
+        self.clock = clock
+        self.rtt = np.zeros(history)
+        #: Send time of each heartbeat still waiting for its echo, oldest first.
+        self.pending = collections.OrderedDict()
+        self.sequence = 0
+        self.highest = -1
+        self.heartbeats = 0
+        self.echoed = 0
+        self.lost = 0
+        self.late = 0
+        self.reordered = 0
+        self.last_rtt = None
+        self.jitter = 0.0
+        self.queue_depth = 0
+        self.queue_peak = 0
+
+    def _expire(self, now):
+        while self.pending:
+            sequence, sent = next(iter(self.pending.items()))
+            if now - sent <= self.timeout:
+                break
+            del self.pending[sequence]
+            self.lost += 1
+
+    def beat(self):
+        """Send one heartbeat and sample the uplink queue depth."""
+        now = self.clock()
+        self._expire(now)
+        self.queue_depth = sum(self.uplink.scheduler.pending())
+        self.queue_peak = max(self.queue_peak, self.queue_depth)
+        if not self.uplink.send(FRAME.pack(HEARTBEAT, self.sequence, now)):
+            return
+        self.pending[self.sequence] = now
+        self.sequence = (self.sequence + 1) & 0xFFFFFFFF
+        self.heartbeats += 1
+
+    def echo(self, data):
+        """Record the echo ``data`` of a heartbeat from the surface."""
+        if len(data) != FRAME.size:
+            raise ProtocolError('heartbeat of {} bytes, expected {}'.format(len(data), FRAME.size))
+        now = self.clock()
+        _, sequence, _ = FRAME.unpack(data)
+        # Time the round trip from our own record so a mangled echo cannot skew it.
+        sent = self.pending.pop(sequence, None)
+        if sent is None:
+            self.late += 1
+            return
+        if sequence < self.highest:
+            self.reordered += 1
+        else:
+            self.highest = sequence
+        rtt = (now - sent) / 1e9
+        self.rtt[self.echoed % len(self.rtt)] = rtt
+        self.echoed += 1
+        if self.last_rtt is not None:
+            self.jitter += (abs(rtt - self.last_rtt) - self.jitter) / 16
+        self.last_rtt = rtt
+
+    def stats(self):
+        """Return :class:`LinkStats` of the link so far."""
+        recent = self.rtt[:min(self.echoed, len(self.rtt))]
+        if len(recent):
+            p50, p99 = np.percentile(recent, (50, 99))
+            peak = recent.max()
+        else:
+            p50 = p99 = peak = float('nan')
+        return LinkStats(self.heartbeats, self.echoed, self.lost, self.late, self.reordered, p50, p99, peak,
+                         self.jitter, self.queue_depth, self.queue_peak)
+
+    def report(self, path=None):
+        """Send the statistics to the surface and write them to the Prometheus text file ``path``."""
+        stats = self.stats()
+        self.queue_peak = self.queue_depth
+        self.uplink.send(LINK_STATS.encode(
+            stats.heartbeats & 0xFFFFFFFF, stats.lost & 0xFFFFFFFF, stats.late & 0xFFFFFFFF,
+            stats.reordered & 0xFFFFFFFF, stats.rtt_p50 * 1e6, stats.rtt_p99 * 1e6, stats.jitter * 1e6,
+            min(stats.queue_depth, 0xFFFF), min(stats.queue_peak, 0xFFFF)))
+        if path is not None:
+            # Write a temporary file and rename it so a scraper never reads half a file.
+            try:
+                with open(path + '.tmp', 'w') as f:
+                    f.write(prometheus(stats))
+                os.replace(path + '.tmp', path)
+            except OSError as err:
+                log.warning('cannot write link statistics to %s: %s', path, err)
+        return stats
+
+    def describe(self):
+        stats = self.stats()
+        return ('link: {} heartbeats, {} lost, {} late, {} reordered, rtt p50 {:.0f} us  p99 {:.0f} us, '
+                'jitter {:.0f} us, queue peak {}').format(
+            stats.heartbeats, stats.lost, stats.late, stats.reordered, stats.rtt_p50 * 1e6, stats.rtt_p99 * 1e6,
+            stats.jitter * 1e6, stats.queue_peak)
+
+    async def run(self, report=1.0, path=None):
+        """Send heartbeats every :attr:`interval` seconds and report every ``report`` seconds until cancelled."""
+        due = time.monotonic() + report
+        while True:
+            self.beat()
+            if time.monotonic() >= due:
+                self.report(path)
+                due += report
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,296 @@
+"""Bit-packed command frames.
+
+Most command fields are far smaller than the bytes :mod:`Communication.protocol`
+gives them: servo ids fit in 4 bits, gripper states in 1, pulse widths in 12,
+and throttles are mostly near zero.  A packed frame carries runs of commands
+that share an opcode with each field cut down to size::
+
+    0xF4 | per run: opcode (uint8) | count (uint8) | count packed payloads
+         | CRC-16/CCITT (uint16)
+
+A packed payload holds the command's fixed-width fields, first field in the
+most significant bits, in as few whole bytes as they need, followed by its
+varint fields as LEB128 (signed ones zigzag encoded so small negative
+numbers stay short).  How each field of a command is packed is declared in
+:mod:`Communication.schema`, and the generated :mod:`Communication.commands`
+registers it with :func:`pack`, e.g.::
+
+    pack(SERVO_POSITION, servo='u4', position='u12')
+
+Field kinds are ``u<bits>`` and ``i<bits>`` for unsigned and two's
+complement fixed widths of up to 32 bits, and ``uvar`` and ``ivar`` for
+varints.  A kind may not hold values the command's struct field could not,
+so a decoded command is always one the struct codec could have carried, and
+handlers take the same values either way.
+
+A run of commands with no varints is a block of equal-sized payloads, which
+:meth:`PackedSpec.decode_array` decodes with a few NumPy operations per
+field rather than a Python loop per command.
+"""
+import re
+import struct
+
+import numpy as np
+
+from .protocol import BYTE_ORDER, CHECKSUM, PACKED, ProtocolError, checksum
+
+RUN = struct.Struct(BYTE_ORDER + 'BB')
+
+#: Longest run of one opcode in a packed frame.
+MAX_RUN = 0xFF
+
+#: Runs at least this long are decoded with :meth:`PackedSpec.decode_array`.
+VECTOR_RUN = 16
+
+#: Longest varint accepted, enough for 64 bits.
+MAX_VARINT = 10
+
+KIND = re.compile(r'^(?:([ui])(\d+)|([ui])var)$')
+
+
+def zigzag(value):
+    """Map a signed integer to an unsigned one, small magnitudes to small numbers."""
+    return value << 1 if value >= 0 else (-value << 1) - 1
+
+
+def unzigzag(value):
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+
+def encode_varint(value):
+    """LEB128 encoding of the unsigned integer ``value``."""
+    out = bytearray()
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def decode_varint(data, offset):
+    """Decode the varint at ``offset``, returning ``(value, offset after it)``."""
+    value = shift = 0
+    for index in range(offset, min(offset + MAX_VARINT, len(data))):
+        byte = data[index]
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, index + 1
+        shift += 7
+    raise ProtocolError('varint truncated or too long at byte {}'.format(offset))
+
+
+def struct_range(fmt):
+    """Return the ``(min, max)`` integer a struct format character holds."""
+    bits = struct.calcsize(fmt) * 8
+    if fmt.islower():
+        return -(1 << bits - 1), (1 << bits - 1) - 1
+    return 0, (1 << bits) - 1
+
+
+class PackedSpec(object):
+    """Bit-packed encoding of the commands of ``spec``.
+
+    ``kinds`` maps every field name of ``spec`` to its kind.  The layout is
+    worked out once here: :attr:`fixed` lists ``(index, shift, mask, sign)``
+    of each fixed-width field within the payload, and :attr:`varints`
+    ``(index, signed, min, max)`` of each varint.
+    """
+
+    def __init__(self, spec, kinds):
+        unknown = set(kinds) - set(spec.field_names)
+        if unknown:
+            raise ProtocolError('{} has no field {}'.format(spec.name, ', '.join(sorted(unknown))))
+        self.spec = spec
+        self.kinds = tuple((name, kinds.get(name)) for name in spec.field_names)
+        fixed = []
+        self.varints = []
+        for index, (name, fmt) in enumerate(spec.fields):
+            kind = kinds.get(name)
+            match = KIND.match(kind or '')
+            if match is None:
+                raise ProtocolError('{}.{} has unsupported packed kind {!r}'.format(spec.name, name, kind))
+            if fmt in 'fd':
+                raise ProtocolError('{}.{} is a float and cannot be packed'.format(spec.name, name))
+            low, high = struct_range(fmt)
+            if match.group(3):
+                self.varints.append((index, match.group(3) == 'i', low, high))
+                continue
+            signed, width = match.group(1) == 'i', int(match.group(2))
+            least = -(1 << width - 1) if signed else 0
+            most = (1 << width - 1) - 1 if signed else (1 << width) - 1
+            if not 0 < width <= 32 or least < low or most > high:
+                raise ProtocolError('{}.{}: {} holds values {} cannot'.format(spec.name, name, kind, fmt))
+            fixed.append((index, width, signed))
+        self.bits = sum(width for _, width, _ in fixed)
+        #: Bytes taken by the fixed-width fields.
+        self.fixed_size = (self.bits + 7) // 8
+        #: Bytes of every payload, or ``None`` if it has varints.
+        self.size = None if self.varints else self.fixed_size
+        self.fixed = []
+        shift = self.fixed_size * 8
+        for index, width, signed in fixed:
+            shift -= width
+            self.fixed.append((index, shift, (1 << width) - 1, 1 << width - 1 if signed else 0))
+        self.dtype = np.dtype([(name, fmt) for name, fmt in spec.fields])
+
+    @property
+    def name(self):
+        return self.spec.name
+
+    @property
+    def opcode(self):
+        return self.spec.opcode
+
+    def specialize(self, encode, decode):
+        """Use ``encode`` and ``decode`` in place of the generic methods.
+
+        :mod:`Communication.codegen` generates straight-line functions for
+        each layout, which skip walking :attr:`fixed` and :attr:`varints`
+        for every command.
+        """
+        self.encode = encode
+        self.decode = decode
+
+    def check(self, values):
+        """Raise :exc:`ProtocolError` unless every one of ``values`` fits its packed field."""
+        if len(values) != len(self.kinds):
+            raise ProtocolError('{} takes {} values, got {}'.format(self.name, len(self.kinds), len(values)))
+        for index, shift, mask, sign in self.fixed:
+            value = values[index]
+            if not (-sign <= value < sign if sign else 0 <= value <= mask):
+                raise ProtocolError('{}.{} = {} does not fit in {}'.format(
+                    self.name, self.kinds[index][0], value, self.kinds[index][1]))
+        for index, signed, low, high in self.varints:
+            if not low <= values[index] <= high:
+                raise ProtocolError('{}.{} = {} is out of range'.format(
+                    self.name, self.kinds[index][0], values[index]))
+
+    def encode(self, *values):
+        """Return the packed payload of ``values``."""
+        self.check(values)
+        word = 0
+        for index, shift, mask, sign in self.fixed:
+            word |= (values[index] & mask) << shift
+        payload = word.to_bytes(self.fixed_size, 'big')
+        for index, signed, low, high in self.varints:
+            value = values[index]
+            payload += encode_varint(zigzag(value) if signed else value)
+        return payload
+
+    def decode(self, data, offset=0):
+        """Decode the payload at ``offset``, returning ``(values, offset after it)``."""
+        end = offset + self.fixed_size
+        if end > len(data):
+            raise ProtocolError('{} truncated inside packed frame'.format(self.name))
+        word = int.from_bytes(data[offset:end], 'big')
+        values = [0] * len(self.kinds)
+        for index, shift, mask, sign in self.fixed:
+            value = word >> shift & mask
+            values[index] = value - (sign << 1) if value & sign else value
+        for index, signed, low, high in self.varints:
+            value, end = decode_varint(data, end)
+            if signed:
+                value = unzigzag(value)
+            if not low <= value <= high:
+                raise ProtocolError('{}.{} = {} is out of range'.format(self.name, self.kinds[index][0], value))
+            values[index] = value
+        return tuple(values), end
+
+    def decode_array(self, data, offset, count):
+        """Decode ``count`` payloads at ``offset`` into a structured array with one column per field.
+
+        Only for commands without varints whose payload fits in 8 bytes.
+        """
+        if self.size is None or self.size > 8:
+            raise ProtocolError('{} payloads cannot be decoded as an array'.format(self.name))
+        rows = np.frombuffer(data, np.uint8, count * self.size, offset).reshape(count, self.size)
+        word = np.zeros(count, np.uint64)
+        for column in range(self.size):
+            word = word << np.uint64(8) | rows[:, column]
+        out = np.empty(count, self.dtype)
+        for index, shift, mask, sign in self.fixed:
+            value = (word >> np.uint64(shift) & np.uint64(mask)).astype(np.int64)
+            if sign:
+                value -= (value & sign) << 1
+            out[self.kinds[index][0]] = value
+        return out
+
+    def __repr__(self):
+        return 'PackedSpec({!r}, {!r})'.format(self.name, dict(self.kinds))
+
+
+#: Packed encoding of each command, indexed by opcode; ``None`` if it has none.
+PACKED_SPECS = [None] * 256
+
+
+def pack(spec, **kinds):
+    """Declare how every field of ``spec`` is packed, registering the :class:`PackedSpec` under its opcode."""
+    packed = PackedSpec(spec, kinds)
+    if PACKED_SPECS[spec.opcode] is not None:
+        raise ProtocolError('{} already has a packed encoding'.format(spec.name))
+    PACKED_SPECS[spec.opcode] = packed
+    return packed
+
+
+def packed_spec(spec):
+    packed = PACKED_SPECS[spec.opcode]
+    if packed is None:
+        raise ProtocolError('{} has no packed encoding'.format(spec.name))
+    return packed
+
+
+def encode_packed(commands):
+    """Encode ``(spec, values)`` pairs as one packed frame.
+
+    Consecutive commands with the same opcode share a run, so put them
+    together.
+    """
+    body = bytearray([PACKED])
+    run = None
+    for spec, values in commands:
+        packed = packed_spec(spec)
+        if run is None or body[run] != spec.opcode or body[run + 1] == MAX_RUN:
+            run = len(body)
+            body += RUN.pack(spec.opcode, 0)
+        body[run + 1] += 1
+        body += packed.encode(*values)
+    body += CHECKSUM.pack(checksum(body))
+    return bytes(body)
+
+
+def decode_packed(data, vector_run=VECTOR_RUN):
+    """Decode a packed frame into a list of ``(spec, values)``.
+
+    Like a batch, the checksum and every command are validated before
+    anything is returned.  Runs of at least ``vector_run`` commands without
+    varints are decoded with :meth:`PackedSpec.decode_array`.
+    """
+    end = len(data) - CHECKSUM.size
+    if end < 1:
+        raise ProtocolError('packed frame truncated: {} bytes'.format(len(data)))
+    expected, = CHECKSUM.unpack_from(data, end)
+    if checksum(memoryview(data)[:end]) != expected:
+        raise ProtocolError('packed frame checksum mismatch')
+    offset = 1
+    commands = []
+    while offset < end:
+        if end - offset < RUN.size:
+            raise ProtocolError('packed run truncated at byte {}'.format(offset))
+        opcode, count = RUN.unpack_from(data, offset)
+        offset += RUN.size
+        packed = PACKED_SPECS[opcode]
+        if packed is None:
+            raise ProtocolError('no packed encoding for opcode 0x{:02X}'.format(opcode))
+        spec = packed.spec
+        if packed.size is not None and 0 < packed.size <= 8 and count >= vector_run:
+            if offset + count * packed.size > end:
+                raise ProtocolError('{} truncated inside packed frame'.format(spec.name))
+            commands.extend((spec, values) for values in packed.decode_array(data, offset, count).tolist())
+            offset += count * packed.size
+            continue
+        for _ in range(count):
+            values, offset = packed.decode(data, offset)
+            commands.append((spec, values))
+        if offset > end:
+            raise ProtocolError('{} truncated inside packed frame'.format(spec.name))
+    return commands
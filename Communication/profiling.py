@@ -0,0 +1,180 @@
+"""Per-opcode timing of the dispatch loop, switched on and off from the surface.
+
+When a run feels sluggish the question is whether the time goes on parsing
+frames, on commands waiting their turn, or in a particular peripheral
+handler.  While profiling is on, :class:`~Communication.service.CommandProtocol`
+stamps every frame with ``time.monotonic_ns`` and records, per opcode:
+
+- *parse*: decoding the datagram, recorded under the frame's first byte (the
+  command's opcode, or ``Batch``/``Reliable`` for those frames),
+- *queue*: from the end of parsing until the handler starts, which includes
+  earlier commands of the same batch and the wait for a free executor
+  thread, and
+- *run*: the handler itself (wall time, so a coroutine's awaits count too).
+
+Durations go into :class:`Histogram`, whose log-linear buckets (as in
+HdrHistogram) keep every percentile to within about 3 % at a fixed size.
+When profiling is off the dispatch loop checks one flag per datagram and
+takes the untimed path.
+
+The surface sends ``Profile(mode)``: :data:`ON` clears the histograms and
+starts profiling, :data:`REPORT` sends a ``HandlerProfile`` frame per opcode,
+and :data:`OFF` stops profiling and reports.
+"""
+import math
+
+import numpy as np
+
+from .commands import HANDLER_PROFILE
+from .protocol import ACK, BATCH, HEARTBEAT, PACKED, RELIABLE, SPECS, TELEMETRY, TOPICS, encode_batch
+
+OFF, ON, REPORT = range(3)
+
+#: Names of the opcodes without a ``PacketSpec``.  Batch and reliable frames
+#: are profiled for their parse time only.
+FRAME_NAMES = {BATCH: 'Batch', RELIABLE: 'Reliable', ACK: 'Ack', HEARTBEAT: 'Heartbeat', PACKED: 'Packed',
+               TELEMETRY: 'Telemetry', TOPICS: 'Topics'}
+
+#: ``HandlerProfile`` frames per report batch; 64 fit the surface's receive buffer.
+REPORT_BATCH = 64
+
+#: Each power of two is split into ``2 ** SUB_BITS`` buckets.
+SUB_BITS = 5
+SUB_BUCKETS = 1 << SUB_BITS
+
+
+def bucket(value):
+    """Index of the bucket counting ``value``."""
+    if value < 2 * SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BITS - 1
+    return shift * SUB_BUCKETS + (value >> shift)
+
+
+def bucket_start(index):
+    """Smallest value counted by bucket ``index``."""
+    if index < 2 * SUB_BUCKETS:
+        return index
+    shift = index // SUB_BUCKETS - 1
+    return (index % SUB_BUCKETS + SUB_BUCKETS) << shift
+
+
+class Histogram(object):
+    """Counts of nanosecond durations up to ``highest`` in log-linear buckets.
+
+    Values below 64 ns get a bucket each; above that every power of two is
+    split into 32 buckets, so a bucket is never wider than 1/32 of the
+    values in it.  Longer durations are counted in the last bucket.
+    """
+
+    def __init__(self, highest=1 << 36):
+        self.counts = [0] * (bucket(highest) + 1)
+        self.count = 0
+        self.max = 0
+
+    def clear(self):
+        self.counts = [0] * len(self.counts)
+        self.count = 0
+        self.max = 0
+
+    def record(self, value):
+        index = bucket(value) if value > 0 else 0
+        if index >= len(self.counts):
+            index = len(self.counts) - 1
+        self.counts[index] += 1
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, pct):
+        """Return the ``pct`` percentile in nanoseconds, or NaN if nothing was recorded.
+
+        This is the highest value of the bucket holding the percentile,
+        capped at the largest value recorded.
+        """
+        if not self.count:
+            return float('nan')
+        rank = max(1, math.ceil(pct / 100.0 * self.count))
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return min(bucket_start(index + 1) - 1, self.max)
+
+
+class HandlerProfile(object):
+    """Parse, queue and run :class:`Histogram` of one opcode."""
+
+    def __init__(self, opcode):
+        self.opcode = opcode
+        self.parse = Histogram()
+        self.queue = Histogram()
+        self.run = Histogram()
+
+    @property
+    def count(self):
+        """Commands run, or frames parsed for opcodes that only frame commands."""
+        return max(self.parse.count, self.run.count)
+
+    def clear(self):
+        self.parse.clear()
+        self.queue.clear()
+        self.run.clear()
+
+    @property
+    def name(self):
+        spec = SPECS[self.opcode]
+        if spec is not None:
+            return spec.name
+        return FRAME_NAMES.get(self.opcode, '0x{:02X}'.format(self.opcode))
+
+    def encode(self):
+        """Encode as a ``HandlerProfile`` frame, with times in microseconds."""
+        return HANDLER_PROFILE.encode(self.opcode, self.count & 0xFFFFFFFF,
+                                      self.parse.percentile(50) / 1e3, self.parse.percentile(99) / 1e3,
+                                      self.queue.percentile(50) / 1e3, self.queue.percentile(99) / 1e3,
+                                      self.run.percentile(50) / 1e3, self.run.percentile(99) / 1e3,
+                                      self.run.max / 1e3)
+
+    def describe(self):
+        return '{}: {} runs, parse p50 {:.1f} us  p99 {:.1f} us, queue p50 {:.1f} us  p99 {:.1f} us, ' \
+               'run p50 {:.1f} us  p99 {:.1f} us  max {:.1f} us'.format(
+                   self.name, self.count, self.parse.percentile(50) / 1e3, self.parse.percentile(99) / 1e3,
+                   self.queue.percentile(50) / 1e3, self.queue.percentile(99) / 1e3,
+                   self.run.percentile(50) / 1e3, self.run.percentile(99) / 1e3, self.run.max / 1e3)
+
+
+class Profiler(object):
+    """Timings of every opcode dispatched while profiling is on.
+
+    ``send`` is called with the report frames, usually
+    ``uplink.surface.send``.  Everything is recorded on the event loop
+    thread (blocking handlers are timed in the executor and recorded when
+    their future completes), so no locking is needed.
+    """
+
+    def __init__(self, send=None):
+        self.send = send
+        self.profiles = {}
+
+    def reset(self):
+        for profile in self.profiles.values():
+            profile.clear()
+
+    def profile(self, opcode):
+        """Return the :class:`HandlerProfile` of ``opcode``."""
+        profile = self.profiles.get(opcode)
+        if profile is None:
+            profile = self.profiles[opcode] = HandlerProfile(opcode)
+        return profile
+
+    def _seen(self):
+        return [profile for _, profile in sorted(self.profiles.items()) if profile.count]
+
+    def report(self):
+        """Send a ``HandlerProfile`` frame for every opcode seen, batched."""
+        frames = [profile.encode() for profile in self._seen()]
+        if self.send is not None:
+            for first in range(0, len(frames), REPORT_BATCH):
+                self.send(encode_batch(frames[first:first + REPORT_BATCH]))
+        return frames
+
+    def describe(self):
+        return [profile.describe() for profile in self._seen()]
@@ -0,0 +1,201 @@
+"""Wire format for packets sent between the surface computer and the Pi.
+
+Every command frame is a one byte opcode followed by a fixed-size payload in
+network byte order.  Each command is described exactly once by a
+:class:`PacketSpec`; from that one definition we get
+
+- a precompiled ``struct.Struct`` encoder/decoder used by the receive loop, and
+- a Scapy layer (see :mod:`Communication.scapy_layers`) used for debugging.
+
+Scapy is only imported by the debugging layer so the Pi never pays for it on
+the hot path.
+
+Several commands can be sent in one datagram as a batch frame::
+
+    0xF0 | count (uint8) | count command frames | CRC-16/CCITT (uint16)
+
+The checksum covers everything before it.  A batch lets the pilot move
+several servos at once for a single header, checksum and syscall.
+"""
+import binascii
+import struct
+
+#: UDP port the Pi listens on for commands from the surface.
+COMMAND_PORT = 5005
+
+#: UDP port the surface listens on for frames from the Pi.
+TELEMETRY_PORT = 5006
+
+#: All multi-byte fields are sent big-endian, which is also what Scapy uses.
+BYTE_ORDER = '!'
+
+OPCODE = struct.Struct(BYTE_ORDER + 'B')
+
+#: Opcodes from here up are framing, not commands.
+FRAMING_OPCODES = 0xF0
+BATCH = 0xF0
+BATCH_HEADER = struct.Struct(BYTE_ORDER + 'BB')
+CHECKSUM = struct.Struct(BYTE_ORDER + 'H')
+MAX_BATCH = 0xFF
+
+#: Reliable frame wrapping a command or batch, and its acknowledgement; see
+#: :mod:`Communication.reliable`.
+RELIABLE = 0xF1
+ACK = 0xF2
+
+#: Heartbeat sent by the Pi and echoed by the surface; see :mod:`Communication.link`.
+HEARTBEAT = 0xF3
+
+#: Bit-packed commands; see :mod:`Communication.packed`.
+PACKED = 0xF4
+
+#: Variable-length frames below the framing range.  They have no
+#: :class:`PacketSpec`, so :func:`define` must not hand out their opcodes.
+TELEMETRY = 0x81
+TOPICS = 0x82
+VARIABLE_OPCODES = frozenset([TELEMETRY, TOPICS])
+
+#: struct format characters a field may use.
+FIELD_FORMATS = frozenset('bBhHiIqQfd')
+
+
+class ProtocolError(ValueError):
+    """Raised when a frame cannot be encoded or decoded."""
+
+
+class PacketSpec(object):
+    """Declarative description of a single command packet.
+
+    ``fields`` is a sequence of ``(name, format)`` pairs where ``format`` is a
+    single ``struct`` format character.  The structs are built once here so
+    encoding and decoding never have to look at the field list again.
+    """
+
+    __slots__ = ('name', 'opcode', 'fields', 'frame', 'payload', 'size')
+
+    def __init__(self, name, opcode, fields=()):
+        if not 0 <= opcode <= 0xFF:
+            raise ProtocolError('opcode {!r} does not fit in one byte'.format(opcode))
+        fields = tuple(fields)
+        for field_name, fmt in fields:
+            if fmt not in FIELD_FORMATS:
+                raise ProtocolError('{}.{} has unsupported format {!r}'.format(name, field_name, fmt))
+
+        formats = ''.join(fmt for _, fmt in fields)
+        self.name = name
+        self.opcode = opcode
+        self.fields = fields
+        self.frame = struct.Struct(BYTE_ORDER + 'B' + formats)
+        self.payload = struct.Struct(BYTE_ORDER + formats)
+        self.size = self.frame.size
+
+    @property
+    def field_names(self):
+        return tuple(field_name for field_name, _ in self.fields)
+
+    def encode(self, *values):
+        """Return the full frame (opcode and payload) for ``values``."""
+        try:
+            return self.frame.pack(self.opcode, *values)
+        except struct.error as err:
+            raise ProtocolError('cannot encode {}: {}'.format(self.name, err))
+
+    def decode(self, data, offset=0):
+        """Return the payload values of the frame starting at ``offset``.
+
+        ``data`` may be any buffer (``bytes``, ``bytearray``, ``memoryview``);
+        the opcode byte at ``offset`` is not checked.
+        """
+        return self.payload.unpack_from(data, offset + 1)
+
+    def __repr__(self):
+        return 'PacketSpec({!r}, 0x{:02X}, {!r})'.format(self.name, self.opcode, self.fields)
+
+
+#: Lookup table indexed by opcode; unused opcodes are ``None``.
+SPECS = [None] * 256
+
+
+def define(name, opcode, *fields):
+    """Create a :class:`PacketSpec` and register it under its opcode."""
+    if opcode >= FRAMING_OPCODES:
+        raise ProtocolError('opcode 0x{:02X} is reserved for framing'.format(opcode))
+    if opcode in VARIABLE_OPCODES:
+        raise ProtocolError('opcode 0x{:02X} is reserved for a variable-length frame'.format(opcode))
+    spec = PacketSpec(name, opcode, fields)
+    existing = SPECS[opcode]
+    if existing is not None:
+        raise ProtocolError('opcode 0x{:02X} is used by both {} and {}'.format(opcode, existing.name, name))
+    SPECS[opcode] = spec
+    return spec
+
+
+def registered_specs():
+    """Return every registered spec in opcode order."""
+    return [spec for spec in SPECS if spec is not None]
+
+
+def spec_for(data, offset=0):
+    """Return the spec for the frame at ``offset`` in ``data``."""
+    if offset >= len(data):
+        raise ProtocolError('empty frame')
+    spec = SPECS[data[offset]]
+    if spec is None:
+        raise ProtocolError('unknown opcode 0x{:02X}'.format(data[offset]))
+    return spec
+
+
+def decode_frame(data, offset=0):
+    """Decode one command frame, returning ``(spec, values)``."""
+    spec = spec_for(data, offset)
+    if len(data) - offset < spec.size:
+        raise ProtocolError('{} frame truncated: {} < {} bytes'.format(spec.name, len(data) - offset, spec.size))
+    return spec, spec.payload.unpack_from(data, offset + 1)
+
+
+def checksum(data):
+    """CRC-16/CCITT of ``data``."""
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def encode_batch(frames):
+    """Wrap already encoded command ``frames`` in one batch frame."""
+    frames = list(frames)
+    if len(frames) > MAX_BATCH:
+        raise ProtocolError('cannot batch {} commands, the limit is {}'.format(len(frames), MAX_BATCH))
+    body = BATCH_HEADER.pack(BATCH, len(frames)) + b''.join(frames)
+    return body + CHECKSUM.pack(checksum(body))
+
+
+def decode_batch(data):
+    """Decode a batch frame into a list of ``(spec, values)``.
+
+    The checksum and every sub-command are validated before anything is
+    returned, so a corrupt batch is rejected as a whole.
+    """
+    end = len(data) - CHECKSUM.size
+    if end < BATCH_HEADER.size:
+        raise ProtocolError('batch frame truncated: {} bytes'.format(len(data)))
+    expected, = CHECKSUM.unpack_from(data, end)
+    if checksum(memoryview(data)[:end]) != expected:
+        raise ProtocolError('batch checksum mismatch')
+
+    _, count = BATCH_HEADER.unpack_from(data)
+    offset = BATCH_HEADER.size
+    commands = []
+    for _ in range(count):
+        spec = spec_for(data, offset)
+        if end - offset < spec.size:
+            raise ProtocolError('{} truncated inside batch'.format(spec.name))
+        commands.append((spec, spec.payload.unpack_from(data, offset + 1)))
+        offset += spec.size
+    if offset != end:
+        raise ProtocolError('batch has {} trailing bytes'.format(end - offset))
+    return commands
+
+
+def decode(data):
+    """Decode a single command or a batch into a list of ``(spec, values)``."""
+    if data and data[0] == BATCH:
+        return decode_batch(data)
+    return [decode_frame(data)]
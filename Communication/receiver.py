@@ -0,0 +1,106 @@
+"""Allocation-free receive path for command datagrams.
+
+asyncio's datagram transport reads every datagram with ``recvfrom(256 KiB)``,
+allocating a new ``bytes`` object (and briefly a 256 KiB buffer) per packet
+and waking the loop once per packet.  On a Pi that allocator and GC churn is a
+real share of the CPU time spent on comms.
+
+:class:`ZeroCopyReceiver` instead reads with ``socket.recv_into`` into a
+small pool of preallocated ``bytearray`` buffers and decodes the fields
+straight from ``memoryview`` slices of them.  Every time the socket becomes
+readable it drains up to ``burst`` datagrams.
+"""
+import logging
+import socket
+
+log = logging.getLogger(__name__)
+
+#: Large enough for the biggest batch frame.
+BUFFER_SIZE = 2048
+
+
+class BufferPool(object):
+    """Fixed ring of preallocated receive buffers.
+
+    A view returned by :meth:`next` stays valid until the pool wraps around,
+    i.e. for the next ``count - 1`` calls, so a handler may hold on to the
+    frame it was given for a little while without copying it.
+    """
+
+    def __init__(self, count=8, size=BUFFER_SIZE):
+        self.buffers = [bytearray(size) for _ in range(count)]
+        self.views = [memoryview(buffer) for buffer in self.buffers]
+        self.index = 0
+
+    def next(self):
+        """Return a writable view of the next buffer in the ring."""
+        view = self.views[self.index]
+        self.index = (self.index + 1) % len(self.views)
+        return view
+
+    def release(self):
+        for view in self.views:
+            view.release()
+
+
+class ZeroCopyReceiver(object):
+    """Reads datagrams from ``sock`` into a :class:`BufferPool` and hands them to ``protocol``.
+
+    ``protocol`` is a :class:`~Communication.service.CommandProtocol`; its
+    ``handle`` method decodes from the buffer without copying it.  Since
+    ``recv_into`` does not report the sender, handlers get ``None`` as the
+    address.
+    """
+
+    def __init__(self, sock, protocol, pool=None, burst=64):
+        self.sock = sock
+        self.protocol = protocol
+        self.pool = pool or BufferPool()
+        self.burst = burst
+        self.loop = None
+
+    def start(self, loop):
+        self.loop = loop
+        self.sock.setblocking(False)
+        self.protocol.connection_made(self)
+        loop.add_reader(self.sock.fileno(), self._readable)
+
+    def _readable(self):
+        recv_into = self.sock.recv_into
+        handle = self.protocol.handle
+        for _ in range(self.burst):
+            view = self.pool.next()
+            try:
+                size = recv_into(view)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as err:
+                self.protocol.error_received(err)
+                return
+            handle(view[:size])
+
+    def get_extra_info(self, name, default=None):
+        """Subset of ``asyncio.BaseTransport.get_extra_info``."""
+        if name == 'socket':
+            return self.sock
+        if name == 'sockname':
+            return self.sock.getsockname()
+        return default
+
+    def close(self):
+        if self.loop is not None:
+            self.loop.remove_reader(self.sock.fileno())
+            self.loop = None
+        self.sock.close()
+        self.protocol.connection_lost(None)
+
+    def is_closing(self):
+        return self.sock.fileno() == -1
+
+
+def bound_socket(host, port):
+    """Return a UDP socket bound to ``(host, port)``."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    return sock
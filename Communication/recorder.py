@@ -0,0 +1,463 @@
+"""Flight recorder: every frame to and from the surface in a memory-mapped log.
+
+To reproduce a field failure offline, ``python -m Communication --record
+PATH`` appends every inbound command datagram and every frame sent to the
+surface to a file that is preallocated at startup and mapped into memory.
+The file starts with a header::
+
+    magic b'ROVLOG03' | end offset (uint64) | records (uint64)
+        | wall clock at start, ns (int64) | monotonic clock at start, ns (int64)
+        | index offset (uint64)
+
+followed by the records, back to back::
+
+    monotonic clock, ns (int64) | length (uint16) | direction (uint8) | reserved (uint8) | frame
+
+All fields are little-endian.  The end offset, record count and index are
+written when the recorder is closed.  The file is zero-filled when it is
+preallocated and a record's frame is copied in before its header, so a log
+cut short by a crash or power loss is read up to the first record whose
+timestamp is still zero.  Recording a frame costs a header ``pack_into``
+and one copy into the mapping, about 0.7 µs on a desktop; nothing is
+allocated and nothing waits for the disk, which the kernel writes back in
+its own time.  When the file is full further frames are counted in
+:attr:`FlightRecorder.dropped` and not recorded.
+
+Multi-hour logs are too large to scan, so on close the recorder also writes
+an index after the records, at the index offset::
+
+    time step (uint64) | time entries (uint64) | command entries (uint64)
+        | per direction and opcode: first record entry (uint32) | record entries (uint32)
+        | per direction and opcode: first command entry (uint32) | command entries (uint32)
+        | time entries x (timestamp (int64) | record offset (uint64))
+        | record offsets (uint32), grouped by direction and opcode
+        | command entries x (record offset (uint32) | frame offset (uint32)),
+          grouped by direction and opcode
+
+The time index is sparse, every :data:`TIME_STEP`-th record, so
+:meth:`FlightLog.seek` bisects it and scans at most that many records.  The
+record index lists every record of each ``(direction, opcode)`` of its
+first byte in time order, so batches are listed under ``Batch``.  The
+command index lists every command, whether it was sent on its own or inside
+a batch, packed or reliable frame, with the offset of its frame in the file,
+so :meth:`FlightLog.extract` can gather all frames of one command into a
+NumPy structured array without decoding records one by one in Python.
+Commands inside a packed frame are not byte aligned and point at the packed
+frame instead, which is decoded when they are extracted.  Space for the
+index is reserved as records are added, and a log without one (left by a
+crash) is indexed by a scan when it is opened.
+
+:class:`FlightLog` reads a log back, ``python -m Communication.recorder``
+summarises one or exports a command as CSV, and ``python -m
+Communication.replay`` feeds its inbound frames to the dispatcher again (see
+:mod:`Communication.replay`).
+"""
+import argparse
+import array
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+
+import numpy as np
+
+from . import commands  # noqa: F401  (registers the command specs)
+from .packed import RUN, decode_packed
+from .profiling import FRAME_NAMES
+from .protocol import BATCH, BATCH_HEADER, PACKED, RELIABLE, SPECS, ProtocolError, decode_batch
+from .reliable import HEADER as RELIABLE_HEADER
+
+log = logging.getLogger(__name__)
+
+MAGIC = b'ROVLOG03'
+FILE_HEADER = struct.Struct('<8sQQqqQ')
+RECORD = struct.Struct('<qHBx')
+RECORD_DTYPE = np.dtype([('timestamp', '<i8'), ('length', '<u2'), ('direction', 'u1'), ('reserved', 'u1')])
+
+#: Directions of a record.
+INBOUND, OUTBOUND = range(2)
+DIRECTIONS = ('inbound', 'outbound')
+
+#: Records between entries of the sparse time index.
+TIME_STEP = 256
+INDEX_HEADER = struct.Struct('<QQQ')
+DIRECTORY_DTYPE = np.dtype([('first', '<u4'), ('count', '<u4')])
+TIME_DTYPE = np.dtype([('timestamp', '<i8'), ('offset', '<u8')])
+COMMAND_DTYPE = np.dtype([('record', '<u4'), ('frame', '<u4')])
+#: Bytes of the index that do not grow with the number of records, with room to align it.
+INDEX_FIXED = 8 + INDEX_HEADER.size + 2 * len(DIRECTIONS) * 256 * DIRECTORY_DTYPE.itemsize
+
+
+def index_size(records, commands):
+    """Bytes the index of ``records`` records holding at most ``commands`` commands takes."""
+    return (INDEX_FIXED + (records // TIME_STEP + 1) * TIME_DTYPE.itemsize + records * 4
+            + commands * COMMAND_DTYPE.itemsize)
+
+
+def command_count(data, offset=0):
+    """Most commands the frame at ``offset`` in ``data`` can hold, without decoding it."""
+    if len(data) <= offset:
+        return 0
+    if data[offset] == RELIABLE:
+        return command_count(data, offset + RELIABLE_HEADER.size)
+    if data[offset] == BATCH:
+        return data[offset + 1] if len(data) > offset + 1 else 0
+    if data[offset] == PACKED:
+        return (len(data) - offset - 1) // RUN.size
+    return 1
+
+
+def frame_commands(buffer, offset, end):
+    """Return ``(opcode, frame offset)`` of every command in the frame ``buffer[offset:end]``.
+
+    Commands inside a packed frame get the offset of the packed frame, once
+    per opcode.  A frame that does not decode holds no commands.
+    """
+    frame = buffer[offset:end]
+    if not frame:
+        return []
+    try:
+        if frame[0] == RELIABLE:
+            return frame_commands(buffer, offset + RELIABLE_HEADER.size, end)
+        if frame[0] == BATCH:
+            found = []
+            position = offset + BATCH_HEADER.size
+            for spec, _ in decode_batch(frame):
+                found.append((spec.opcode, position))
+                position += spec.size
+            return found
+        if frame[0] == PACKED:
+            return [(opcode, offset) for opcode in dict.fromkeys(spec.opcode for spec, _ in decode_packed(frame))]
+    except ProtocolError:
+        return []
+    spec = SPECS[frame[0]]
+    return [(spec.opcode, offset)] if spec is not None and len(frame) == spec.size else []
+
+
+def spec_dtype(spec):
+    """NumPy dtype of a whole ``spec`` frame as sent on the wire."""
+    return np.dtype([('opcode', 'u1')] + [(name, '>' + fmt) for name, fmt in spec.fields])
+
+
+class FlightRecorder(object):
+    """Appends frames to the preallocated log at ``path`` of ``size`` bytes.
+
+    :meth:`record` may be called from any thread: frames to the surface can
+    be sent from executor threads.  Frames recorded after :meth:`close` are
+    ignored.
+    """
+
+    def __init__(self, path, size=64 << 20, clock=time.monotonic_ns):
+        if size >= 1 << 32:
+            raise ValueError('flight recorder logs are limited to 4 GiB')
+        self.path = path
+        self.size = size
+        self.clock = clock
+        self.file = open(path, 'w+b')
+        try:
+            # Reserve the blocks now so a full SD card shows up at startup, not mid-dive.
+            os.posix_fallocate(self.file.fileno(), 0, size)
+        except (AttributeError, OSError):
+            self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), size)
+        self.end = FILE_HEADER.size
+        self.records = 0
+        #: Upper bound of the commands in the records, for the space of the index.
+        self.commands = 0
+        #: Offset of every record, for the index.
+        self.offsets = array.array('I')
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.wall_start = time.time_ns()
+        self.monotonic_start = clock()
+        FILE_HEADER.pack_into(self.map, 0, MAGIC, 0, 0, self.wall_start, self.monotonic_start, 0)
+
+    def record(self, direction, data):
+        """Append ``data`` (any buffer) as a frame in ``direction``.
+
+        An empty datagram has no opcode to index it by and is not recorded.
+        """
+        length = len(data)
+        if not length:
+            return
+        commands = command_count(data)
+        # The copy is made under the lock too, so close() cannot unmap the file in the middle of it.
+        with self.lock:
+            if self.map is None:
+                return
+            # Stamped under the lock so records are in time order.
+            stamp = self.clock()
+            start = self.end
+            end = start + RECORD.size + length
+            if end + index_size(self.records + 1, self.commands + commands) > self.size or length > 0xFFFF:
+                if not self.dropped:
+                    log.warning('flight recorder %s is full, no longer recording', self.path)
+                self.dropped += 1
+                return
+            self.end = end
+            self.records += 1
+            self.commands += commands
+            self.offsets.append(start)
+            self.map[start + RECORD.size:end] = data
+            RECORD.pack_into(self.map, start, stamp, length, direction)
+
+    def _write_index(self):
+        directory, times, by_opcode, command_directory, by_command = build_index(
+            self.map, np.frombuffer(self.offsets, dtype=np.uint32))
+        index = (self.end + 7) & ~7
+        parts = [INDEX_HEADER.pack(TIME_STEP, len(times), len(by_command)), directory.tobytes(),
+                 command_directory.tobytes(), times.tobytes(), by_opcode.astype('<u4').tobytes(),
+                 by_command.tobytes()]
+        position = index
+        for part in parts:
+            self.map[position:position + len(part)] = part
+            position += len(part)
+        return index
+
+    def close(self):
+        with self.lock:
+            if self.map is None:
+                return
+            index = self._write_index()
+            FILE_HEADER.pack_into(self.map, 0, MAGIC, self.end, self.records, self.wall_start,
+                                  self.monotonic_start, index)
+            self.map.flush()
+            self.map.close()
+            self.map = None
+            self.file.close()
+
+
+def gather(buffer, offsets, size):
+    """Copy ``size`` bytes at each of ``offsets`` in ``buffer`` into an ``(n, size)`` uint8 array."""
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    return data[np.asarray(offsets, dtype=np.intp)[:, None] + np.arange(size)]
+
+
+def directory_of(keys):
+    """Directory of the index grouping entries with ``keys`` (direction * 256 + opcode)."""
+    directory = np.zeros(len(DIRECTIONS) * 256, dtype=DIRECTORY_DTYPE)
+    directory['count'] = np.bincount(keys, minlength=len(directory))
+    directory['first'][1:] = np.cumsum(directory['count'])[:-1]
+    return directory
+
+
+def build_index(buffer, offsets):
+    """Return the record directory, sparse time index, record index, command directory and command index."""
+    # The record header and the first byte of the frame, its opcode.
+    headers = gather(buffer, offsets, RECORD.size + 1)
+    fields = headers[:, :RECORD.size].copy().view(RECORD_DTYPE)[:, 0]
+    directions = fields['direction'].astype(np.intp)
+    opcodes = headers[:, RECORD.size]
+    keys = directions * 256 + opcodes
+    times = np.zeros(len(offsets[::TIME_STEP]), dtype=TIME_DTYPE)
+    times['timestamp'] = fields['timestamp'][::TIME_STEP]
+    times['offset'] = offsets[::TIME_STEP]
+
+    # Commands sent on their own are found from the record headers; only containers are walked in Python.
+    sizes = np.array([spec.size if spec is not None else -1 for spec in SPECS])
+    bare = sizes[opcodes] == fields['length']
+    records = [offsets[bare].astype(np.int64)]
+    frames = [records[0] + RECORD.size]
+    command_keys = [keys[bare]]
+    for index in np.flatnonzero(np.isin(opcodes, [BATCH, PACKED, RELIABLE]) & (fields['length'] > 0)).tolist():
+        start = int(offsets[index]) + RECORD.size
+        found = frame_commands(buffer, start, start + int(fields['length'][index]))
+        if found:
+            records.append(np.full(len(found), offsets[index], dtype=np.int64))
+            frames.append(np.array([frame for _, frame in found], dtype=np.int64))
+            command_keys.append(directions[index] * 256 + np.array([opcode for opcode, _ in found], dtype=np.intp))
+    records, frames, command_keys = np.concatenate(records), np.concatenate(frames), np.concatenate(command_keys)
+    # Sort by key, then record, keeping the commands of one record in frame order.
+    order = np.lexsort((records, command_keys))
+    by_command = np.zeros(len(order), dtype=COMMAND_DTYPE)
+    by_command['record'] = records[order]
+    by_command['frame'] = frames[order]
+    return (directory_of(keys), times, offsets[np.argsort(keys, kind='stable')], directory_of(command_keys),
+            by_command)
+
+
+class FlightLog(object):
+    """Read-only view of a flight recorder log.
+
+    Iterating yields ``(timestamp, direction, frame)`` with ``frame`` a
+    ``memoryview`` into the mapped file, valid until :meth:`close`.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.end, self.records, self.wall_start, self.monotonic_start, index = \
+            FILE_HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            self.map.close()
+            raise ValueError('{} is not a flight recorder log'.format(path))
+        self.view = memoryview(self.map)
+        if index:
+            self._read_index(index)
+        else:
+            # The recorder was not closed; find the complete records and index them here.
+            self._build_index()
+
+    def _read_index(self, index):
+        self.time_step, entries, commands = INDEX_HEADER.unpack_from(self.map, index)
+        position = index + INDEX_HEADER.size
+        self.directory = np.frombuffer(self.map, DIRECTORY_DTYPE, len(DIRECTIONS) * 256, position)
+        position += self.directory.nbytes
+        self.command_directory = np.frombuffer(self.map, DIRECTORY_DTYPE, len(DIRECTIONS) * 256, position)
+        position += self.command_directory.nbytes
+        self.times = np.frombuffer(self.map, TIME_DTYPE, entries, position)
+        position += self.times.nbytes
+        self.by_opcode = np.frombuffer(self.map, '<u4', self.records, position)
+        position += self.by_opcode.nbytes
+        self.by_command = np.frombuffer(self.map, COMMAND_DTYPE, commands, position)
+
+    def _build_index(self):
+        offsets = array.array('I')
+        self.end = FILE_HEADER.size
+        for _, _, offset, length in self._scan(FILE_HEADER.size, len(self.map)):
+            offsets.append(offset - RECORD.size)
+            self.end = offset + length
+        self.records = len(offsets)
+        self.time_step = TIME_STEP
+        self.directory, self.times, self.by_opcode, self.command_directory, self.by_command = build_index(
+            self.map, np.frombuffer(offsets, dtype=np.uint32))
+
+    def __len__(self):
+        return self.records
+
+    def _scan(self, offset, end):
+        while offset + RECORD.size <= end:
+            timestamp, length, direction = RECORD.unpack_from(self.map, offset)
+            if not timestamp or offset + RECORD.size + length > end:
+                break
+            yield timestamp, direction, offset + RECORD.size, length
+            offset += RECORD.size + length
+
+    def __iter__(self):
+        return self.read()
+
+    def read(self, start=None, stop=None):
+        """Yield ``(timestamp, direction, frame)`` of the records from ``start`` up to ``stop`` (timestamps)."""
+        offset = FILE_HEADER.size if start is None else self.seek(start)
+        for timestamp, direction, offset, length in self._scan(offset, self.end):
+            if stop is not None and timestamp >= stop:
+                break
+            if start is None or timestamp >= start:
+                yield timestamp, direction, self.view[offset:offset + length]
+
+    def seek(self, timestamp):
+        """Return the offset of the first record at or after ``timestamp``, or the end offset if none is."""
+        entry = int(np.searchsorted(self.times['timestamp'], timestamp, side='right')) - 1
+        offset = int(self.times['offset'][entry]) if entry >= 0 else FILE_HEADER.size
+        for stamp, _, data, _ in self._scan(offset, self.end):
+            if stamp >= timestamp:
+                return data - RECORD.size
+        return self.end
+
+    def offsets(self, opcode, direction):
+        """Offsets of every record in ``direction`` whose frame starts with ``opcode``, in time order."""
+        first, count = self.directory[direction * 256 + opcode]
+        return self.by_opcode[first:first + count]
+
+    def commands(self, opcode, direction):
+        """:data:`COMMAND_DTYPE` entries of every ``opcode`` command in ``direction``, in time order."""
+        first, count = self.command_directory[direction * 256 + opcode]
+        return self.by_command[first:first + count]
+
+    def counts(self):
+        """Return ``{(direction, opcode): records}`` for every opcode in the log."""
+        return {divmod(int(key), 256): int(self.directory['count'][key])
+                for key in np.flatnonzero(self.directory['count'])}
+
+    def headers(self, offsets):
+        """Record headers at ``offsets`` as a :data:`RECORD_DTYPE` array."""
+        return gather(self.map, offsets, RECORD.size).view(RECORD_DTYPE)[:, 0]
+
+    def extract(self, spec, direction=INBOUND, start=None, stop=None):
+        """Return every ``spec`` command in ``direction`` as a structured array with a ``timestamp`` column.
+
+        Commands sent on their own and inside batch, packed and reliable
+        frames are all found, in the order they were recorded, with the
+        timestamp of their record.  ``start`` and ``stop`` limit the
+        timestamps.
+        """
+        entries = self.commands(spec.opcode, direction)
+        headers = self.headers(entries['record'])
+        keep = np.ones(len(entries), dtype=bool)
+        if start is not None:
+            keep &= headers['timestamp'] >= start
+        if stop is not None:
+            keep &= headers['timestamp'] < stop
+        entries, headers = entries[keep], headers[keep]
+        packed = np.frombuffer(self.map, dtype=np.uint8)[entries['frame'].astype(np.intp)] == PACKED
+        frames = gather(self.map, entries['frame'][~packed], spec.size).view(spec_dtype(spec))[:, 0]
+        result = np.zeros(len(frames), dtype=[('timestamp', '<i8')] + [(name, frames.dtype[name].newbyteorder('='))
+                                                                       for name in spec.field_names])
+        result['timestamp'] = headers['timestamp'][~packed]
+        for name in spec.field_names:
+            result[name] = frames[name]
+        if not packed.any():
+            return result
+        # Packed commands are not byte aligned, so decode their frames.
+        rows = []
+        records = []
+        for record, frame, header in zip(entries['record'][packed].tolist(), entries['frame'][packed].tolist(),
+                                          headers[packed]):
+            end = record + RECORD.size + int(header['length'])
+            for command, values in decode_packed(self.map[frame:end]):
+                if command is spec:
+                    rows.append((header['timestamp'],) + values)
+                    records.append(record)
+        records = np.concatenate([entries['record'][~packed], np.array(records, dtype=entries['record'].dtype)])
+        result = np.concatenate([result, np.array(rows, dtype=result.dtype)])
+        return result[np.argsort(records, kind='stable')]
+
+    def wall_time(self, timestamp):
+        """Convert a record's monotonic ``timestamp`` to wall clock nanoseconds."""
+        return self.wall_start + timestamp - self.monotonic_start
+
+    def close(self):
+        self.directory = self.times = self.by_opcode = self.command_directory = self.by_command = None
+        self.view.release()
+        self.map.close()
+
+
+def opcode_name(opcode):
+    spec = SPECS[opcode]
+    return spec.name if spec is not None else FRAME_NAMES.get(opcode, '0x{:02X}'.format(opcode))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Summarise a flight recorder log or export one command from it.')
+    parser.add_argument('log', help='flight recorder log')
+    parser.add_argument('--export', metavar='NAME', help='write every frame of this command (e.g. SensorStats) as CSV')
+    parser.add_argument('--direction', choices=DIRECTIONS, help='direction of the exported frames '
+                                                                '(default: outbound for opcodes from 0x80)')
+    args = parser.parse_args(argv)
+
+    flight = FlightLog(args.log)
+    try:
+        if args.export:
+            spec = next((spec for spec in SPECS if spec is not None and spec.name == args.export), None)
+            if spec is None:
+                parser.error('unknown command {!r}'.format(args.export))
+            direction = DIRECTIONS.index(args.direction) if args.direction else int(spec.opcode >= 0x80)
+            table = flight.extract(spec, direction)
+            seconds = (table['timestamp'] - flight.monotonic_start) / 1e9
+            sys.stdout.write(','.join(('seconds',) + spec.field_names) + '\n')
+            columns = [seconds] + [table[name] for name in spec.field_names]
+            for row in zip(*columns):
+                sys.stdout.write(','.join(str(value) for value in row) + '\n')
+            return
+        print('{:,} records, {:,} bytes'.format(len(flight), flight.end))
+        for (direction, opcode), count in sorted(flight.counts().items()):
+            print('{:>8}  0x{:02X}  {:<16}  {:>10,}'.format(DIRECTIONS[direction], opcode, opcode_name(opcode), count))
+    finally:
+        flight.close()
+
+
+if __name__ == '__main__':
+    main()
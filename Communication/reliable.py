@@ -0,0 +1,236 @@
+"""Optional reliable delivery for critical one-shot commands.
+
+Setpoints are sent fire-and-forget: a lost one is replaced by the next a
+moment later.  A one-shot action such as releasing a marker or closing a
+gripper must instead arrive exactly once, so the surface can wrap any command
+or batch in a reliable frame::
+
+    0xF1 | session (uint16) | sequence (uint16) | command or batch frame
+
+and the Pi answers every reliable frame with an acknowledgement::
+
+    0xF2 | session (uint16) | next expected sequence (uint16) | bitmap (uint32)
+
+Every sequence before the next expected one has arrived, and bit ``i`` of the
+bitmap is set if ``next expected + 1 + i`` has too (a selective ACK).  The
+Pi runs each command as soon as it arrives even when earlier ones are
+missing, so a lost frame never holds up the ones behind it the way it would
+on TCP, and it drops any sequence it has already seen (see
+:mod:`Communication.dedup`).
+
+The sender (:class:`ReliableSender`) retransmits a frame that is not
+acknowledged within its retransmission timeout, which follows the measured
+round trip time as in RFC 6298, and retransmits holes in the selective ACK
+straight away.  ``session`` is picked at random by each sender so a
+restarted surface is not mistaken for duplicates of its previous run.
+"""
+import collections
+import logging
+import random
+import struct
+import time
+
+from .dedup import DedupCache
+from .protocol import ACK, BYTE_ORDER, RELIABLE, ProtocolError
+
+log = logging.getLogger(__name__)
+
+HEADER = struct.Struct(BYTE_ORDER + 'BHH')
+ACK_FRAME = struct.Struct(BYTE_ORDER + 'BHHI')
+
+#: Sequences a receiver accepts ahead of the next expected one.
+WINDOW = 1024
+
+#: Sequences covered by the bitmap of an acknowledgement.
+SACK_BITS = 32
+
+
+def distance(a, b):
+    """How far sequence ``a`` is after ``b``, modulo 2**16 (negative if before)."""
+    d = (a - b) & 0xFFFF
+    return d - 0x10000 if d >= 0x8000 else d
+
+
+def decode_ack(data):
+    """Return ``(session, next expected, bitmap)`` of an acknowledgement."""
+    if len(data) != ACK_FRAME.size:
+        raise ProtocolError('acknowledgement of {} bytes, expected {}'.format(len(data), ACK_FRAME.size))
+    return ACK_FRAME.unpack(data)[1:]
+
+
+class Window(object):
+    """Receive state of one session: the next expected sequence and those received after it."""
+
+    def __init__(self, expected):
+        self.expected = expected
+        self.received = set()
+
+    def accept(self, sequence):
+        """Record ``sequence``, returning whether it is new."""
+        ahead = distance(sequence, self.expected)
+        if ahead < 0 or ahead >= WINDOW or sequence in self.received:
+            return False
+        self.received.add(sequence)
+        while self.expected in self.received:
+            self.received.discard(self.expected)
+            self.expected = (self.expected + 1) & 0xFFFF
+        return True
+
+    def bitmap(self):
+        bits = 0
+        for sequence in self.received:
+            ahead = distance(sequence, self.expected) - 1
+            if ahead < SACK_BITS:
+                bits |= 1 << ahead
+        return bits
+
+
+class ReliableReceiver(object):
+    """Pi-side state that filters duplicate reliable frames and acknowledges them.
+
+    ``send`` is called with each acknowledgement frame.  Acknowledgement
+    state is kept for the ``sessions`` most recently active senders, and
+    every ``(session, sequence)`` that ran is also recorded in ``seen`` (a
+    :class:`~Communication.dedup.DedupCache`), which catches retries the
+    acknowledgement state alone would miss, e.g. after a session was
+    forgotten.
+    """
+
+    def __init__(self, send=None, sessions=4, seen=None):
+        self.send = send
+        self.sessions = collections.OrderedDict()
+        self.max_sessions = sessions
+        self.seen = DedupCache() if seen is None else seen
+        self.duplicates = 0
+
+    def receive(self, data):
+        """Acknowledge the reliable frame ``data``, returning its inner frame or ``None`` for a duplicate."""
+        if len(data) <= HEADER.size:
+            raise ProtocolError('reliable frame truncated: {} bytes'.format(len(data)))
+        _, session, sequence = HEADER.unpack_from(data)
+        if data[HEADER.size] == RELIABLE:
+            raise ProtocolError('reliable frame nested in a reliable frame')
+        window = self.sessions.get(session)
+        if window is None:
+            # A new session starts at 0; anything further on is from a session
+            # that was running before this process started.
+            window = Window(0 if sequence < WINDOW else sequence)
+            self.sessions[session] = window
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+        else:
+            self.sessions.move_to_end(session)
+        new = window.accept(sequence) and self.seen.add((session, sequence))
+        if not new:
+            self.duplicates += 1
+        if self.send is not None:
+            self.send(ACK_FRAME.pack(ACK, session, window.expected, window.bitmap()))
+        return data[HEADER.size:] if new else None
+
+
+class Pending(object):
+    __slots__ = ('frame', 'sent', 'retries')
+
+    def __init__(self, frame, sent):
+        self.frame = frame
+        self.sent = sent
+        self.retries = 0
+
+
+class ReliableSender(object):
+    """Surface-side end of the reliable channel.
+
+    ``transmit`` sends a datagram to the Pi.  Call :meth:`ack` with every
+    acknowledgement received and :meth:`poll` regularly (at least every
+    :meth:`next_timeout` seconds) to retransmit.  A frame not acknowledged
+    after ``max_retries`` retransmissions is given up on, logged and counted
+    in :attr:`failed`.
+    """
+
+    def __init__(self, transmit, min_rto=0.01, max_rto=2.0, initial_rto=0.2, max_retries=10,
+                 clock=time.monotonic, session=None):
+        self.transmit = transmit
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.rto = initial_rto
+        self.max_retries = max_retries
+        self.clock = clock
+        self.session = random.getrandbits(16) if session is None else session
+        self.sequence = 0
+        self.pending = collections.OrderedDict()
+        self.srtt = None
+        self.rttvar = None
+        self.sent = 0
+        self.retransmitted = 0
+        self.failed = 0
+
+    def send(self, frame):
+        """Send ``frame`` (a command or batch) reliably, returning its sequence number."""
+        sequence = self.sequence
+        self.sequence = (sequence + 1) & 0xFFFF
+        frame = HEADER.pack(RELIABLE, self.session, sequence) + bytes(frame)
+        self.pending[sequence] = Pending(frame, self.clock())
+        self.transmit(frame)
+        self.sent += 1
+        return sequence
+
+    def _measured(self, rtt):
+        # RFC 6298, section 2.
+        if self.srtt is None:
+            self.srtt, self.rttvar = rtt, rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.rto = min(max(self.srtt + 4 * self.rttvar, self.min_rto), self.max_rto)
+
+    def ack(self, data):
+        """Apply an acknowledgement frame from the Pi."""
+        session, expected, bitmap = decode_ack(data)
+        if session != self.session:
+            return
+        now = self.clock()
+        highest = None
+        for sequence in list(self.pending):
+            ahead = distance(sequence, expected)
+            if ahead < 0 or (0 < ahead <= SACK_BITS and bitmap >> (ahead - 1) & 1):
+                entry = self.pending.pop(sequence)
+                # Karn's algorithm: a retransmitted frame gives no usable sample.
+                if not entry.retries:
+                    self._measured(now - entry.sent)
+                if ahead > 0 and (highest is None or ahead > highest):
+                    highest = ahead
+        if highest is not None:
+            # Frames the Pi skipped over while acknowledging later ones were
+            # lost; resend them now rather than waiting for the timeout.
+            for sequence, entry in self.pending.items():
+                if 0 <= distance(sequence, expected) < highest and now - entry.sent >= (self.srtt or 0):
+                    self._retransmit(sequence, entry, now)
+
+    def _retransmit(self, sequence, entry, now):
+        entry.retries += 1
+        entry.sent = now
+        self.retransmitted += 1
+        self.transmit(entry.frame)
+
+    def _timeout(self, entry):
+        return min(self.rto * 2 ** entry.retries, self.max_rto)
+
+    def poll(self):
+        """Retransmit every frame whose timeout has passed."""
+        now = self.clock()
+        for sequence, entry in list(self.pending.items()):
+            if now - entry.sent < self._timeout(entry):
+                continue
+            if entry.retries >= self.max_retries:
+                del self.pending[sequence]
+                self.failed += 1
+                log.warning('giving up on reliable frame %d after %d retransmissions', sequence, entry.retries)
+            else:
+                self._retransmit(sequence, entry, now)
+
+    def next_timeout(self):
+        """Seconds until :meth:`poll` next has something to do, or ``None`` if nothing is pending."""
+        if not self.pending:
+            return None
+        now = self.clock()
+        return max(0.0, min(entry.sent + self._timeout(entry) - now for entry in self.pending.values()))
@@ -0,0 +1,109 @@
+"""Re-drive the dispatcher from a flight recorder log.
+
+    python -m Communication.replay LOG [--start SECONDS] [--seconds SECONDS] [--speed 1] [--profile]
+                                       [--module MODULE]...
+
+Every inbound frame in ``LOG`` (see :mod:`Communication.recorder`) is handed
+to a :class:`~Communication.service.CommandProtocol` with the real
+peripheral handlers on simulated backends, as in
+:mod:`Communication.simulator`, with the periodic functions such as the
+control tick running alongside and sensors polled at the rates the replayed
+commands subscribe them at.  Frames are replayed at their recorded pace
+divided by ``--speed``, so ``--speed 10`` replays ten times faster and
+``--speed 0`` as fast as the dispatcher goes.  ``--start`` and ``--seconds``
+replay only part of the log, found with its time index.  ``--profile`` profiles the
+dispatch (see :mod:`Communication.profiling`) and prints the report.
+
+Nothing is sent anywhere: reliable frames are not acknowledged and
+heartbeats are not echoed.
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from Peripherals import backends
+
+from . import profiling
+from .dispatch import build_registry
+from .profiling import Profiler
+from .recorder import INBOUND, FlightLog
+from .service import CommandProtocol, Ticker, poll_sensors, run_periodic
+from .simulator import add_arguments, backend_options
+
+
+async def replay(log, protocol, speed=1.0, start=None, stop=None):
+    """Hand the inbound frames of ``log`` to ``protocol``, returning how many there were.
+
+    Frames are replayed at their recorded pace divided by ``speed``, or as
+    fast as possible if ``speed`` is 0.  ``start`` and ``stop`` are
+    timestamps limiting the part of the log replayed.
+    """
+    first = None
+    count = 0
+    for timestamp, direction, frame in log.read(start, stop):
+        if direction != INBOUND:
+            continue
+        if speed:
+            now = time.monotonic_ns()
+            if first is None:
+                first = (timestamp, now)
+            delay = first[1] + (timestamp - first[0]) / speed - now
+            if delay > 0:
+                await asyncio.sleep(delay / 1e9)
+        protocol.handle(frame)
+        count += 1
+    return count
+
+
+async def run(args):
+    registry = build_registry(args.module or None)
+    backends.simulate(registry.modules, **backend_options(args))
+    profiler = Profiler() if args.profile else None
+    protocol = CommandProtocol(registry.handlers, profiler=profiler)
+    protocol.connection_made(None)
+    if profiler is not None:
+        protocol.profile(profiling.ON)
+    tickers = [Ticker(func, rate) for func, rate in registry.periodic]
+    tasks = [asyncio.ensure_future(run_periodic(tickers)), asyncio.ensure_future(poll_sensors())]
+    log = FlightLog(args.log)
+    start = log.monotonic_start + int(args.start * 1e9)
+    stop = None if args.seconds is None else start + int(args.seconds * 1e9)
+    try:
+        begun = time.perf_counter()
+        count = await replay(log, protocol, args.speed, start, stop)
+        await protocol.drain()
+        elapsed = time.perf_counter() - begun
+    finally:
+        for task in tasks:
+            task.cancel()
+        log.close()
+    print('replayed {:,} of {:,} records in {:.2f} s, {:,} dropped'.format(count, len(log), elapsed, protocol.dropped))
+    for ticker in tickers:
+        print(ticker.describe())
+    if profiler is not None:
+        for line in profiler.describe():
+            print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('log', help='flight recorder log to replay')
+    parser.add_argument('--start', type=float, default=0.0,
+                        help='seconds into the recording to start at (default: %(default)s)')
+    parser.add_argument('--seconds', type=float, help='seconds of the recording to replay (default: all)')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='replay this many times faster than recorded, 0 for as fast as possible '
+                             '(default: %(default)s)')
+    parser.add_argument('--profile', action='store_true', help='profile the dispatch and print the report')
+    parser.add_argument('--module', action='append', metavar='MODULE',
+                        help='peripheral module to load instead of all of them; may be repeated')
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(name)s %(levelname)s: %(message)s')
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+# Generated from Communication/schema.py by python -m Communication.codegen; do not edit.
+"""Scapy layers of the packets in :mod:`Communication.schema`.
+
+Use them through :mod:`Communication.scapy_layers`, which binds them under
+its ``Command`` header.
+"""
+from scapy.fields import ByteField, IEEEFloatField, IntField, ShortField, SignedShortField
+from scapy.packet import Packet
+
+
+class FixedSize(Packet):
+    """Base of the packet layers.  Packets have a fixed size; anything after one is the next packet."""
+
+    def extract_padding(self, s):
+        return b'', s
+
+
+class Stop(FixedSize):
+    """Stop every actuator at once."""
+
+    name = 'Stop'
+    fields_desc = []
+
+
+class ServoPosition(FixedSize):
+    """Move a servo to a pulse width in microseconds."""
+
+    name = 'ServoPosition'
+    fields_desc = [
+        ByteField('servo', 0),
+        ShortField('position', 0),
+    ]
+
+
+class MotorThrottle(FixedSize):
+    """Set an auxiliary motor throttle, from -32768 (full reverse) to 32767."""
+
+    name = 'MotorThrottle'
+    fields_desc = [
+        ByteField('motor', 0),
+        SignedShortField('throttle', 0),
+    ]
+
+
+class Gripper(FixedSize):
+    """Open or close a gripper."""
+
+    name = 'Gripper'
+    fields_desc = [
+        ByteField('gripper', 0),
+        ByteField('closed', 0),
+    ]
+
+
+class MarkerRelease(FixedSize):
+    """Release a marker."""
+
+    name = 'MarkerRelease'
+    fields_desc = [
+        ByteField('marker', 0),
+    ]
+
+
+class SensorRequest(FixedSize):
+    """Ask for the statistics of a sensor over the last window_ms milliseconds."""
+
+    name = 'SensorRequest'
+    fields_desc = [
+        ByteField('sensor', 0),
+        ShortField('window_ms', 0),
+    ]
+
+
+class Subscribe(FixedSize):
+    """Poll a sensor at least rate times a second (0 to unsubscribe)."""
+
+    name = 'Subscribe'
+    fields_desc = [
+        ByteField('sensor', 0),
+        ShortField('rate', 0),
+    ]
+
+
+class SubscribeTopic(FixedSize):
+    """Publish a reduction of a sensor at rate Hz as a topic (rate 0 to unsubscribe)."""
+
+    name = 'SubscribeTopic'
+    fields_desc = [
+        ByteField('topic', 0),
+        ByteField('sensor', 0),
+        ShortField('rate', 0),
+        ByteField('reduction', 0),
+    ]
+
+
+class Profile(FixedSize):
+    """Switch dispatch profiling off (0) or on (1), or ask for a report (2)."""
+
+    name = 'Profile'
+    fields_desc = [
+        ByteField('mode', 0),
+    ]
+
+
+class SensorStats(FixedSize):
+    """Statistics of one field of a sensor over a window."""
+
+    name = 'SensorStats'
+    fields_desc = [
+        ByteField('sensor', 0),
+        ByteField('field', 0),
+        IntField('count', 0),
+        IEEEFloatField('mean', 0),
+        IEEEFloatField('min', 0),
+        IEEEFloatField('max', 0),
+        IEEEFloatField('last', 0),
+    ]
+
+
+class LinkStats(FixedSize):
+    """Link quality measured with heartbeats."""
+
+    name = 'LinkStats'
+    fields_desc = [
+        IntField('heartbeats', 0),
+        IntField('lost', 0),
+        IntField('late', 0),
+        IntField('reordered', 0),
+        IEEEFloatField('rtt_p50_us', 0),
+        IEEEFloatField('rtt_p99_us', 0),
+        IEEEFloatField('jitter_us', 0),
+        ShortField('queue_depth', 0),
+        ShortField('queue_peak', 0),
+    ]
+
+
+class HandlerProfile(FixedSize):
+    """Dispatch timings of one opcode."""
+
+    name = 'HandlerProfile'
+    fields_desc = [
+        ByteField('opcode', 0),
+        IntField('count', 0),
+        IEEEFloatField('parse_p50_us', 0),
+        IEEEFloatField('parse_p99_us', 0),
+        IEEEFloatField('queue_p50_us', 0),
+        IEEEFloatField('queue_p99_us', 0),
+        IEEEFloatField('run_p50_us', 0),
+        IEEEFloatField('run_p99_us', 0),
+        IEEEFloatField('run_max_us', 0),
+    ]
+
+
+#: Scapy layer for each packet, keyed by its name.
+layers = {
+    'Stop': Stop,
+    'ServoPosition': ServoPosition,
+    'MotorThrottle': MotorThrottle,
+    'Gripper': Gripper,
+    'MarkerRelease': MarkerRelease,
+    'SensorRequest': SensorRequest,
+    'Subscribe': Subscribe,
+    'SubscribeTopic': SubscribeTopic,
+    'Profile': Profile,
+    'SensorStats': SensorStats,
+    'LinkStats': LinkStats,
+    'HandlerProfile': HandlerProfile,
+}
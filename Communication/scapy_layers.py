@@ -0,0 +1,138 @@
+"""Scapy layers of the packets and frames sent between the surface and the Pi.
+
+These are for debugging and for crafting packets by hand, e.g.::
+
+    >>> from Communication.scapy_layers import Command, layers
+    >>> Command(opcode=0x10) / layers['ServoPosition'](servo=2, position=1500)
+
+The receive loop on the Pi should use the struct codec on the spec instead;
+Scapy's per-field dissection is far too slow for that.  The layer of each
+packet is generated from :mod:`Communication.schema` into
+:mod:`Communication.scapy_commands`.
+"""
+from scapy.fields import (ByteEnumField, ByteField, FieldLenField, FieldListField, FlagsField, IEEEFloatField, IntField,
+                          LongField, PacketListField, ShortField, StrField, StrLenField, XIntField, XShortField)
+from scapy.layers.inet import UDP
+from scapy.packet import Packet, bind_layers
+
+from . import commands  # noqa: F401  (registers the command specs)
+from .protocol import (ACK, BATCH, CHECKSUM, COMMAND_PORT, HEARTBEAT, PACKED, RELIABLE, TELEMETRY, TELEMETRY_PORT,
+                       TOPICS, checksum, registered_specs)
+from .scapy_commands import layers
+
+
+class Command(Packet):
+    """Opcode header shared by all command packets."""
+
+    name = 'Command'
+    fields_desc = [ByteEnumField('opcode', 0, dict([(spec.opcode, spec.name) for spec in registered_specs()]
+                                                   + [(BATCH, 'Batch'), (RELIABLE, 'Reliable'), (ACK, 'Ack'),
+                                                      (HEARTBEAT, 'Heartbeat'), (PACKED, 'Packed'),
+                                                      (TELEMETRY, 'Telemetry'), (TOPICS, 'Topics')]))]
+
+
+class Batch(Packet):
+    """Several commands sharing one header and checksum.
+
+    The checksum is filled in when the packet is built if left as ``None``.
+    """
+
+    name = 'Batch'
+    fields_desc = [
+        FieldLenField('count', None, count_of='commands', fmt='B'),
+        PacketListField('commands', [], Command, count_from=lambda pkt: pkt.count),
+        XShortField('checksum', None),
+    ]
+
+    def post_build(self, p, pay):
+        if self.checksum is None:
+            # The checksum also covers the opcode byte in the Command header.
+            body = p[:-CHECKSUM.size]
+            p = body + CHECKSUM.pack(checksum(bytes([BATCH]) + body))
+        return p + pay
+
+
+class Reliable(Packet):
+    """Reliable wrapper around a command or batch, see :mod:`Communication.reliable`."""
+
+    name = 'Reliable'
+    fields_desc = [
+        ShortField('session', 0),
+        ShortField('sequence', 0),
+    ]
+
+
+class Ack(Packet):
+    """Selective acknowledgement of reliable frames."""
+
+    name = 'Ack'
+    fields_desc = [
+        ShortField('session', 0),
+        ShortField('expected', 0),
+        XIntField('received', 0),
+    ]
+
+
+class Heartbeat(Packet):
+    """Heartbeat from the Pi, echoed by the surface; see :mod:`Communication.link`."""
+
+    name = 'Heartbeat'
+    fields_desc = [
+        IntField('sequence', 0),
+        LongField('sent', 0),
+    ]
+
+
+class Telemetry(Packet):
+    """Delta-encoded sensor channels, see :mod:`Communication.telemetry`.
+
+    ``values`` are the raw float32 values of the channels set in ``changed``.
+    """
+
+    name = 'Telemetry'
+    fields_desc = [
+        ShortField('sequence', 0),
+        FlagsField('flags', 0, 8, ['keyframe']),
+        ShortField('channels', 0),
+        StrLenField('changed', b'', length_from=lambda pkt: (pkt.channels + 7) // 8),
+        StrField('values', b''),
+    ]
+
+
+class TopicEntry(Packet):
+    """One topic in a :class:`Topics` frame, see :mod:`Communication.topics`."""
+
+    name = 'TopicEntry'
+    fields_desc = [
+        ByteField('topic', 0),
+        ShortField('samples', 0),
+        FieldLenField('width', None, count_of='values', fmt='B'),
+        FieldListField('values', [], IEEEFloatField('value', 0.0), count_from=lambda pkt: pkt.width),
+    ]
+
+    def extract_padding(self, s):
+        return b'', s
+
+
+class Topics(Packet):
+    """Reduced sensor topics, see :mod:`Communication.topics`."""
+
+    name = 'Topics'
+    fields_desc = [
+        FieldLenField('count', None, count_of='topics', fmt='B'),
+        PacketListField('topics', [], TopicEntry, count_from=lambda pkt: pkt.count),
+    ]
+
+
+for _spec in registered_specs():
+    bind_layers(Command, layers[_spec.name], opcode=_spec.opcode)
+
+bind_layers(Command, Batch, opcode=BATCH)
+bind_layers(Command, Reliable, opcode=RELIABLE)
+bind_layers(Reliable, Command)
+bind_layers(Command, Ack, opcode=ACK)
+bind_layers(Command, Heartbeat, opcode=HEARTBEAT)
+bind_layers(Command, Telemetry, opcode=TELEMETRY)
+bind_layers(Command, Topics, opcode=TOPICS)
+bind_layers(UDP, Command, dport=COMMAND_PORT)
+bind_layers(UDP, Command, dport=TELEMETRY_PORT)
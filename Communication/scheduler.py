@@ -0,0 +1,147 @@
+"""Priority scheduling for frames sent from the Pi to the surface.
+
+MAVLink movement traffic shares the tether with everything we send, so our
+own frames are queued by priority and the lower priorities are rate-limited
+with token buckets:
+
+- :data:`SAFETY` (safety frames, acknowledgements and heartbeats) is always
+  sent first and is never rate-limited,
+- :data:`REPLY` (sensor statistics, link statistics and handler profiles,
+  which the surface asked for or waits on) comes next, and
+- :data:`BULK` (telemetry and topics) is sent last and limited to a
+  bandwidth budget, dropping the oldest frames when it falls behind, so it
+  can never starve MAVLink or the frames above it.
+"""
+import threading
+import time
+from collections import deque
+
+from .commands import HANDLER_PROFILE, LINK_STATS, SENSOR_STATS
+from .protocol import ACK, BATCH, HEARTBEAT
+
+SAFETY = 0
+REPLY = 1
+BULK = 2
+PRIORITIES = (SAFETY, REPLY, BULK)
+
+#: Default priority of frames by opcode, following the opcode groups in
+#: :mod:`Communication.schema`.  The Pi only sends opcodes from 0x80 and
+#: framing, so anything else falls back to :data:`BULK`.
+OPCODE_PRIORITY = [SAFETY] * 0x10 + [BULK] * 0xF0
+for _spec in (SENSOR_STATS, LINK_STATS, HANDLER_PROFILE):
+    OPCODE_PRIORITY[_spec.opcode] = REPLY
+del _spec
+#: A late acknowledgement makes the surface resend a critical command.
+OPCODE_PRIORITY[ACK] = SAFETY
+#: Heartbeats measure the link, not how long our own queues hold them.
+OPCODE_PRIORITY[HEARTBEAT] = SAFETY
+
+#: Default ``(bytes per second, burst bytes)`` budget of each priority;
+#: ``None`` is unlimited.
+DEFAULT_LIMITS = {SAFETY: None, REPLY: (64000, 8000), BULK: (32000, 4000)}
+
+#: Default number of frames each priority may queue; ``None`` is unbounded.
+DEFAULT_QUEUE_LIMITS = {SAFETY: None, REPLY: 256, BULK: 64}
+
+
+def priority_of(frame):
+    """Return the default priority of ``frame`` from its opcode.
+
+    A batch gets the priority of its first command.
+    """
+    opcode = frame[0]
+    if opcode == BATCH and len(frame) > 2 and frame[1]:
+        opcode = frame[2]
+    return OPCODE_PRIORITY[opcode]
+
+
+class TokenBucket(object):
+    """Allows ``rate`` bytes per second on average with bursts of up to ``burst`` bytes."""
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.clock = clock
+        self.tokens = self.burst
+        self.stamp = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def take(self, size):
+        """Spend ``size`` tokens if they are available."""
+        self._refill()
+        # A frame larger than the burst could otherwise never be sent.
+        size = min(size, self.burst)
+        if self.tokens < size:
+            return False
+        self.tokens -= size
+        return True
+
+    def wait_time(self, size):
+        """Seconds until ``size`` tokens will be available."""
+        self._refill()
+        return max(0.0, (min(size, self.burst) - self.tokens) / self.rate)
+
+
+class PriorityScheduler(object):
+    """Queues frames by priority and passes them to ``transmit`` within their budgets.
+
+    :meth:`submit` and :meth:`flush` return ``None`` when everything queued
+    has been sent, or the number of seconds after which :meth:`flush` should
+    be called again.  Both are safe to call from any thread.
+    """
+
+    def __init__(self, transmit, limits=None, queue_limits=None, clock=time.monotonic):
+        limits = DEFAULT_LIMITS if limits is None else limits
+        queue_limits = DEFAULT_QUEUE_LIMITS if queue_limits is None else queue_limits
+        self.transmit = transmit
+        self.buckets = [TokenBucket(*limits[priority], clock=clock) if limits.get(priority) else None
+                        for priority in PRIORITIES]
+        self.queues = [deque(maxlen=queue_limits.get(priority)) for priority in PRIORITIES]
+        self.sent = [0] * len(PRIORITIES)
+        self.dropped = [0] * len(PRIORITIES)
+        self.lock = threading.Lock()
+
+    def limit(self, priority, rate, burst=None):
+        """Limit ``priority`` to ``rate`` bytes per second (``None`` for no limit)."""
+        with self.lock:
+            if rate is None:
+                self.buckets[priority] = None
+            else:
+                clock = self.buckets[priority].clock if self.buckets[priority] else time.monotonic
+                self.buckets[priority] = TokenBucket(rate, burst or rate / 8.0, clock)
+
+    def submit(self, frame, priority=None):
+        """Queue ``frame`` (at its default priority if none is given) and send what is allowed."""
+        if priority is None:
+            priority = priority_of(frame)
+        with self.lock:
+            queue = self.queues[priority]
+            if queue.maxlen is not None and len(queue) == queue.maxlen:
+                # The deque drops the oldest frame; for telemetry that is the stale one.
+                self.dropped[priority] += 1
+            queue.append(frame)
+        return self.flush()
+
+    def flush(self):
+        """Send queued frames in priority order as far as the budgets allow."""
+        wait = None
+        with self.lock:
+            for priority in PRIORITIES:
+                queue = self.queues[priority]
+                bucket = self.buckets[priority]
+                while queue:
+                    if bucket is not None and not bucket.take(len(queue[0])):
+                        delay = bucket.wait_time(len(queue[0]))
+                        wait = delay if wait is None else min(wait, delay)
+                        break
+                    self.transmit(queue.popleft())
+                    self.sent[priority] += 1
+        return wait
+
+    def pending(self):
+        """Number of queued frames of each priority."""
+        return [len(queue) for queue in self.queues]
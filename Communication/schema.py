@@ -0,0 +1,104 @@
+"""Declarative schema of every fixed-size packet sent between the surface and the Pi.
+
+This is the one place a packet is described.  After editing it run::
+
+    python -m Communication.codegen
+
+which regenerates :mod:`Communication.commands` (the struct codec specs,
+their registration in the opcode tables and straight-line bit-packed
+codecs), :mod:`Communication.scapy_commands` (the Scapy layers) and
+:mod:`Communication.encoders` (surface-side encoder functions).
+``python -m Communication.codegen --check`` fails if any of them is out of
+date.
+
+Opcodes are grouped by purpose so they can be recognised at a glance in a
+capture:
+
+- ``0x00``-``0x0F`` safety (stop, reset)
+- ``0x10``-``0x2F`` actuation (servos, motors, grippers)
+- ``0x30``-``0x4F`` sensor requests
+- ``0x50``-``0x5F`` diagnostics
+- ``0x80``-``0xEF`` frames sent from the Pi to the surface
+- ``0xF0``-``0xFF`` reserved for framing
+
+Each field has a ``struct`` format character and, for commands the surface
+sends, how it is bit-packed (see :mod:`Communication.packed`).
+"""
+import collections
+
+Field = collections.namedtuple('Field', 'name format packed', defaults=(None,))
+Field.__doc__ = """A packet field: its name, ``struct`` format and packed kind (``None`` if not packed)."""
+
+Packet = collections.namedtuple('Packet', 'constant name opcode fields doc')
+Packet.__doc__ = """A packet: its Python constant, wire name, opcode, fields and a one-line description."""
+
+PACKETS = [
+    Packet('STOP', 'Stop', 0x01, [], 'Stop every actuator at once.'),
+
+    Packet('SERVO_POSITION', 'ServoPosition', 0x10, [
+        Field('servo', 'B', 'u4'),
+        Field('position', 'H', 'u12'),
+    ], 'Move a servo to a pulse width in microseconds.'),
+    Packet('MOTOR_THROTTLE', 'MotorThrottle', 0x11, [
+        Field('motor', 'B', 'u4'),
+        Field('throttle', 'h', 'ivar'),
+    ], 'Set an auxiliary motor throttle, from -32768 (full reverse) to 32767.'),
+    Packet('GRIPPER', 'Gripper', 0x12, [
+        Field('gripper', 'B', 'u4'),
+        Field('closed', 'B', 'u1'),
+    ], 'Open or close a gripper.'),
+    Packet('MARKER_RELEASE', 'MarkerRelease', 0x13, [
+        Field('marker', 'B', 'u8'),
+    ], 'Release a marker.'),
+
+    Packet('SENSOR_REQUEST', 'SensorRequest', 0x30, [
+        Field('sensor', 'B', 'u8'),
+        Field('window_ms', 'H', 'uvar'),
+    ], 'Ask for the statistics of a sensor over the last window_ms milliseconds.'),
+    Packet('SUBSCRIBE', 'Subscribe', 0x31, [
+        Field('sensor', 'B', 'u8'),
+        Field('rate', 'H', 'uvar'),
+    ], 'Poll a sensor at least rate times a second (0 to unsubscribe).'),
+    Packet('SUBSCRIBE_TOPIC', 'SubscribeTopic', 0x32, [
+        Field('topic', 'B', 'u8'),
+        Field('sensor', 'B', 'u8'),
+        Field('rate', 'H', 'uvar'),
+        Field('reduction', 'B', 'u2'),
+    ], 'Publish a reduction of a sensor at rate Hz as a topic (rate 0 to unsubscribe).'),
+
+    Packet('PROFILE', 'Profile', 0x50, [
+        Field('mode', 'B', 'u2'),
+    ], 'Switch dispatch profiling off (0) or on (1), or ask for a report (2).'),
+
+    Packet('SENSOR_STATS', 'SensorStats', 0x80, [
+        Field('sensor', 'B'),
+        Field('field', 'B'),
+        Field('count', 'I'),
+        Field('mean', 'f'),
+        Field('min', 'f'),
+        Field('max', 'f'),
+        Field('last', 'f'),
+    ], 'Statistics of one field of a sensor over a window.'),
+    Packet('LINK_STATS', 'LinkStats', 0x83, [
+        Field('heartbeats', 'I'),
+        Field('lost', 'I'),
+        Field('late', 'I'),
+        Field('reordered', 'I'),
+        Field('rtt_p50_us', 'f'),
+        Field('rtt_p99_us', 'f'),
+        Field('jitter_us', 'f'),
+        Field('queue_depth', 'H'),
+        Field('queue_peak', 'H'),
+    ], 'Link quality measured with heartbeats.'),
+    Packet('HANDLER_PROFILE', 'HandlerProfile', 0x84, [
+        Field('opcode', 'B'),
+        Field('count', 'I'),
+        Field('parse_p50_us', 'f'),
+        Field('parse_p99_us', 'f'),
+        Field('queue_p50_us', 'f'),
+        Field('queue_p99_us', 'f'),
+        Field('run_p50_us', 'f'),
+        Field('run_p99_us', 'f'),
+        Field('run_max_us', 'f'),
+    ], 'Dispatch timings of one opcode.'),
+]
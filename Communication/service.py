@@ -0,0 +1,389 @@
+"""Pi-side service that receives commands from the surface and dispatches them.
+
+The service runs on a single asyncio event loop.  Frames arrive through a
+datagram protocol, are decoded with the struct codec (or from bit-packed
+frames, see :mod:`Communication.packed`) and are handed to the handler for
+their opcode; every command in a batch or packed frame is dispatched in the
+same pass.  Handlers come in three kinds:
+
+- plain functions are called inline and must return quickly,
+- coroutine functions are scheduled as tasks on the loop, and
+- functions marked with :func:`blocking` run in a thread pool executor,
+  their own if they were given one.
+
+A slow servo move therefore never holds up the next packet.
+
+Functions that must run at a fixed rate, such as writing actuator outputs
+once per PWM frame, are run by a :class:`Ticker` on the same loop, which
+also records how late each tick starts.
+
+By default the socket is read with ``recv_into`` into preallocated buffers
+(see :mod:`Communication.receiver`) so receiving a packet does not allocate a
+new ``bytes`` object.
+"""
+import asyncio
+import collections
+import functools
+import logging
+import time
+
+import numpy as np
+
+from . import profiling
+from .commands import PROFILE
+from .packed import decode_packed
+from .protocol import BATCH, COMMAND_PORT, HEARTBEAT, PACKED, RELIABLE, ProtocolError, decode_batch, decode_frame
+from .recorder import INBOUND
+from .reliable import ReliableReceiver
+
+log = logging.getLogger(__name__)
+
+
+def blocking(func=None, executor=None):
+    """Mark ``func`` as a blocking handler that must run in the executor.
+
+    With ``executor`` it runs there rather than in the service's executor,
+    e.g. so ``Stop`` never queues behind slow bus writes::
+
+        @blocking(executor=stopping)
+        def stop():
+            ...
+    """
+    if func is None:
+        return functools.partial(blocking, executor=executor)
+    func.blocking = True
+    func.executor = executor
+    return func
+
+
+def executor_of(func, default):
+    """Return the executor the blocking ``func`` runs in, ``default`` unless it has its own."""
+    return getattr(func, 'executor', None) or default
+
+
+class CommandProtocol(asyncio.DatagramProtocol):
+    """Decodes command datagrams and dispatches them to ``handlers``.
+
+    ``handlers`` maps opcodes to callables; it is turned into a flat table
+    when the endpoint is created so dispatch is a single list index.
+    Reliable frames (see :mod:`Communication.reliable`) are acknowledged by
+    calling ``acknowledge`` with the acknowledgement frame, and echoed
+    heartbeats (see :mod:`Communication.link`) are passed to ``heartbeat``.
+    With a :class:`~Communication.profiling.Profiler` the surface can switch
+    on timing of every dispatch with ``Profile`` commands, and with a
+    :class:`~Communication.recorder.FlightRecorder` every datagram is
+    recorded before it is decoded.
+    """
+
+    def __init__(self, handlers, executor=None, acknowledge=None, heartbeat=None, profiler=None, recorder=None):
+        self.handlers = dict(handlers)
+        self.executor = executor
+        self.reliable = ReliableReceiver(acknowledge)
+        self.heartbeat = heartbeat
+        self.profiler = profiler
+        self.profiling = False
+        self.recorder = recorder
+        if profiler is not None:
+            self.handlers.setdefault(PROFILE.opcode, self.profile)
+        self.table = [None] * 256
+        #: Like :attr:`table`, but each entry takes the time parsing ended
+        #: first and records its timings; used while profiling.
+        self.timed = [None] * 256
+        self.tasks = set()
+        self.transport = None
+        self.received = 0
+        self.dropped = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+        loop = asyncio.get_running_loop()
+        for opcode, handler in self.handlers.items():
+            self.table[opcode] = self._invoker(loop, handler)
+            if self.profiler is not None:
+                self.timed[opcode] = self._timed_invoker(loop, opcode, handler)
+
+    def _invoker(self, loop, handler):
+        """Return a callable that runs ``handler`` the way its kind requires."""
+        if asyncio.iscoroutinefunction(handler):
+            def invoke(*values):
+                self._track(loop.create_task(handler(*values)))
+        elif getattr(handler, 'blocking', False):
+            executor = executor_of(handler, self.executor)
+
+            def invoke(*values):
+                self._track(loop.run_in_executor(executor, handler, *values))
+        else:
+            invoke = handler
+        return invoke
+
+    def _timed_invoker(self, loop, opcode, handler):
+        """Like :meth:`_invoker`, recording how long ``handler`` waited and ran."""
+        profile = self.profiler.profile(opcode)
+        queue, run = profile.queue.record, profile.run.record
+
+        if asyncio.iscoroutinefunction(handler):
+            async def timed(parsed, *values):
+                start = time.monotonic_ns()
+                await handler(*values)
+                queue(start - parsed)
+                run(time.monotonic_ns() - start)
+
+            def invoke(parsed, *values):
+                self._track(loop.create_task(timed(parsed, *values)))
+            return invoke
+
+        if getattr(handler, 'blocking', False):
+            executor = executor_of(handler, self.executor)
+
+            def timed(parsed, *values):
+                start = time.monotonic_ns()
+                handler(*values)
+                return start - parsed, time.monotonic_ns() - start
+
+            def recorded(future):
+                if not future.cancelled() and future.exception() is None:
+                    waited, ran = future.result()
+                    queue(waited)
+                    run(ran)
+
+            def invoke(parsed, *values):
+                future = loop.run_in_executor(executor, timed, parsed, *values)
+                future.add_done_callback(recorded)
+                self._track(future)
+            return invoke
+
+        def invoke(parsed, *values):
+            start = time.monotonic_ns()
+            handler(*values)
+            end = time.monotonic_ns()
+            queue(start - parsed)
+            run(end - start)
+        return invoke
+
+    def _track(self, future):
+        # The loop only keeps weak references to tasks, so hold on to them
+        # until they finish and log any exception they raise.
+        self.tasks.add(future)
+        future.add_done_callback(self._finished)
+
+    def _finished(self, future):
+        self.tasks.discard(future)
+        if not future.cancelled() and future.exception() is not None:
+            log.error('handler failed', exc_info=future.exception())
+
+    def datagram_received(self, data, addr):
+        self.handle(data, addr)
+
+    def handle(self, data, addr=None):
+        """Decode ``data`` (any buffer) and dispatch every command in it."""
+        self.received += 1
+        if self.recorder is not None:
+            self.recorder.record(INBOUND, data)
+        start = time.monotonic_ns() if self.profiling else None
+        frame = data
+        try:
+            if len(data) and data[0] == HEARTBEAT:
+                if self.heartbeat is not None:
+                    self.heartbeat(data)
+                return
+            if len(data) and data[0] == RELIABLE:
+                data = self.reliable.receive(data)
+                if data is None:
+                    return
+            if len(data) and data[0] == BATCH:
+                commands = decode_batch(data)
+            elif len(data) and data[0] == PACKED:
+                commands = decode_packed(data)
+            else:
+                commands = None
+                spec, values = decode_frame(data)
+        except ProtocolError as err:
+            self.dropped += 1
+            log.warning('dropping frame from %s: %s', addr, err)
+            return
+        if start is not None:
+            parsed = time.monotonic_ns()
+            self.profiler.profile(frame[0]).parse.record(parsed - start)
+            if commands is None:
+                commands = [(spec, values)]
+            for spec, values in commands:
+                self._dispatch_timed(spec, values, addr, parsed)
+            return
+        if commands is None:
+            self.dispatch(spec, values, addr)
+        else:
+            for spec, values in commands:
+                self.dispatch(spec, values, addr)
+
+    def dispatch(self, spec, values, addr=None):
+        """Run the handler for one decoded command."""
+        invoke = self.table[spec.opcode]
+        if invoke is None:
+            self.dropped += 1
+            log.warning('no handler for %s from %s', spec.name, addr)
+            return
+        try:
+            invoke(*values)
+        except Exception:
+            log.exception('handler for %s failed', spec.name)
+
+    def _dispatch_timed(self, spec, values, addr, parsed):
+        invoke = self.timed[spec.opcode]
+        if invoke is None:
+            self.dropped += 1
+            log.warning('no handler for %s from %s', spec.name, addr)
+            return
+        try:
+            invoke(parsed, *values)
+        except Exception:
+            log.exception('handler for %s failed', spec.name)
+
+    def profile(self, mode):
+        """Handle ``Profile``: start or stop profiling, or report, see :mod:`Communication.profiling`."""
+        if mode == profiling.ON:
+            self.profiler.reset()
+            self.profiling = True
+        elif mode == profiling.OFF:
+            self.profiling = False
+            self.profiler.report()
+        elif mode == profiling.REPORT:
+            self.profiler.report()
+        else:
+            log.warning('unknown profiling mode %d', mode)
+
+    def error_received(self, exc):
+        log.warning('socket error: %s', exc)
+
+    async def drain(self):
+        """Wait for every in-flight handler to finish."""
+        while self.tasks:
+            await asyncio.wait(list(self.tasks))
+
+
+async def serve(handlers, host='0.0.0.0', port=COMMAND_PORT, executor=None, zero_copy=True, acknowledge=None,
+                heartbeat=None, profiler=None, recorder=None):
+    """Start receiving commands, returning ``(transport, protocol)``.
+
+    ``acknowledge`` sends acknowledgements of reliable frames to the
+    surface, usually ``uplink.surface.send``, and ``heartbeat`` is called
+    with echoed heartbeats, usually :meth:`LinkMonitor.echo
+    <Communication.link.LinkMonitor.echo>`.  ``profiler`` is the
+    :class:`~Communication.profiling.Profiler` used when the surface switches
+    profiling on; without one ``Profile`` commands have no handler.  Every
+    datagram received is appended to ``recorder`` if one is given.
+
+    With ``zero_copy`` the socket is read by a
+    :class:`~Communication.receiver.ZeroCopyReceiver` instead of an asyncio
+    datagram transport; the returned object has the same ``close()`` and
+    ``get_extra_info()`` methods.
+    """
+    loop = asyncio.get_running_loop()
+    if not zero_copy:
+        return await loop.create_datagram_endpoint(
+            lambda: CommandProtocol(handlers, executor, acknowledge, heartbeat, profiler, recorder),
+            local_addr=(host, port))
+
+    from .receiver import ZeroCopyReceiver, bound_socket
+
+    protocol = CommandProtocol(handlers, executor, acknowledge, heartbeat, profiler, recorder)
+    receiver = ZeroCopyReceiver(bound_socket(host, port), protocol)
+    receiver.start(loop)
+    return receiver, protocol
+
+
+TickStats = collections.namedtuple('TickStats', 'ticks missed p50 p99 max')
+TickStats.__doc__ = """Tick count, missed ticks and lateness percentiles (seconds) of a :class:`Ticker`."""
+
+
+class Ticker(object):
+    """Calls ``func`` ``rate`` times a second on a fixed schedule and records its jitter.
+
+    Ticks are scheduled against fixed deadlines so the rate does not drift
+    with the time each call takes, and ticks missed entirely are skipped
+    rather than run back to back.  How late each of the last ``history``
+    ticks started is kept for :meth:`stats`.
+    """
+
+    def __init__(self, func, rate, history=1024):
+        self.func = func
+        self.rate = rate
+        self.period = 1.0 / rate
+        self.lateness = np.zeros(history)
+        self.ticks = 0
+        self.missed = 0
+        self.deadline = time.monotonic()
+
+    def _started(self):
+        self.lateness[self.ticks % len(self.lateness)] = time.monotonic() - self.deadline
+        self.ticks += 1
+
+    def _finished(self):
+        """Move on to the next deadline, returning how long there is until it."""
+        self.deadline += self.period
+        now = time.monotonic()
+        if self.deadline < now:
+            missed = int((now - self.deadline) // self.period) + 1
+            self.missed += missed
+            self.deadline += missed * self.period
+        return self.deadline - now
+
+    def poll(self):
+        """Call the function if its deadline has passed, for loops that are not asyncio."""
+        if time.monotonic() < self.deadline:
+            return
+        self._started()
+        try:
+            self.func()
+        except Exception:
+            log.exception('periodic %s failed', self.func.__qualname__)
+        self._finished()
+
+    async def run(self, executor=None):
+        """Tick until cancelled.  Functions marked with :func:`blocking` run in ``executor`` or their own."""
+        loop = asyncio.get_running_loop()
+        func = self.func
+        self.deadline = time.monotonic()
+        while True:
+            self._started()
+            try:
+                if getattr(func, 'blocking', False):
+                    await loop.run_in_executor(executor_of(func, executor), func)
+                else:
+                    func()
+            except Exception:
+                log.exception('periodic %s failed', func.__qualname__)
+            await asyncio.sleep(self._finished())
+
+    def stats(self):
+        """Return :class:`TickStats` over the recorded ticks."""
+        recent = self.lateness[:min(self.ticks, len(self.lateness))]
+        if not len(recent):
+            return TickStats(self.ticks, self.missed, float('nan'), float('nan'), float('nan'))
+        p50, p99 = np.percentile(recent, (50, 99))
+        return TickStats(self.ticks, self.missed, p50, p99, recent.max())
+
+    def describe(self):
+        stats = self.stats()
+        return '{} at {:g} Hz: {} ticks, {} missed, late by p50 {:.0f} us  p99 {:.0f} us  max {:.0f} us'.format(
+            self.func.__qualname__, self.rate, stats.ticks, stats.missed,
+            stats.p50 * 1e6, stats.p99 * 1e6, stats.max * 1e6)
+
+
+async def run_periodic(tickers, executor=None):
+    """Run every :class:`Ticker` in ``tickers`` until cancelled."""
+    await asyncio.gather(*(ticker.run(executor) for ticker in tickers))
+
+
+async def poll_sensors(loop=None, executor=None, idle=0.1):
+    """Poll sensors at their subscribed rates until cancelled.
+
+    Sensor reads block on the bus, so each round of polls runs in
+    ``executor``.  With nothing subscribed the loop checks back every
+    ``idle`` seconds.
+    """
+    from Peripherals.Sensors import sampling
+
+    loop = loop or asyncio.get_running_loop()
+    while True:
+        wait = await loop.run_in_executor(executor, sampling.poll_due)
+        await asyncio.sleep(idle if wait is None else min(wait, idle))
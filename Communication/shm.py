@@ -0,0 +1,180 @@
+"""Single-producer, single-consumer ring of frames in shared memory.
+
+Used to pass commands and sensor readings between the Communication process
+and peripheral worker processes (see :mod:`Communication.workers`) without a
+pipe or socket, so neither side makes a syscall per message.
+
+Layout of the shared block::
+
+    offset 0    head (uint32), slot count (uint32), slot size (uint32)
+    offset 64   tail (uint32)
+    offset 128  slot count slots of: length (uint16) | frame
+
+Only the producer writes ``head`` and only the consumer writes ``tail``; they
+live on separate cache lines.  Counters are 32 bits so they are written with a
+single store on the Pi's 32-bit OS, and they wrap, which is why the slot count
+must be a power of two.
+
+CPython has no memory barriers of its own, so ``head`` and ``tail`` are
+written, and read by the side that does not own them, while holding a lock
+shared by both sides.
+Taking and releasing a ``multiprocessing`` lock is a full barrier, so a
+consumer that sees ``head`` move also sees the whole frame it covers, and a
+producer that sees ``tail`` move knows the consumer is done with the slot.
+Frames are copied in and out outside the lock, which is uncontended and does
+not make a syscall unless the other side is holding it.
+"""
+import multiprocessing
+import struct
+import time
+from multiprocessing import shared_memory
+
+HEADER_SIZE = 128
+LENGTH = struct.Struct('H')
+
+_HEAD = 0
+_SLOTS = 1
+_SLOT_SIZE = 2
+_TAIL = 16
+
+
+class SharedRing(object):
+    """Ring of ``slots`` frames of up to ``slot_size - 2`` bytes each.
+
+    Create it in one process with :meth:`create` and open it in the other
+    with :meth:`attach` using :attr:`name` and :attr:`lock`.  One process may
+    only ever :meth:`put` and the other only ever :meth:`get`.
+    """
+
+    def __init__(self, shm, owner, lock):
+        self.shm = shm
+        self.owner = owner
+        #: Lock ordering the counters against the frames; pass it to :meth:`attach`.
+        self.lock = lock
+        self.buffer = shm.buf
+        self.counters = shm.buf[:HEADER_SIZE].cast('I')
+        self.slots = self.counters[_SLOTS]
+        self.slot_size = self.counters[_SLOT_SIZE]
+        self.mask = self.slots - 1
+
+    @classmethod
+    def create(cls, slots=1024, slot_size=256, lock=None):
+        """Create a ring, with a new lock unless ``lock`` is given.
+
+        The lock must be passed to the other process, so when it is started
+        with a ``multiprocessing`` context make the lock from that context.
+        """
+        if slots & (slots - 1):
+            raise ValueError('slot count must be a power of two, not {}'.format(slots))
+        shm = shared_memory.SharedMemory(create=True, size=HEADER_SIZE + slots * slot_size)
+        counters = shm.buf[:HEADER_SIZE].cast('I')
+        counters[_HEAD] = counters[_TAIL] = 0
+        counters[_SLOTS] = slots
+        counters[_SLOT_SIZE] = slot_size
+        counters.release()
+        return cls(shm, owner=True, lock=multiprocessing.Lock() if lock is None else lock)
+
+    @classmethod
+    def attach(cls, name, lock):
+        shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, owner=False, lock=lock)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def __len__(self):
+        return (self.counters[_HEAD] - self.counters[_TAIL]) & 0xFFFFFFFF
+
+    def _slot(self, head):
+        with self.lock:
+            tail = self.counters[_TAIL]
+        if (head - tail) & 0xFFFFFFFF >= self.slots:
+            return None
+        return HEADER_SIZE + (head & self.mask) * self.slot_size
+
+    def _publish(self, head):
+        with self.lock:
+            self.counters[_HEAD] = (head + 1) & 0xFFFFFFFF
+
+    def put(self, frame):
+        """Append ``frame``, returning ``False`` if the ring is full."""
+        if len(frame) > self.slot_size - LENGTH.size:
+            raise ValueError('frame of {} bytes does not fit in a {} byte slot'.format(len(frame), self.slot_size))
+        head = self.counters[_HEAD]
+        offset = self._slot(head)
+        if offset is None:
+            return False
+        LENGTH.pack_into(self.buffer, offset, len(frame))
+        self.buffer[offset + LENGTH.size:offset + LENGTH.size + len(frame)] = frame
+        self._publish(head)
+        return True
+
+    def put_struct(self, packer, *values):
+        """Append ``packer.pack(*values)`` without building the bytes first."""
+        head = self.counters[_HEAD]
+        offset = self._slot(head)
+        if offset is None:
+            return False
+        LENGTH.pack_into(self.buffer, offset, packer.size)
+        packer.pack_into(self.buffer, offset + LENGTH.size, *values)
+        self._publish(head)
+        return True
+
+    def peek(self):
+        """Return a view of the oldest frame without removing it, or ``None`` if empty.
+
+        The view is only valid until :meth:`advance` is called.
+        """
+        tail = self.counters[_TAIL]
+        with self.lock:
+            head = self.counters[_HEAD]
+        if tail == head:
+            return None
+        offset = HEADER_SIZE + (tail & self.mask) * self.slot_size
+        length, = LENGTH.unpack_from(self.buffer, offset)
+        return self.buffer[offset + LENGTH.size:offset + LENGTH.size + length]
+
+    def advance(self):
+        """Remove the frame returned by :meth:`peek`."""
+        with self.lock:
+            self.counters[_TAIL] = (self.counters[_TAIL] + 1) & 0xFFFFFFFF
+
+    def get(self):
+        """Remove and return a copy of the oldest frame, or ``None`` if empty."""
+        view = self.peek()
+        if view is None:
+            return None
+        frame = bytes(view)
+        view.release()
+        self.advance()
+        return frame
+
+    def wait(self, timeout=None, spin=2000):
+        """Wait until the ring is not empty, returning whether it is.
+
+        Spins for ``spin`` checks first for low latency, then yields the CPU
+        and sleeps with a backoff of up to 1 ms so an idle consumer does not
+        burn a core.  Spinning only pays off when the producer is running on
+        another core; pass ``spin=0`` on a single core machine.  The checks
+        here do not take the lock, they only tell :meth:`peek` when to look.
+        """
+        for _ in range(spin):
+            if self.counters[_TAIL] != self.counters[_HEAD]:
+                return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        delay = 0.0
+        while self.counters[_TAIL] == self.counters[_HEAD]:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(delay)
+            delay = min(delay * 2 or 0.00001, 0.001)
+        return True
+
+    def close(self):
+        """Detach from the ring, and free it if this process created it."""
+        self.counters.release()
+        self.buffer = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,200 @@
+"""Run the Pi side and a surface on one machine over loopback UDP.
+
+    python -m Communication.simulator [--seconds 5] [--record PATH]
+
+The Pi side is the real command service with the real peripheral handlers,
+running on its own thread and event loop just as it would on the Pi.  Every
+peripheral gets a simulated backend (see :mod:`Peripherals.backends`) with
+configurable bus latency, sensors are polled in the executor, and every
+handler call is recorded with the time it finished, so the surface side (in
+the calling thread) can measure end-to-end latency.
+"""
+import argparse
+import asyncio
+import functools
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from Peripherals import backends
+
+from . import topics, uplink
+from .commands import GRIPPER, SENSOR_REQUEST, SERVO_POSITION
+from .dispatch import build_registry
+from .link import LinkMonitor
+from .profiling import Profiler
+from .recorder import FlightRecorder
+from .service import Ticker, poll_sensors, run_periodic, serve
+from .subscriptions import subscriptions
+from .surface import Surface
+from .telemetry import TelemetryDecoder, TelemetryPublisher
+
+
+class Simulator(object):
+    """The Pi-side service on a background thread, sending to a local surface.
+
+    ``dispatched`` holds ``(opcode, values, perf_counter_ns)`` for the most
+    recent handler calls, stamped when each handler finished,
+    ``tickers`` the :class:`~Communication.service.Ticker` of every periodic
+    function, ``link`` the :class:`~Communication.link.LinkMonitor` and
+    ``profiler`` the :class:`~Communication.profiling.Profiler`.  Traffic
+    is recorded to ``recorder`` (a
+    :class:`~Communication.recorder.FlightRecorder`) if one is given.
+    """
+
+    def __init__(self, modules=None, telemetry_rate=10.0, sensor_rate=100.0, history=100000,
+                 actuator_latency=0.0, sensor_latency=0.0, jitter=0.0, recorder=None):
+        self.modules = modules
+        self.telemetry_rate = telemetry_rate
+        self.sensor_rate = sensor_rate
+        self.actuator_latency = actuator_latency
+        self.sensor_latency = sensor_latency
+        self.jitter = jitter
+        self.recorder = recorder
+        self.dispatched = deque(maxlen=history)
+        self.thread = None
+        self.loop = None
+        self.stopped = None
+        self.ready = threading.Event()
+        self.address = None
+        self.channels = 0
+        self.protocol = None
+        self.tickers = []
+        self.link = LinkMonitor(uplink.surface)
+        self.profiler = Profiler(uplink.surface.send)
+
+    def record(self, opcode, handler):
+        """Wrap ``handler`` so its calls are added to :attr:`dispatched`, keeping its kind."""
+        dispatched = self.dispatched
+        if asyncio.iscoroutinefunction(handler):
+            @functools.wraps(handler)
+            async def recorded(*values):
+                await handler(*values)
+                dispatched.append((opcode, values, time.perf_counter_ns()))
+        else:
+            @functools.wraps(handler)
+            def recorded(*values):
+                handler(*values)
+                dispatched.append((opcode, values, time.perf_counter_ns()))
+        return recorded
+
+    def start(self, surface_address):
+        """Start the Pi side, sending telemetry to ``surface_address``."""
+        self.thread = threading.Thread(target=asyncio.run, args=(self._run(surface_address),),
+                                       name='pi', daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        return self.address
+
+    async def _run(self, surface_address):
+        from Peripherals.Sensors import sampling
+
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        registry = build_registry(self.modules)
+        backends.simulate(registry.modules, self.actuator_latency, self.sensor_latency, self.jitter)
+        handlers = {opcode: self.record(opcode, handler) for opcode, handler in registry.handlers.items()}
+        self.tickers = [Ticker(func, rate) for func, rate in registry.periodic]
+        transport, self.protocol = await serve(handlers, host='127.0.0.1', port=0,
+                                               acknowledge=uplink.surface.send, heartbeat=self.link.echo,
+                                               profiler=self.profiler, recorder=self.recorder)
+        self.address = transport.get_extra_info('sockname')
+
+        uplink.surface.connect(*surface_address)
+        uplink.surface.recorder = self.recorder
+        uplink.surface.attach(self.loop)
+        publisher = TelemetryPublisher(sampling.buffers, uplink.surface, self.telemetry_rate)
+        self.channels = len(publisher.layout)
+        tasks = [asyncio.ensure_future(publisher.run()),
+                 asyncio.ensure_future(self._poll_sensors()),
+                 asyncio.ensure_future(run_periodic(self.tickers)),
+                 asyncio.ensure_future(topics.publisher.run()),
+                 asyncio.ensure_future(self.link.run())]
+        self.ready.set()
+        try:
+            await self.stopped.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.protocol.drain()
+            uplink.surface.close()
+            uplink.surface.recorder = None
+            transport.close()
+
+    async def _poll_sensors(self):
+        """Poll sensors at their subscribed rates, off the loop since reads block."""
+        from Peripherals.Sensors import sampling
+
+        if self.sensor_rate:
+            for sensor in sampling.buffers:
+                subscriptions.subscribe(sensor, 'simulator', self.sensor_rate)
+        await poll_sensors(self.loop)
+
+    def cpu_time(self):
+        """CPU seconds used so far by the Pi-side thread."""
+        return time.clock_gettime(time.pthread_getcpuclockid(self.thread.ident))
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.stopped.set)
+        self.thread.join()
+
+
+def add_arguments(parser):
+    """Add the simulated backend options to an ``argparse`` parser."""
+    parser.add_argument('--actuator-latency', type=float, default=0.0,
+                        help='seconds each actuator write takes (default: %(default)s)')
+    parser.add_argument('--sensor-latency', type=float, default=0.0,
+                        help='seconds each sensor read takes (default: %(default)s)')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='up to this many seconds are added to each delay (default: %(default)s)')
+
+
+def backend_options(args):
+    """Keyword arguments for :class:`Simulator` from :func:`add_arguments` options."""
+    return {'actuator_latency': args.actuator_latency, 'sensor_latency': args.sensor_latency,
+            'jitter': args.jitter}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5, help='how long to run (default: %(default)s)')
+    parser.add_argument('--record', metavar='PATH', help='record all traffic to this flight recorder log')
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    surface = Surface(listen=('127.0.0.1', 0))
+    recorder = FlightRecorder(args.record) if args.record else None
+    simulator = Simulator(recorder=recorder, **backend_options(args))
+    surface.pi = simulator.start(surface.address)
+    surface.telemetry = TelemetryDecoder(simulator.channels)
+
+    deadline = time.monotonic() + args.seconds
+    position = 1000
+    try:
+        while time.monotonic() < deadline:
+            position = 1000 + (position + 50) % 1000
+            surface.send_batch([(SERVO_POSITION, (0, position)), (GRIPPER, (0, position > 1500))])
+            surface.send(SENSOR_REQUEST, 0, 500)
+            received = surface.receive(timeout=0.5)
+            while received is not None:
+                kind, data = received
+                if kind == 'telemetry' and data is not None:
+                    print('telemetry', np.round(data, 2))
+                elif kind == 'commands':
+                    for spec, values in data:
+                        print(spec.name, values)
+                received = surface.receive(timeout=0)
+            time.sleep(0.5)
+    finally:
+        simulator.stop()
+        surface.close()
+        if recorder is not None:
+            recorder.close()
+    print('{} commands dispatched'.format(len(simulator.dispatched)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Rates at which consumers want each topic.
+
+A topic is anything produced at a rate; for now topics are sensors, keyed by
+sensor id.  Consumers (the surface, the telemetry publisher, a control loop
+on the Pi) subscribe to a topic at the rate they need it, and the producer
+asks :meth:`Subscriptions.rate` how fast to produce it: the highest
+subscribed rate, or 0 when nobody is subscribed, in which case it should not
+be produced at all.
+
+The surface subscribes with a ``Subscribe(sensor, rate)`` command; a rate of
+0 unsubscribes.
+"""
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class Subscriptions(object):
+    """Subscribed rate of every consumer of every topic."""
+
+    def __init__(self):
+        #: ``{topic: {consumer: rate}}``.
+        self.topics = {}
+        #: ``{topic: highest subscribed rate}``, replaced rather than mutated so
+        #: producers on other threads can read it without a lock.
+        self.rates = {}
+
+    def subscribe(self, topic, consumer, rate):
+        """Set the rate in Hz at which ``consumer`` wants ``topic``; 0 unsubscribes."""
+        consumers = self.topics.setdefault(topic, {})
+        if rate > 0:
+            consumers[consumer] = float(rate)
+        else:
+            consumers.pop(consumer, None)
+        rates = dict(self.rates)
+        rates[topic] = max(consumers.values(), default=0.0)
+        self.rates = rates
+        log.debug('%s subscribed to %s at %g Hz, producing at %g Hz', consumer, topic, rate, rates[topic])
+
+    def unsubscribe(self, topic, consumer):
+        self.subscribe(topic, consumer, 0)
+
+    def rate(self, topic):
+        """Rate in Hz ``topic`` is needed at, or 0 if nobody is subscribed."""
+        return self.rates.get(topic, 0.0)
+
+
+#: Subscriptions of this process.
+subscriptions = Subscriptions()
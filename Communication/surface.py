@@ -0,0 +1,115 @@
+"""Surface computer side of the link.
+
+:class:`Surface` sends commands to the Pi and decodes what the Pi sends back.
+It uses a plain blocking socket so it is easy to drive from a GUI thread or a
+script::
+
+    surface = Surface(('192.168.2.2', COMMAND_PORT), channels=8)
+    surface.send(SERVO_POSITION, 0, 1500)
+    surface.send(MARKER_RELEASE, 0, reliable=True)
+    surface.send_batch([(SERVO_POSITION, (servo, 1500)) for servo in range(8)], packed=True)
+    kind, data = surface.receive(timeout=1.0)
+
+Commands sent with ``reliable=True`` are retransmitted until the Pi
+acknowledges them (see :mod:`Communication.reliable`), and the Pi's
+heartbeats are echoed so it can measure the link (see
+:mod:`Communication.link`); both happen inside :meth:`Surface.receive`, so
+keep calling it.  The Pi's link statistics arrive as ``LinkStats`` commands.
+"""
+import socket
+import time
+
+from .packed import encode_packed
+from .protocol import ACK, COMMAND_PORT, HEARTBEAT, TELEMETRY, TELEMETRY_PORT, TOPICS, decode, encode_batch
+from .reliable import ReliableSender
+from .telemetry import TelemetryDecoder
+from .topics import decode_topics
+
+
+class Surface(object):
+    """Sends commands to the Pi at ``pi`` and receives frames on ``listen``.
+
+    ``channels`` is the number of telemetry channels the Pi sends; it is
+    needed to decode ``Telemetry`` frames.
+    """
+
+    def __init__(self, pi=('127.0.0.1', COMMAND_PORT), listen=('0.0.0.0', TELEMETRY_PORT), channels=None):
+        self.pi = pi
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(listen)
+        self.telemetry = TelemetryDecoder(channels) if channels else None
+        self.reliable = ReliableSender(self.send_frame)
+
+    @property
+    def address(self):
+        """Address the surface receives on."""
+        return self.sock.getsockname()
+
+    def send_frame(self, frame):
+        self.sock.sendto(frame, self.pi)
+
+    def send(self, spec, *values, reliable=False):
+        """Encode and send one command, optionally over the reliable channel."""
+        if reliable:
+            self.reliable.send(spec.encode(*values))
+        else:
+            self.sock.sendto(spec.encode(*values), self.pi)
+
+    def send_batch(self, commands, reliable=False, packed=False):
+        """Send ``(spec, values)`` pairs as one batch frame, optionally over the reliable channel.
+
+        With ``packed`` they are sent as a bit-packed frame instead (see
+        :mod:`Communication.packed`), which is smaller but needs every value
+        to fit its packed field.
+        """
+        if packed:
+            frame = encode_packed(commands)
+        else:
+            frame = encode_batch(spec.encode(*values) for spec, values in commands)
+        if reliable:
+            self.reliable.send(frame)
+        else:
+            self.sock.sendto(frame, self.pi)
+
+    def receive(self, timeout=None):
+        """Wait for one frame from the Pi.
+
+        Returns ``('telemetry', values)`` for telemetry (``values`` is ``None``
+        until the decoder has synced on a keyframe), ``('topics', [(topic,
+        samples, values), ...])`` for topics, ``('commands', [(spec,
+        values), ...])`` for anything else, or ``None`` on timeout.
+        Acknowledgements of reliable commands and heartbeats are handled here
+        and not returned, and unacknowledged commands are retransmitted while
+        waiting.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self.reliable.poll()
+            wait = None if deadline is None else max(0.0, deadline - time.monotonic())
+            retransmit = self.reliable.next_timeout()
+            if retransmit is not None and (wait is None or retransmit < wait):
+                wait = retransmit
+            self.sock.settimeout(wait)
+            try:
+                data = self.sock.recv(4096)
+            except (socket.timeout, BlockingIOError):
+                if deadline is not None and time.monotonic() >= deadline:
+                    return None
+                continue
+            if data and data[0] == ACK:
+                self.reliable.ack(data)
+                continue
+            if data and data[0] == HEARTBEAT:
+                self.sock.sendto(data, self.pi)
+                continue
+            if data and data[0] == TELEMETRY:
+                if self.telemetry is None:
+                    return 'telemetry', None
+                return 'telemetry', self.telemetry.decode(data)
+            if data and data[0] == TOPICS:
+                return 'topics', decode_topics(data)
+            return 'commands', decode(data)
+
+    def close(self):
+        self.sock.close()
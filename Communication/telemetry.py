@@ -0,0 +1,167 @@
+"""Telemetry sent from the Pi to the surface once per tick.
+
+Instead of one packet per sensor, the latest value of every sensor field (a
+*channel*) is sent in a single frame per tick.  Channels that did not change
+since the last frame are left out and marked in a bitmask::
+
+    0x81 | sequence (uint16) | flags (uint8) | channel count (uint16)
+         | changed bitmask, ceil(count / 8) bytes, channel 0 in bit 0 of byte 0
+         | float32 value of every changed channel, in channel order
+
+Every ``keyframe_interval`` ticks a keyframe (``flags & KEYFRAME``) carries all
+channels so the surface can recover from lost frames.  The tether also carries
+MAVLink, so fewer bytes and packets here directly lower control latency.
+
+Channels are ordered by sensor id and then by field, see :func:`layout`.
+"""
+import asyncio
+import logging
+import math
+import struct
+
+import numpy as np
+
+from .protocol import BYTE_ORDER, TELEMETRY, ProtocolError
+from .subscriptions import subscriptions
+
+log = logging.getLogger(__name__)
+
+HEADER = struct.Struct(BYTE_ORDER + 'BHBH')
+KEYFRAME = 0x01
+VALUE = np.dtype('>f4')
+
+
+def layout(buffers):
+    """Return the ``(sensor, field)`` of every channel in sensor ring ``buffers``."""
+    return [(sensor, field) for sensor in sorted(buffers) for field in buffers[sensor].fields]
+
+
+class TelemetryEncoder(object):
+    """Encodes successive channel values as delta frames.
+
+    A channel counts as changed when it moved by more than ``deadband`` (a
+    scalar or one value per channel) since the value last sent for it.
+    """
+
+    def __init__(self, channels, deadband=0.0, keyframe_interval=20):
+        self.channels = channels
+        self.deadband = np.broadcast_to(np.asarray(deadband, dtype=np.float32), (channels,))
+        self.keyframe_interval = keyframe_interval
+        self.sent = np.full(channels, np.nan, dtype=np.float32)
+        self.sequence = 0
+
+    def encode(self, values):
+        values = np.asarray(values, dtype=np.float32)
+        keyframe = self.sequence % self.keyframe_interval == 0
+        if keyframe:
+            changed = np.ones(self.channels, dtype=bool)
+        else:
+            # NaN (no sample yet) compares unequal to everything, so handle it separately.
+            changed = (np.abs(values - self.sent) > self.deadband) | (np.isnan(values) != np.isnan(self.sent))
+        self.sent[changed] = values[changed]
+        frame = b''.join((HEADER.pack(TELEMETRY, self.sequence & 0xFFFF, KEYFRAME if keyframe else 0, self.channels),
+                          np.packbits(changed, bitorder='little').tobytes(),
+                          values[changed].astype(VALUE).tobytes()))
+        self.sequence += 1
+        return frame
+
+
+class TelemetryDecoder(object):
+    """Surface-side state that turns delta frames back into full channel values.
+
+    After a lost frame the values are unreliable until the next keyframe, and
+    :meth:`decode` returns ``None`` until then.
+    """
+
+    def __init__(self, channels):
+        self.channels = channels
+        self.values = np.full(channels, np.nan, dtype=np.float32)
+        self.expected = None
+        self.synced = False
+        self.lost = 0
+
+    def decode(self, data):
+        """Apply one frame and return a copy of all channel values, or ``None``."""
+        if len(data) < HEADER.size:
+            raise ProtocolError('telemetry frame truncated: {} bytes'.format(len(data)))
+        opcode, sequence, flags, channels = HEADER.unpack_from(data)
+        if opcode != TELEMETRY or channels != self.channels:
+            raise ProtocolError('not a telemetry frame for {} channels'.format(self.channels))
+        mask_size = (channels + 7) // 8
+        changed = np.unpackbits(np.frombuffer(data, np.uint8, mask_size, HEADER.size),
+                                count=channels, bitorder='little').view(bool)
+        count = int(changed.sum())
+        if len(data) != HEADER.size + mask_size + count * VALUE.itemsize:
+            raise ProtocolError('telemetry frame has the wrong length for {} values'.format(count))
+
+        if self.expected is not None and sequence != self.expected:
+            self.lost += (sequence - self.expected) & 0xFFFF
+            self.synced = False
+        if flags & KEYFRAME:
+            self.synced = True
+        self.expected = (sequence + 1) & 0xFFFF
+        self.values[changed] = np.frombuffer(data, VALUE, count, HEADER.size + mask_size)
+        return self.values.copy() if self.synced else None
+
+
+class TelemetryPublisher(object):
+    """Sends the latest value of every sensor channel to ``uplink`` at ``rate`` Hz.
+
+    The publisher subscribes to every sensor in ``buffers`` at its own rate
+    so the values it sends are never older than one tick; leave out of
+    ``buffers`` the sensors that should only be polled when something else
+    subscribes to them.
+    """
+
+    def __init__(self, buffers, uplink, rate=10.0, deadband=0.0, keyframe_seconds=1.0):
+        self.sensors = sorted(buffers)
+        self.buffers = [buffers[sensor] for sensor in self.sensors]
+        self.layout = layout(buffers)
+        self.uplink = uplink
+        self.keyframe_seconds = keyframe_seconds
+        self.values = np.full(len(self.layout), np.nan, dtype=np.float32)
+        self.encoder = TelemetryEncoder(len(self.layout), deadband)
+        self.rate = rate
+
+    @property
+    def rate(self):
+        """Ticks per second."""
+        return self._rate
+
+    @rate.setter
+    def rate(self, rate):
+        if rate <= 0:
+            raise ValueError('telemetry rate must be positive, not {}'.format(rate))
+        self._rate = float(rate)
+        self.encoder.keyframe_interval = max(1, int(round(rate * self.keyframe_seconds)))
+        for sensor in self.sensors:
+            subscriptions.subscribe(sensor, 'telemetry', self._rate)
+
+    def sample(self):
+        """Copy the newest sample of every buffer into :attr:`values`."""
+        start = 0
+        for ring in self.buffers:
+            width = len(ring.fields)
+            if ring.count:
+                self.values[start:start + width] = ring.values[(ring.count - 1) % ring.capacity]
+            start += width
+        return self.values
+
+    def tick(self):
+        """Encode and send one frame."""
+        return self.uplink.send(self.encoder.encode(self.sample()))
+
+    async def run(self):
+        """Tick at :attr:`rate` until cancelled, skipping ticks if the loop falls behind."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while True:
+            self.tick()
+            period = 1.0 / self._rate
+            deadline += period
+            now = loop.time()
+            if deadline < now:
+                skipped = math.ceil((now - deadline) / period)
+                log.debug('telemetry fell %d ticks behind', skipped)
+                deadline += skipped * period
+            await asyncio.sleep(deadline - now)
@@ -0,0 +1,163 @@
+"""Sensor topics: streams of one sensor reduced on the Pi before they are sent.
+
+The surface asks for a topic with ``SubscribeTopic(topic, sensor, rate,
+reduction)``, e.g. "depth at 10 Hz, mean": every ``1 / rate`` seconds the
+samples the sensor took since the last publish are reduced to one value per
+field with a vectorized NumPy reduction over the sensor's ring buffer, so a
+sensor polled at 200 Hz costs the tether 10 values a second rather than 200.
+``topic`` is a number chosen by the surface to tell its streams apart; a
+rate of 0 unsubscribes it.
+
+Every topic that is due in the same tick goes out in one frame::
+
+    0x82 | topic count (uint8)
+         | per topic: topic (uint8) | samples (uint16) | fields (uint8)
+         |            float32 value of every field
+
+``samples`` is how many samples the values were reduced from.  A topic whose
+sensor took no samples since its last publish is left out.
+"""
+import asyncio
+import logging
+import struct
+import time
+
+import numpy as np
+
+from . import uplink
+from .protocol import BYTE_ORDER, TOPICS, ProtocolError
+from .subscriptions import subscriptions
+
+log = logging.getLogger(__name__)
+
+HEADER = struct.Struct(BYTE_ORDER + 'BB')
+ENTRY = struct.Struct(BYTE_ORDER + 'BHB')
+VALUE = np.dtype('>f4')
+
+LAST, MEAN, MIN, MAX = range(4)
+
+#: Name of each reduction, indexed by the number sent in ``SubscribeTopic``.
+REDUCTIONS = ('last', 'mean', 'min', 'max')
+
+
+def reduce(ring, n, reduction):
+    """Reduce the last ``n`` samples in ``ring`` to one value per field."""
+    parts = [ring.values[part] for part in ring.segments(n)]
+    if reduction == LAST:
+        return parts[-1][-1]
+    if reduction == MEAN:
+        return np.sum([part.sum(axis=0) for part in parts], axis=0) / sum(len(part) for part in parts)
+    if reduction == MIN:
+        return np.min([part.min(axis=0) for part in parts], axis=0)
+    return np.max([part.max(axis=0) for part in parts], axis=0)
+
+
+class Topic(object):
+    """One subscribed stream of the samples in ``ring`` of ``sensor``."""
+
+    def __init__(self, topic, sensor, ring, rate, reduction, now):
+        self.topic = topic
+        self.sensor = sensor
+        self.ring = ring
+        self.period = 1.0 / rate
+        self.reduction = reduction
+        self.due = now
+        #: :attr:`RingBuffer.count` at the last publish.
+        self.seen = ring.count
+
+    def entry(self):
+        """Encode the samples since the last publish, or return ``None`` if there are none."""
+        n = min(self.ring.count - self.seen, len(self.ring))
+        self.seen = self.ring.count
+        if n <= 0:
+            return None
+        values = reduce(self.ring, n, self.reduction)
+        return ENTRY.pack(self.topic, min(n, 0xFFFF), len(values)) + np.asarray(values, dtype=VALUE).tobytes()
+
+
+class TopicPublisher(object):
+    """Publishes every subscribed :class:`Topic` to ``uplink`` at its rate."""
+
+    def __init__(self, uplink, clock=time.monotonic):
+        self.uplink = uplink
+        self.clock = clock
+        self.topics = {}
+        #: Frames and bytes handed to the uplink.
+        self.frames = 0
+        self.bytes = 0
+
+    def subscribe(self, topic, sensor, ring, rate, reduction=LAST):
+        """Publish ``reduction`` of ``sensor`` (whose samples are in ``ring``) at ``rate`` Hz as ``topic``.
+
+        A rate of 0 unsubscribes ``topic``.  The sensor is subscribed at the
+        topic's rate so it is polled at least that fast.  An unknown
+        ``reduction`` raises :exc:`ProtocolError` and leaves the topic as it
+        was.
+        """
+        if rate and not 0 <= reduction < len(REDUCTIONS):
+            raise ProtocolError('unknown reduction {}'.format(reduction))
+        old = self.topics.pop(topic, None)
+        if old is not None:
+            subscriptions.unsubscribe(old.sensor, ('topic', topic))
+        if not rate:
+            return
+        self.topics[topic] = Topic(topic, sensor, ring, rate, reduction, self.clock())
+        subscriptions.subscribe(sensor, ('topic', topic), rate)
+        log.info('topic %d: sensor %d at %g Hz, %s', topic, sensor, rate, REDUCTIONS[reduction])
+
+    def tick(self):
+        """Send every topic that is due, returning the seconds until the next one is.
+
+        Returns ``None`` when there are no topics.
+        """
+        now = self.clock()
+        entries = []
+        wait = None
+        for topic in self.topics.values():
+            if topic.due <= now:
+                entry = topic.entry()
+                if entry is not None:
+                    entries.append(entry)
+                # Keep to the schedule without trying to catch up on missed publishes.
+                topic.due = max(topic.due + topic.period, now)
+            wait = topic.due - now if wait is None else min(wait, topic.due - now)
+        for start in range(0, len(entries), 0xFF):
+            chunk = entries[start:start + 0xFF]
+            frame = HEADER.pack(TOPICS, len(chunk)) + b''.join(chunk)
+            self.uplink.send(frame)
+            self.frames += 1
+            self.bytes += len(frame)
+        return wait
+
+    async def run(self, idle=0.1):
+        """Publish topics as they fall due until cancelled."""
+        while True:
+            wait = self.tick()
+            await asyncio.sleep(idle if wait is None else min(wait, idle))
+
+
+def decode_topics(data):
+    """Decode a topics frame into ``[(topic, samples, values), ...]``."""
+    if len(data) < HEADER.size:
+        raise ProtocolError('topics frame truncated: {} bytes'.format(len(data)))
+    opcode, count = HEADER.unpack_from(data)
+    if opcode != TOPICS:
+        raise ProtocolError('not a topics frame: opcode 0x{:02X}'.format(opcode))
+    offset = HEADER.size
+    topics = []
+    for _ in range(count):
+        if len(data) < offset + ENTRY.size:
+            raise ProtocolError('topics frame truncated at byte {}'.format(offset))
+        topic, samples, fields = ENTRY.unpack_from(data, offset)
+        offset += ENTRY.size
+        if len(data) < offset + fields * VALUE.itemsize:
+            raise ProtocolError('topics frame truncated at byte {}'.format(offset))
+        topics.append((topic, samples, np.frombuffer(data, VALUE, fields, offset).astype(np.float32)))
+        offset += fields * VALUE.itemsize
+    if offset != len(data):
+        raise ProtocolError('{} trailing bytes after topics frame'.format(len(data) - offset))
+    return topics
+
+
+#: Topics of this process, sent over :data:`Communication.uplink.surface`.
+publisher = TopicPublisher(uplink.surface)
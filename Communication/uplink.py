@@ -0,0 +1,94 @@
+"""Socket for frames sent from the Pi to the surface computer.
+
+The surface address is configured once at startup (``python -m Communication
+--surface HOST``); until then frames are silently discarded so peripherals
+can be exercised without a surface computer attached.
+
+Frames go through a :class:`~Communication.scheduler.PriorityScheduler`, so
+safety frames are sent before actuation replies and telemetry, and telemetry
+stays within its bandwidth budget.  Frames are copied to the uplink's
+``recorder`` (a :class:`~Communication.recorder.FlightRecorder`), if it has
+one, as they are sent.
+"""
+import logging
+import socket
+
+from .protocol import TELEMETRY_PORT
+from .recorder import OUTBOUND
+from .scheduler import PriorityScheduler
+
+log = logging.getLogger(__name__)
+
+
+class Uplink(object):
+    """Connected UDP socket to the surface computer.
+
+    ``limits`` and ``queue_limits`` are passed to the
+    :class:`~Communication.scheduler.PriorityScheduler`.  Call :meth:`attach`
+    with the event loop so frames held back by a budget are sent later.
+    """
+
+    def __init__(self, limits=None, queue_limits=None):
+        self.sock = None
+        self.loop = None
+        self.timer = None
+        self.scheduler = PriorityScheduler(self._transmit, limits, queue_limits)
+        self.recorder = None
+        self.sent = 0
+        self.errors = 0
+
+    def connect(self, host, port=TELEMETRY_PORT):
+        self.close()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.sock.connect((host, port))
+
+    def attach(self, loop):
+        """Use ``loop`` to flush frames that had to wait for their budget."""
+        self.loop = loop
+
+    def send(self, frame, priority=None):
+        """Queue one frame for the surface, returning whether the uplink is connected."""
+        if self.sock is None:
+            return False
+        wait = self.scheduler.submit(frame, priority)
+        if wait is not None and self.loop is not None:
+            # send() may be called from a blocking handler in the executor.
+            self.loop.call_soon_threadsafe(self._arm, wait)
+        return True
+
+    def _arm(self, wait):
+        if self.timer is None:
+            self.timer = self.loop.call_later(wait, self._flush)
+
+    def _flush(self):
+        self.timer = None
+        wait = self.scheduler.flush()
+        if wait is not None:
+            self._arm(wait)
+
+    def _transmit(self, frame):
+        if self.sock is None:
+            return
+        if self.recorder is not None:
+            self.recorder.record(OUTBOUND, frame)
+        try:
+            self.sock.send(frame)
+        except OSError as err:
+            # Nothing listening on the surface yet, or the socket buffer is full.
+            self.errors += 1
+            log.debug('uplink send failed: %s', err)
+            return
+        self.sent += 1
+
+    def close(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+#: The uplink used by peripherals to reach the surface.
+surface = Uplink()
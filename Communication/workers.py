@@ -0,0 +1,262 @@
+"""Run peripheral modules in their own processes.
+
+A CPU-heavy sensor filter running in the Communication process holds the GIL
+and stalls the packet loop.  A :class:`WorkerProcess` instead runs a set of
+peripheral modules in a separate process, so all four of the Pi's cores can
+be used.  The two processes talk through a pair of
+:class:`~Communication.shm.SharedRing` buffers:
+
+- commands go to the worker as the same frames that arrive from the surface,
+  packed straight into the ring by forwarding handlers, and
+- the worker polls its sensors and sends each sample back as a reading
+  (``sensor (uint8) | monotonic_ns (int64) | one float64 per field``), which
+  the Communication process pushes into its own sensor ring buffers so
+  telemetry and statistics work unchanged.
+
+Sensors are subscribed to in the Communication process (see
+:mod:`Communication.subscriptions`), so whenever the rate it wants one of
+the worker's sensors at changes, it sends the worker a ``Subscribe(sensor,
+rate)`` frame with the rate rounded up to whole Hz, and the worker polls
+each sensor at that rate, or not at all.
+
+``Stop`` always runs its handler in the Communication process first, so the
+actuators it owns stop even if a worker is busy, and is then forwarded to
+every worker, which calls the ``stop()`` function of each of its modules.
+Periodic functions of the worker's modules, and of the packages above them,
+run in the worker, so setpoints its actuator handlers store are written out
+there.
+"""
+import asyncio
+import importlib
+import logging
+import math
+import multiprocessing
+import os
+import signal
+import struct
+import time
+
+from .commands import STOP, SUBSCRIBE
+from .dispatch import build_registry
+from .protocol import BATCH, SPECS, ProtocolError, decode_batch, decode_frame
+from .service import Ticker
+from .shm import SharedRing
+from .subscriptions import subscriptions
+
+log = logging.getLogger(__name__)
+
+READING = struct.Struct('!Bq')
+
+
+def parent_packages(modules):
+    """Names of the packages above ``modules`` that are not in ``modules`` themselves."""
+    parents = []
+    for name in modules:
+        parts = name.split('.')
+        for end in range(1, len(parts)):
+            parent = '.'.join(parts[:end])
+            if parent not in modules and parent not in parents:
+                parents.append(parent)
+    return parents
+
+
+def run_worker(modules, commands_name, commands_lock, readings_name, readings_lock, stopped):
+    """Main loop of a worker process."""
+    from Peripherals.Motors import setpoints
+    from Peripherals.Sensors import sampling
+
+    # Ctrl-C goes to the whole process group; the parent stops the worker itself.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    commands = SharedRing.attach(commands_name, commands_lock)
+    readings = SharedRing.attach(readings_name, readings_lock)
+    registry = build_registry(modules)
+    # Actuator handlers only store setpoints; the control tick of the package
+    # above them (Peripherals.Motors.update) writes them out, so run it here too.
+    for name in parent_packages(modules):
+        registry.add_periodic(importlib.import_module(name))
+    stops = [module.stop for module in registry.modules if callable(getattr(module, 'stop', None))
+             and not getattr(module.stop, 'opcodes', ())]
+    sensors = [module.SENSOR_ID for module in registry.modules if hasattr(module, 'SENSOR_ID')]
+    packers = {sensor: struct.Struct('!Bq{}d'.format(len(sampling.buffers[sensor].fields))) for sensor in sensors}
+    loop = asyncio.new_event_loop()
+    # Rate in Hz the Communication process wants each subscribed sensor at, and when each is next due.
+    rates = {}
+    due = {}
+
+    def dispatch(spec, values):
+        if spec.opcode == STOP.opcode:
+            for stop in stops:
+                stop()
+        elif spec.opcode == SUBSCRIBE.opcode and values[0] in packers:
+            sensor, rate = values
+            if rate:
+                now = time.monotonic()
+                rates[sensor] = rate
+                # A sensor whose rate was just raised is polled within its new period.
+                due[sensor] = min(due.get(sensor, now), now + 1.0 / rate)
+            else:
+                rates.pop(sensor, None)
+                due.pop(sensor, None)
+            return
+        handler = registry.table[spec.opcode]
+        if handler is None:
+            return
+        if asyncio.iscoroutinefunction(handler):
+            loop.run_until_complete(handler(*values))
+        else:
+            handler(*values)
+
+    spin = 200 if os.cpu_count() > 1 else 0
+    tickers = [Ticker(func, rate) for func, rate in registry.periodic]
+    try:
+        while not stopped.is_set():
+            deadlines = [ticker.deadline for ticker in tickers] + list(due.values())
+            timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else 0.1
+            if commands.wait(timeout, spin if timeout else 0):
+                view = commands.peek()
+                try:
+                    if view[0] == BATCH:
+                        decoded = decode_batch(view)
+                    else:
+                        decoded = [decode_frame(view)]
+                except ProtocolError as err:
+                    log.warning('worker dropping frame: %s', err)
+                    decoded = ()
+                finally:
+                    view.release()
+                    commands.advance()
+                for spec, values in decoded:
+                    try:
+                        dispatch(spec, values)
+                    except Exception:
+                        log.exception('handler for %s failed', spec.name)
+            for ticker in tickers:
+                ticker.poll()
+            now = time.monotonic()
+            ready = [sensor for sensor, deadline in due.items() if deadline <= now]
+            for sensor in ready:
+                # Keep to the schedule, but do not try to catch up on polls that were missed.
+                due[sensor] = max(due[sensor] + 1.0 / rates[sensor], now)
+                sampling.backends[sensor].expect()
+            for sensor in ready:
+                sample = sampling.backends[sensor].read()
+                if not readings.put_struct(packers[sensor], sensor, time.monotonic_ns(), *sample):
+                    log.debug('reading ring full, dropping sample of sensor %d', sensor)
+    finally:
+        for ticker in tickers:
+            log.info('%s', ticker.describe())
+        for line in setpoints.report(registry.modules):
+            log.info('%s', line)
+        loop.close()
+        commands.close()
+        readings.close()
+
+
+class WorkerProcess(object):
+    """Runs the peripheral ``modules`` (names) in a child process.
+
+    Pass the service's handlers through :meth:`forwarders` so the modules'
+    commands are sent to the worker, :meth:`start` the process, and keep
+    :meth:`run` going on the event loop to collect sensor readings and pass
+    on subscription changes.
+    """
+
+    def __init__(self, modules, slots=1024):
+        from Peripherals.Sensors import sampling
+
+        self.modules = list(modules)
+        # Spawn rather than fork so the worker does not inherit the event loop and sockets.
+        self.context = multiprocessing.get_context('spawn')
+        self.commands = SharedRing.create(slots, lock=self.context.Lock())
+        self.readings = SharedRing.create(slots, lock=self.context.Lock())
+        self.stopped = self.context.Event()
+        self.process = None
+        self.dropped = 0
+        # Unpacks the fields of a reading of each sensor the worker reads.
+        self.unpackers = {}
+        for name in self.modules:
+            sensor = getattr(importlib.import_module(name), 'SENSOR_ID', None)
+            if sensor is not None:
+                self.unpackers[sensor] = struct.Struct('!{}d'.format(len(sampling.buffers[sensor].fields)))
+        #: Rate in whole Hz last sent to the worker for each of its sensors.
+        self.rates = {}
+
+    def _owns(self, owner):
+        return owner is not None and owner.rpartition('.')[0] in self.modules
+
+    def _forward(self, spec, local=None):
+        commands = self.commands
+        packer, opcode = spec.frame, spec.opcode
+
+        def forward(*values):
+            if local is not None:
+                local(*values)
+            if not commands.put_struct(packer, opcode, *values):
+                self.dropped += 1
+                log.warning('worker command ring full, dropping %s', spec.name)
+        forward.__name__ = 'forward_' + spec.name
+        return forward
+
+    def forwarders(self, registry, handlers):
+        """Return ``handlers`` with the handlers of this worker's modules replaced by forwarders.
+
+        ``Stop`` is never replaced: it keeps running whatever handler it had
+        here, even one from this worker's modules, and is forwarded too.
+        """
+        handlers = dict(handlers)
+        for opcode, owner in enumerate(registry.owners):
+            if opcode != STOP.opcode and self._owns(owner):
+                handlers[opcode] = self._forward(SPECS[opcode])
+        handlers[STOP.opcode] = self._forward(STOP, handlers.get(STOP.opcode))
+        return handlers
+
+    def start(self):
+        from Peripherals.Sensors import sampling
+
+        # The worker reads these sensors now, so they must not be polled here too.
+        for sensor in self.unpackers:
+            sampling.backends[sensor] = None
+        self.process = self.context.Process(
+            target=run_worker, name='worker ' + ','.join(self.modules), daemon=True,
+            args=(self.modules, self.commands.name, self.commands.lock, self.readings.name, self.readings.lock,
+                  self.stopped))
+        self.process.start()
+
+    def collect(self):
+        """Push every reading the worker has sent into the local sensor buffers."""
+        from Peripherals.Sensors import sampling
+
+        count = 0
+        while True:
+            view = self.readings.peek()
+            if view is None:
+                return count
+            sensor, timestamp = READING.unpack_from(view)
+            sampling.buffers[sensor].push(self.unpackers[sensor].unpack_from(view, READING.size), timestamp)
+            view.release()
+            self.readings.advance()
+            count += 1
+
+    def subscribe(self):
+        """Send the worker the rate of each of its sensors that changed since it was last sent."""
+        for sensor in self.unpackers:
+            rate = min(math.ceil(subscriptions.rate(sensor)), 0xFFFF)
+            if rate != self.rates.get(sensor, 0) and self.commands.put_struct(
+                    SUBSCRIBE.frame, SUBSCRIBE.opcode, sensor, rate):
+                self.rates[sensor] = rate
+
+    async def run(self, interval=0.01):
+        """Collect readings and send subscription changes every ``interval`` seconds until cancelled."""
+        while True:
+            self.subscribe()
+            self.collect()
+            await asyncio.sleep(interval)
+
+    def stop(self, timeout=1.0):
+        self.stopped.set()
+        if self.process is not None:
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+        self.commands.close()
+        self.readings.close()
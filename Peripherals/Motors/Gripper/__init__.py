@@ -0,0 +1,28 @@
+"""Grippers on the manipulator arms."""
+import logging
+
+from Communication.commands import GRIPPER
+from Communication.dispatch import handler
+from Communication.service import blocking
+
+from ...backends import SimulatedActuator
+
+log = logging.getLogger(__name__)
+
+#: Backend the gripper states are written to (1 for closed), one channel per gripper.
+backend = SimulatedActuator()
+
+#: Whether each gripper was last commanded closed.
+closed = {}
+
+
+@handler(GRIPPER)
+@blocking
+def set_closed(gripper, close):
+    closed[gripper] = bool(close)
+    backend.write(gripper, int(closed[gripper]))
+    log.debug('gripper %d %s', gripper, 'closed' if close else 'open')
+
+
+def stop():
+    """Grippers keep holding whatever they hold when stopped."""
@@ -0,0 +1,24 @@
+"""Marker droppers."""
+import logging
+
+from Communication.commands import MARKER_RELEASE
+from Communication.dispatch import handler
+from Communication.service import blocking
+
+from ...backends import SimulatedActuator
+
+log = logging.getLogger(__name__)
+
+#: Backend the releases are written to (1 for released), one channel per marker.
+backend = SimulatedActuator()
+
+#: Markers that have already been released.
+released = set()
+
+
+@handler(MARKER_RELEASE)
+@blocking
+def release(marker):
+    released.add(marker)
+    backend.write(marker, 1)
+    log.info('released marker %d', marker)
@@ -0,0 +1,30 @@
+"""Position servos used for tasks (not the thrusters)."""
+import logging
+
+from Communication.commands import SERVO_POSITION
+from Communication.dispatch import handler
+
+from ...backends import SimulatedActuator
+from ..setpoints import Setpoints
+
+log = logging.getLogger(__name__)
+
+#: Backend the pulse widths are written to, one channel per servo.
+backend = SimulatedActuator()
+
+#: Last commanded position of each servo, in microseconds of pulse width.
+positions = {}
+
+#: Positions waiting to be written on the next control tick.
+setpoints = Setpoints()
+
+
+@handler(SERVO_POSITION)
+def set_position(servo, position):
+    positions[servo] = position
+    setpoints.set(servo, position)
+    log.debug('servo %d -> %d', servo, position)
+
+
+def stop():
+    """Servos hold their last position when stopped."""
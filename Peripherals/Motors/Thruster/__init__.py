@@ -0,0 +1,43 @@
+"""Auxiliary thrusters and motors driven directly from the Pi.
+
+The main thrusters are driven over MAVLink and are not handled here.
+"""
+import logging
+import threading
+
+from Communication.commands import MOTOR_THROTTLE
+from Communication.dispatch import handler
+
+from ...backends import SimulatedActuator
+from ..setpoints import Setpoints
+
+log = logging.getLogger(__name__)
+
+#: Backend the throttles are written to, one channel per motor.
+backend = SimulatedActuator()
+
+#: Last commanded throttle of each motor, from -32768 (full reverse) to 32767.
+throttles = {}
+
+#: Throttles waiting to be written on the next control tick.
+setpoints = Setpoints()
+
+# Held while the throttles change, as a stop in the executor can run alongside new throttles from the loop.
+_lock = threading.Lock()
+
+
+@handler(MOTOR_THROTTLE)
+def set_throttle(motor, throttle):
+    with _lock:
+        throttles[motor] = throttle
+        setpoints.set(motor, throttle)
+    log.debug('motor %d -> %d', motor, throttle)
+
+
+def stop():
+    """Stop every motor at once rather than on the next tick."""
+    with _lock:
+        setpoints.clear()
+        for motor in list(throttles):
+            throttles[motor] = 0
+            backend.write(motor, 0)
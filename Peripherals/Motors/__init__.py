@@ -0,0 +1,61 @@
+"""Servos, thrusters and other actuators.
+
+Servo positions and motor throttles are not written when their command
+arrives: each module keeps the newest setpoint per channel in a
+:class:`~Peripherals.Motors.setpoints.Setpoints` and :func:`update` writes
+them out once per control tick.
+
+Everything that writes to a backend holds the caller for a bus transaction,
+so it is marked :func:`~Communication.service.blocking` and runs in the
+executor rather than on the event loop.  ``Stop`` has an executor of its
+own, so it never waits behind other bus writes.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from Communication.commands import STOP
+from Communication.dispatch import handler, periodic
+from Communication.service import blocking
+
+from . import Gripper, Servo, Thruster
+
+log = logging.getLogger(__name__)
+
+#: Control ticks per second, one per servo PWM frame.
+CONTROL_RATE = 50
+
+# Held while setpoints are written out, so a tick that took its setpoints
+# before a stop cannot write them after it.
+_writing = threading.Lock()
+
+# Runs nothing but stop, so a stop is never queued behind slow writes in the shared executor.
+_stopping = ThreadPoolExecutor(1, thread_name_prefix='stop')
+
+
+@handler(STOP)
+@blocking(executor=_stopping)
+def stop():
+    """Stop every actuator that can be stopped."""
+    log.info('stop requested')
+    with _writing:
+        for module in (Thruster, Servo, Gripper):
+            module.stop()
+
+
+@periodic(CONTROL_RATE)
+@blocking
+def update():
+    """Write the newest setpoint of every actuator that was commanded since the last tick.
+
+    Outputs going to the same backend are written together, so a PWM board
+    gets one bus transaction per tick rather than one per command.
+    """
+    with _writing:
+        batches = {}
+        for module in (Servo, Thruster):
+            pending = module.setpoints.take()
+            if pending:
+                batches.setdefault(id(module.backend), (module.backend, {}))[1].update(pending)
+        for backend, outputs in batches.values():
+            backend.write_many(outputs)
@@ -0,0 +1,51 @@
+"""Coalescing of actuator setpoints between control ticks."""
+import collections
+
+
+class Setpoints(object):
+    """Newest setpoint of each actuator channel, waiting for the next control tick.
+
+    The surface can send setpoints far faster than a servo's 50 Hz PWM frame
+    while the pilot moves a joystick, and only the newest one for each
+    channel matters.  A setpoint replaced before it was written out is
+    dropped and counted in :attr:`dropped` (per channel in
+    :attr:`dropped_by_channel`), so at most one write per channel reaches the
+    backend each tick however fast commands arrive.
+    """
+
+    def __init__(self):
+        self.pending = {}
+        self.received = 0
+        self.dropped = 0
+        self.dropped_by_channel = collections.Counter()
+
+    def __len__(self):
+        return len(self.pending)
+
+    def set(self, channel, value):
+        self.received += 1
+        if channel in self.pending:
+            self.dropped += 1
+            self.dropped_by_channel[channel] += 1
+        self.pending[channel] = value
+
+    def take(self):
+        """Remove and return ``{channel: value}`` of every pending setpoint."""
+        pending, self.pending = self.pending, {}
+        return pending
+
+    def clear(self):
+        """Forget pending setpoints without counting them as dropped, e.g. on stop."""
+        self.pending = {}
+
+    def describe(self):
+        by_channel = ', '.join('{}: {}'.format(channel, count)
+                               for channel, count in sorted(self.dropped_by_channel.items()))
+        return '{} setpoints received, {} replaced before being written{}'.format(
+            self.received, self.dropped, ' (by channel {})'.format(by_channel) if by_channel else '')
+
+
+def report(modules):
+    """Return a line describing the :class:`Setpoints` of each of ``modules`` that received any."""
+    return ['{}: {}'.format(module.__name__, module.setpoints.describe()) for module in modules
+            if isinstance(getattr(module, 'setpoints', None), Setpoints) and module.setpoints.received]
@@ -0,0 +1,10 @@
+"""Pressure sensor used to measure depth and water temperature."""
+from ...backends import SimulatedSensor
+from .. import sampling
+
+SENSOR_ID = 0
+
+#: Depth in meters and temperature in degrees Celsius.
+FIELDS = ('depth', 'temperature')
+
+ring = sampling.register(SENSOR_ID, FIELDS, SimulatedSensor(len(FIELDS), baseline=(0.0, 15.0)), capacity=4096)
@@ -0,0 +1,11 @@
+"""Inertial measurement unit mounted on the frame."""
+from ...backends import SimulatedSensor
+from .. import sampling
+
+SENSOR_ID = 1
+
+#: Acceleration in m/s^2 and angular rate in rad/s along each axis.
+FIELDS = ('ax', 'ay', 'az', 'gx', 'gy', 'gz')
+
+ring = sampling.register(SENSOR_ID, FIELDS, SimulatedSensor(len(FIELDS), baseline=(0.0, 0.0, 9.81, 0.0, 0.0, 0.0)),
+                         capacity=16384)
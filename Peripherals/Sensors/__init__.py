@@ -0,0 +1,68 @@
+"""Sensors on the ROV.
+
+Each sensor module registers a ring buffer for its readings with
+:func:`Peripherals.Sensors.sampling.register` under its sensor id and pushes
+every sample into it.  The surface asks for statistics over recent samples
+with a ``SensorRequest``; the reply is sent over the uplink as one
+``SensorStats`` frame per field, batched into a single datagram.
+
+Sensors are only polled as fast as something needs them: the surface sends
+``Subscribe(sensor, rate)`` and each sensor is polled at the highest rate it
+is subscribed at, or not at all (see :mod:`Communication.subscriptions`).
+``SubscribeTopic`` asks for a sensor's samples reduced on the Pi, e.g. the
+mean depth at 10 Hz (see :mod:`Communication.topics`).
+"""
+import logging
+
+from Communication import topics, uplink
+from Communication.commands import SENSOR_REQUEST, SENSOR_STATS, SUBSCRIBE, SUBSCRIBE_TOPIC
+from Communication.dispatch import handler
+from Communication.protocol import encode_batch
+from Communication.subscriptions import subscriptions
+
+from . import sampling
+
+log = logging.getLogger(__name__)
+
+
+def stats_frame(sensor, window_ms=0):
+    """Encode the statistics of ``sensor`` over the last ``window_ms``.
+
+    A window of 0 reports just the most recent sample.  Returns ``None`` if
+    the sensor is unknown or has no samples in the window.
+    """
+    ring = sampling.buffers.get(sensor)
+    if ring is None:
+        return None
+    stats = ring.stats(seconds=window_ms / 1000.0) if window_ms else ring.stats(n=1)
+    if stats is None:
+        return None
+    return encode_batch(SENSOR_STATS.encode(sensor, field, stats.count, stats.mean[field], stats.min[field],
+                                            stats.max[field], stats.last[field])
+                        for field in range(len(ring.fields)))
+
+
+@handler(SENSOR_REQUEST)
+def request(sensor, window_ms):
+    frame = stats_frame(sensor, window_ms)
+    if frame is None:
+        log.warning('no samples from sensor %d in the last %d ms', sensor, window_ms)
+        return
+    uplink.surface.send(frame)
+
+
+@handler(SUBSCRIBE)
+def subscribe(sensor, rate):
+    if sensor not in sampling.buffers:
+        log.warning('subscription to unknown sensor %d', sensor)
+        return
+    subscriptions.subscribe(sensor, 'surface', rate)
+
+
+@handler(SUBSCRIBE_TOPIC)
+def subscribe_topic(topic, sensor, rate, reduction):
+    ring = sampling.buffers.get(sensor)
+    if ring is None:
+        log.warning('topic %d subscribes to unknown sensor %d', topic, sensor)
+        return
+    topics.publisher.subscribe(topic, sensor, ring, rate, reduction)
@@ -0,0 +1,172 @@
+"""Shared I2C bus for sensors, read in one batch per poll.
+
+Most of the ROV's sensors sit on the Pi's one I2C bus.  Reading each of them
+register by register costs a bus transaction (and a syscall) per byte, so a
+:class:`BusManager` collects the register blocks of every sensor on a bus
+and reads them all at once: each sensor's block is one burst read, and with
+``mode='combined'`` every burst goes out in a single ``I2C_RDWR`` ioctl.
+Sensors use it through :class:`BusSensor`, an ordinary
+:class:`~Peripherals.backends.SensorBackend`::
+
+    manager = BusManager(SMBusBus(1))
+    sampling.register(SENSOR_ID, FIELDS, BusSensor(manager, 0x28, 0x08, '<6h', scale=0.01))
+
+Before a round of polls :func:`~Peripherals.Sensors.sampling.poll_due`
+calls :meth:`BusSensor.expect` on every sensor it is about to read.  The
+first :meth:`BusSensor.read` of the round transfers the blocks of every
+expected sensor on the bus, and no others, so a sensor subscribed at 10 Hz
+is not read along with one at 1 kHz; the rest of the round is served from
+that transfer.  The manager takes its lock once per transfer rather than
+once per read.
+"""
+import struct
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+from ..backends import SensorBackend, hold
+
+#: A block of ``length`` registers starting at ``register`` on the device at ``address``.
+Read = namedtuple('Read', 'address register length')
+
+MODES = ('byte', 'block', 'combined')
+
+
+class I2CBus(object):
+    """Raw access to an I2C bus."""
+
+    #: Most reads one :meth:`transfer` may be given.
+    max_reads = 1
+
+    def transfer(self, reads):
+        """Perform every :class:`Read` in ``reads`` as one transaction, returning the bytes of each."""
+        raise NotImplementedError
+
+
+class SMBusBus(I2CBus):
+    """Linux I2C bus ``number`` (``/dev/i2c-<number>``), through ``smbus2``."""
+
+    #: The kernel accepts at most 42 messages per ``I2C_RDWR``, two per read.
+    max_reads = 21
+
+    def __init__(self, number=1):
+        try:
+            from smbus2 import SMBus, i2c_msg
+        except ImportError:
+            raise ImportError('reading sensors over I2C requires smbus2 (pip install smbus2)') from None
+        self.smbus = SMBus(number)
+        self.i2c_msg = i2c_msg
+
+    def transfer(self, reads):
+        messages = []
+        for read in reads:
+            messages.append(self.i2c_msg.write(read.address, [read.register]))
+            messages.append(self.i2c_msg.read(read.address, read.length))
+        self.smbus.i2c_rdwr(*messages)
+        return [bytes(message) for message in messages[1::2]]
+
+    def close(self):
+        self.smbus.close()
+
+
+class SimulatedBus(I2CBus):
+    """An I2C bus whose devices return random register contents, with realistic timing.
+
+    Each :meth:`transfer` holds the caller for ``overhead`` (the ioctl and
+    start condition) plus nine clock cycles per byte on the wire at ``clock``
+    Hz: the address and register byte written, the address again and the
+    bytes read.
+    """
+
+    max_reads = 21
+
+    def __init__(self, clock=400000, overhead=0.00005, seed=0):
+        self.clock = clock
+        self.overhead = overhead
+        self.rng = np.random.default_rng(seed)
+        self.transfers = 0
+        self.busy = 0.0
+
+    def transfer(self, reads):
+        wire = sum(3 + read.length for read in reads)
+        seconds = self.overhead + wire * 9.0 / self.clock
+        hold(seconds)
+        self.transfers += 1
+        self.busy += seconds
+        return [self.rng.bytes(read.length) for read in reads]
+
+
+class BusManager(object):
+    """Reads the register blocks of every :class:`BusSensor` on ``bus`` together.
+
+    ``mode`` is how the blocks are read: ``'byte'`` one register per
+    transaction, ``'block'`` one burst read per sensor, or ``'combined'``
+    every sensor's burst read in as few transactions as the bus allows.
+    """
+
+    def __init__(self, bus, mode='combined'):
+        if mode not in MODES:
+            raise ValueError('mode must be one of {}, not {!r}'.format(', '.join(MODES), mode))
+        self.bus = bus
+        self.mode = mode
+        self.sensors = []
+        #: Sensors to read on the next :meth:`refresh`, in the order they were added.
+        self.expected = []
+        self.lock = threading.Lock()
+        self.polls = 0
+
+    def add(self, sensor):
+        self.sensors.append(sensor)
+
+    def expect(self, sensor):
+        """Read ``sensor`` on the next :meth:`refresh`."""
+        with self.lock:
+            if sensor not in self.expected:
+                self.expected.append(sensor)
+
+    def refresh(self, sensor):
+        """Read the block of every expected sensor and ``sensor``, and hand each its block."""
+        with self.lock:
+            sensors = [other for other in self.sensors if other is sensor or other in self.expected]
+            self.expected = []
+            reads = [other.block for other in sensors]
+            if self.mode == 'combined':
+                data = []
+                for start in range(0, len(reads), self.bus.max_reads):
+                    data.extend(self.bus.transfer(reads[start:start + self.bus.max_reads]))
+            elif self.mode == 'block':
+                data = [self.bus.transfer([read])[0] for read in reads]
+            else:
+                data = [b''.join(self.bus.transfer([Read(read.address, read.register + offset, 1)])[0]
+                                 for offset in range(read.length)) for read in reads]
+            for other, block in zip(sensors, data):
+                other.data = block
+            self.polls += 1
+
+
+class BusSensor(SensorBackend):
+    """A sensor whose sample is one block of registers on a :class:`BusManager`'s bus.
+
+    The block starting at ``register`` on the device at ``address`` is
+    unpacked with the :mod:`struct` format ``fmt`` (one value per field) and
+    multiplied by ``scale``.
+    """
+
+    def __init__(self, manager, address, register, fmt, scale=1.0):
+        self.manager = manager
+        self.format = struct.Struct(fmt)
+        self.block = Read(address, register, self.format.size)
+        self.scale = scale
+        #: Bytes from the last transfer, or ``None`` once they have been read.
+        self.data = None
+        manager.add(self)
+
+    def expect(self):
+        self.manager.expect(self)
+
+    def read(self):
+        if self.data is None:
+            self.manager.refresh(self)
+        data, self.data = self.data, None
+        return np.multiply(self.format.unpack(data), self.scale)
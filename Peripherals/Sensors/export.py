@@ -0,0 +1,178 @@
+"""Background export of sensor ring buffers to compressed columnar chunk files.
+
+Ring buffers only hold the last few seconds of each sensor.  A
+:class:`ColumnarExporter` keeps everything for post-dive analysis: on its
+own thread it copies the samples pushed since its last visit out of every
+ring into a preallocated chunk per sensor, and writes each chunk once it is
+full or ``interval`` seconds old as::
+
+    DIRECTORY/sensor<id>/<number of the first sample, 12 digits>.npz
+
+an ``np.savez_compressed`` archive with one deflate-compressed array per
+column: ``timestamp`` (``time.monotonic_ns()``) and one per field.  Columns
+are read lazily from the archive, so :func:`load` reads only the sensors
+and fields asked for.  Files are written under a temporary name and renamed,
+so a crash never leaves half a chunk.
+
+Sampling never waits for the exporter: the exporter only reads the rings.
+Memory is bounded by one chunk per sensor, and no sample is lost as long as
+the exporter visits every ring before it wraps, i.e. every ``poll`` seconds
+plus the time to write a chunk stays under ``capacity / rate`` of every
+sensor (4096 samples are 4 seconds at 1 kHz).  Samples overwritten before
+they were copied are counted in :attr:`ColumnarExporter.missing` and
+logged.
+"""
+import glob
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+class Chunk(object):
+    """Preallocated rows of one sensor waiting to be written."""
+
+    def __init__(self, fields, rows, dtype):
+        self.fields = fields
+        self.times = np.zeros(rows, dtype=np.int64)
+        self.values = np.zeros((rows, len(fields)), dtype=dtype)
+        self.filled = 0
+        #: Number of the first sample in the chunk, counted since the ring was created.
+        self.first = 0
+        #: ``time.monotonic()`` when the first row was added.
+        self.started = None
+
+    def add(self, times, values, first):
+        """Copy as many rows as fit, returning how many did."""
+        if not self.filled:
+            self.first = first
+            self.started = time.monotonic()
+        n = min(len(times), len(self.times) - self.filled)
+        self.times[self.filled:self.filled + n] = times[:n]
+        self.values[self.filled:self.filled + n] = values[:n]
+        self.filled += n
+        return n
+
+    @property
+    def full(self):
+        return self.filled == len(self.times)
+
+
+class ColumnarExporter(object):
+    """Exports every ring in ``buffers`` to chunk files under ``directory`` on a background thread.
+
+    ``buffers`` maps sensor ids to :class:`~Peripherals.Sensors.sampling.RingBuffer`,
+    usually :data:`~Peripherals.Sensors.sampling.buffers`.  A chunk holds up
+    to ``rows`` samples.
+    """
+
+    def __init__(self, buffers, directory, rows=65536, interval=60.0, poll=0.5):
+        self.buffers = buffers
+        self.directory = directory
+        self.rows = rows
+        self.interval = interval
+        self.poll = poll
+        #: Samples copied out of each ring, keyed by sensor.
+        self.exported = {}
+        self.chunks = {}
+        self.thread = None
+        self.stopping = threading.Event()
+        self.files = 0
+        self.bytes = 0
+        self.samples = 0
+        self.missing = 0
+        #: CPU seconds used by the export thread, set when it stops.
+        self.cpu = 0.0
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='sensor-export', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Write out every sample pushed so far and stop the thread."""
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        while not self.stopping.wait(self.poll):
+            self.collect()
+        self.collect(final=True)
+        self.cpu = time.thread_time()
+
+    def collect(self, final=False):
+        """Copy new samples out of every ring, writing chunks that are full, old enough, or all if ``final``."""
+        for sensor, ring in list(self.buffers.items()):
+            chunk = self.chunks.get(sensor)
+            if chunk is None:
+                chunk = self.chunks[sensor] = Chunk(ring.fields, self.rows, ring.values.dtype)
+                # Start from the oldest sample still in the ring.
+                self.exported[sensor] = ring.count - len(ring)
+            times, values, missing = ring.since(self.exported[sensor])
+            if missing:
+                self.missing += missing
+                log.warning('sensor %s: %d samples were overwritten before they could be exported', sensor, missing)
+            first = self.exported[sensor] + missing
+            self.exported[sensor] = first + len(times)
+            while len(times):
+                n = chunk.add(times, values, first)
+                times, values, first = times[n:], values[n:], first + n
+                if chunk.full:
+                    self._write(sensor, chunk)
+            if chunk.filled and (final or time.monotonic() - chunk.started >= self.interval):
+                self._write(sensor, chunk)
+
+    def _write(self, sensor, chunk):
+        folder = os.path.join(self.directory, 'sensor{}'.format(sensor))
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, '{:012d}.npz'.format(chunk.first))
+        columns = {'timestamp': chunk.times[:chunk.filled]}
+        for column, field in enumerate(chunk.fields):
+            columns[field] = chunk.values[:chunk.filled, column]
+        with open(path + '.tmp', 'wb') as f:
+            np.savez_compressed(f, **columns)
+        os.replace(path + '.tmp', path)
+        self.files += 1
+        self.bytes += os.path.getsize(path)
+        self.samples += chunk.filled
+        chunk.filled = 0
+
+    def describe(self):
+        return 'export: {} samples in {} files, {} bytes, {} missing, {:.1f} ms CPU'.format(
+            self.samples, self.files, self.bytes, self.missing, self.cpu * 1e3)
+
+
+def load(directory, sensor, fields=None, start=None, stop=None):
+    """Load the exported samples of ``sensor`` as a structured array with a ``timestamp`` column.
+
+    Only the ``fields`` asked for (all by default) are read.  ``start`` and
+    ``stop`` limit the timestamps.
+    """
+    paths = sorted(glob.glob(os.path.join(directory, 'sensor{}'.format(sensor), '*.npz')))
+    parts = []
+    for path in paths:
+        with np.load(path) as archive:
+            names = [name for name in archive.files if name != 'timestamp'] if fields is None else list(fields)
+            times = archive['timestamp']
+            keep = np.ones(len(times), dtype=bool)
+            if start is not None:
+                keep &= times >= start
+            if stop is not None:
+                keep &= times < stop
+            if not keep.any():
+                continue
+            columns = [(name, archive[name]) for name in names]
+            part = np.zeros(int(keep.sum()), dtype=[('timestamp', np.int64)]
+                            + [(name, column.dtype) for name, column in columns])
+            part['timestamp'] = times[keep]
+            for name, column in columns:
+                part[name] = column[keep]
+            parts.append(part)
+    if not parts:
+        return np.zeros(0, dtype=[('timestamp', np.int64)])
+    return np.concatenate(parts)
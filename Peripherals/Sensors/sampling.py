@@ -0,0 +1,197 @@
+"""Fixed-capacity, NumPy-backed ring buffers for sensor samples.
+
+A sensor module registers its sensor with :func:`register`, giving the
+fields of a sample and the :class:`~Peripherals.backends.SensorBackend` to
+read it from.  :func:`poll` reads the backend and pushes the sample into the
+sensor's :class:`RingBuffer`.  Samples are stored as rows of a preallocated
+array next to a ``time.monotonic_ns()`` timestamp, so a high-rate sensor such
+as the IMU does not create a Python object per sample.
+
+Windowed statistics are computed with vectorized NumPy reductions on views of
+the underlying arrays; only the requested window is ever touched.
+
+:func:`poll_due` polls each sensor at the rate it is subscribed at in
+:data:`Communication.subscriptions.subscriptions` and leaves sensors nobody
+is subscribed to idle.
+"""
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from Communication.subscriptions import subscriptions
+
+#: Statistics over a window of samples.  ``mean``, ``min``, ``max`` and
+#: ``last`` are arrays with one entry per field.
+Stats = namedtuple('Stats', 'count mean min max last')
+
+
+class RingBuffer(object):
+    """Timestamped ring of the most recent ``capacity`` samples of a sensor.
+
+    Each sample is a row with one value per name in ``fields``.  A single
+    thread should push samples; readers on other threads only ever see
+    complete samples unless they read a window as large as the whole buffer
+    while it is being overwritten.
+    """
+
+    def __init__(self, fields, capacity=4096, dtype=np.float64):
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.int64)
+        self.values = np.zeros((capacity, len(self.fields)), dtype=dtype)
+        #: Total number of samples ever pushed.
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def push(self, values, timestamp=None):
+        """Append one sample; ``values`` has one entry per field."""
+        index = self.count % self.capacity
+        self.times[index] = time.monotonic_ns() if timestamp is None else timestamp
+        self.values[index] = values
+        self.count += 1
+
+    def extend(self, values, timestamps):
+        """Append several samples at once from arrays of rows and timestamps."""
+        values = np.asarray(values, dtype=self.values.dtype).reshape(-1, len(self.fields))
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        if len(values) > self.capacity:
+            skipped = len(values) - self.capacity
+            values, timestamps = values[skipped:], timestamps[skipped:]
+            self.count += skipped
+        start = self.count % self.capacity
+        first = min(len(values), self.capacity - start)
+        self.times[start:start + first] = timestamps[:first]
+        self.values[start:start + first] = values[:first]
+        self.times[:len(values) - first] = timestamps[first:]
+        self.values[:len(values) - first] = values[first:]
+        self.count += len(values)
+
+    def segments(self, n=None):
+        """Return the last ``n`` samples (all by default) as at most two slices, oldest first."""
+        n = len(self) if n is None else min(n, len(self))
+        if n <= 0:
+            return []
+        end = self.count % self.capacity or self.capacity
+        if n <= end:
+            return [slice(end - n, end)]
+        return [slice(self.capacity - (n - end), self.capacity), slice(0, end)]
+
+    def since(self, count):
+        """Return copies of the ``(timestamps, values)`` pushed after the first ``count``, and how many are missing.
+
+        Samples that were already overwritten are left out and counted as
+        missing.
+        """
+        total = self.count
+        n = min(total - count, self.capacity)
+        missing = total - count - n
+        if n <= 0:
+            return self.times[:0].copy(), self.values[:0].copy(), max(missing, 0)
+        # Work from the snapshot of count, as more samples may be pushed meanwhile.
+        end = total % self.capacity or self.capacity
+        if n <= end:
+            parts = [slice(end - n, end)]
+        else:
+            parts = [slice(self.capacity - (n - end), self.capacity), slice(0, end)]
+        return (np.concatenate([self.times[part] for part in parts]),
+                np.concatenate([self.values[part] for part in parts]), missing)
+
+    def count_since(self, timestamp):
+        """Number of buffered samples taken at or after ``timestamp``."""
+        return sum(int(len(self.times[part]) - np.searchsorted(self.times[part], timestamp))
+                   for part in self.segments())
+
+    def last(self, n):
+        """Return copies of the last ``n`` ``(timestamps, values)``, oldest first."""
+        parts = self.segments(n)
+        if not parts:
+            return self.times[:0].copy(), self.values[:0].copy()
+        return (np.concatenate([self.times[part] for part in parts]),
+                np.concatenate([self.values[part] for part in parts]))
+
+    def stats(self, n=None, seconds=None):
+        """Return :class:`Stats` over the last ``n`` samples or the last ``seconds``.
+
+        With neither given the whole buffer is used.  Returns ``None`` if the
+        window is empty.
+        """
+        if seconds is not None:
+            n = self.count_since(time.monotonic_ns() - int(seconds * 1e9))
+        parts = [self.values[part] for part in self.segments(n)]
+        if not parts:
+            return None
+        count = sum(len(part) for part in parts)
+        total = np.sum([part.sum(axis=0) for part in parts], axis=0)
+        return Stats(count,
+                     total / count,
+                     np.min([part.min(axis=0) for part in parts], axis=0),
+                     np.max([part.max(axis=0) for part in parts], axis=0),
+                     parts[-1][-1].copy())
+
+
+#: Ring buffer of every registered sensor, keyed by sensor id.
+buffers = {}
+
+#: Backend every registered sensor is read from, keyed by sensor id.  It is
+#: ``None`` for sensors read by another process.
+backends = {}
+
+
+def register(sensor, fields, backend, capacity=4096):
+    """Create and register the ring buffer for ``sensor``, read from ``backend``."""
+    if sensor in buffers:
+        raise ValueError('sensor {} is already registered'.format(sensor))
+    buffers[sensor] = RingBuffer(fields, capacity)
+    backends[sensor] = backend
+    return buffers[sensor]
+
+
+def poll(sensor):
+    """Read one sample of ``sensor`` from its backend into its ring buffer."""
+    buffers[sensor].push(backends[sensor].read())
+
+
+def poll_many(sensors):
+    """Poll ``sensors``, telling each backend it will be read first."""
+    for sensor in sensors:
+        backends[sensor].expect()
+    for sensor in sensors:
+        poll(sensor)
+
+
+def poll_all():
+    """Poll every sensor read by this process."""
+    poll_many([sensor for sensor in buffers if backends[sensor] is not None])
+
+
+#: Time (``time.monotonic()``) each sensor is next due to be polled.
+due = {}
+
+
+def poll_due():
+    """Poll every sensor whose next poll at its subscribed rate is due.
+
+    Returns the seconds until the next sensor is due, or ``None`` if no
+    sensor read by this process is subscribed.
+    """
+    now = time.monotonic()
+    wait = None
+    ready = []
+    for sensor in buffers:
+        rate = subscriptions.rate(sensor)
+        if not rate or backends[sensor] is None:
+            due.pop(sensor, None)
+            continue
+        # A sensor whose rate was just raised is polled within its new period.
+        deadline = min(due.get(sensor, now), now + 1.0 / rate)
+        if deadline <= now:
+            ready.append(sensor)
+            # Keep to the schedule, but do not try to catch up on polls that were missed.
+            deadline = max(deadline + 1.0 / rate, now)
+            due[sensor] = deadline
+        wait = deadline - now if wait is None else min(wait, deadline - now)
+    poll_many(ready)
+    return wait
@@ -0,0 +1,6 @@
+"""Sensors, motors and other peripherals on the ROV.
+
+Each peripheral is its own module.  Modules register handlers for the
+commands they act on with :func:`Communication.dispatch.handler`; the
+Communication service discovers them at startup.
+"""
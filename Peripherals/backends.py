@@ -0,0 +1,143 @@
+"""Hardware backends for peripherals.
+
+Peripheral modules never talk to a bus directly.  Actuator modules write
+through a module-level ``backend`` (an :class:`ActuatorBackend`) and sensors
+are read through the backend registered with
+:func:`Peripherals.Sensors.sampling.register` (a :class:`SensorBackend`).
+Swapping the backend is all it takes to run the same code against real
+hardware or a simulation.  Writes are made from executor threads (the
+handlers that make them are marked ``@blocking``), so a driver shared by
+several modules must serialise its own bus access.
+
+The simulated backends model the latency of an I2C transaction or PWM update
+and the noise of a real sensor.  Delays are busy-waited to the microsecond
+and noise comes from a seeded generator, so runs are repeatable and can be
+used to profile the dispatch path in CI without a Pi.  Until the hardware
+drivers are written every peripheral defaults to a simulated backend with no
+delay.
+"""
+import time
+
+import numpy as np
+
+
+def hold(seconds):
+    """Wait ``seconds`` precisely, sleeping for most of it and spinning for the rest."""
+    if seconds <= 0:
+        return
+    end = time.perf_counter() + seconds
+    if seconds > 0.002:
+        time.sleep(seconds - 0.001)
+    while time.perf_counter() < end:
+        pass
+
+
+class ActuatorBackend(object):
+    """Writes output values to numbered actuator channels."""
+
+    def write(self, channel, value):
+        raise NotImplementedError
+
+    def write_many(self, outputs):
+        """Write ``{channel: value}`` in as few bus transactions as the hardware allows.
+
+        A PCA9685 can take every channel in one auto-increment I2C write, so
+        drivers for it should override this; the default writes one at a time.
+        """
+        for channel, value in outputs.items():
+            self.write(channel, value)
+
+
+class SensorBackend(object):
+    """Reads one sample (a sequence with one value per field) from a sensor."""
+
+    def expect(self):
+        """Called before a round of polls on the backend of every sensor the round will read.
+
+        Backends that share a bus use it to fetch only those sensors together.
+        """
+
+    def read(self):
+        raise NotImplementedError
+
+
+class SimulatedActuator(ActuatorBackend):
+    """Records outputs after a configurable bus latency.
+
+    ``latency`` is the time one write holds the caller, e.g. about 0.3 ms for
+    a PCA9685 register write at 400 kHz.  A :meth:`write_many` is one
+    transaction that takes ``latency`` plus ``channel_time`` for every
+    channel after the first (the 4 bytes of a PCA9685 channel take about
+    0.1 ms at 400 kHz).  ``jitter`` adds up to that many seconds more to each
+    transaction, drawn from a generator seeded with ``seed``.
+
+    :attr:`busy` is the total time spent on the simulated bus.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, seed=0, channel_time=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.channel_time = channel_time
+        self.rng = np.random.default_rng(seed)
+        self.outputs = {}
+        self.writes = 0
+        self.transactions = 0
+        self.busy = 0.0
+
+    def _transaction(self, channels):
+        seconds = self.latency + self.channel_time * (channels - 1)
+        if self.jitter:
+            seconds += self.jitter * self.rng.random()
+        hold(seconds)
+        self.transactions += 1
+        self.writes += channels
+        self.busy += seconds
+
+    def write(self, channel, value):
+        self._transaction(1)
+        self.outputs[channel] = value
+
+    def write_many(self, outputs):
+        if outputs:
+            self._transaction(len(outputs))
+            self.outputs.update(outputs)
+
+
+class SimulatedSensor(SensorBackend):
+    """Returns ``baseline`` plus Gaussian noise after a configurable bus latency.
+
+    ``baseline`` is a scalar or one value per field.  ``latency``, ``jitter``
+    and ``seed`` work as for :class:`SimulatedActuator`.
+    """
+
+    def __init__(self, width, baseline=0.0, noise=0.01, latency=0.0, jitter=0.0, seed=0):
+        self.baseline = np.broadcast_to(np.asarray(baseline, dtype=np.float64), (width,)).copy()
+        self.noise = noise
+        self.latency = latency
+        self.jitter = jitter
+        self.rng = np.random.default_rng(seed)
+        self.reads = 0
+
+    def read(self):
+        hold(self.latency + (self.jitter * self.rng.random() if self.jitter else 0.0))
+        self.reads += 1
+        return self.baseline + self.rng.normal(0.0, self.noise, len(self.baseline))
+
+
+def simulate(modules, actuator_latency=0.0, sensor_latency=0.0, jitter=0.0, noise=0.01):
+    """Give every actuator in ``modules`` and every registered sensor a simulated backend.
+
+    ``modules`` are imported peripheral modules; any with a module-level
+    ``backend`` that is an :class:`ActuatorBackend` gets a new
+    :class:`SimulatedActuator`.
+    """
+    from .Sensors import sampling
+
+    for seed, module in enumerate(modules):
+        if isinstance(getattr(module, 'backend', None), ActuatorBackend):
+            module.backend = SimulatedActuator(actuator_latency, jitter, seed)
+    for sensor, ring in sampling.buffers.items():
+        baseline = sampling.backends[sensor].baseline if isinstance(sampling.backends.get(sensor),
+                                                                     SimulatedSensor) else 0.0
+        sampling.backends[sensor] = SimulatedSensor(len(ring.fields), baseline, noise, sensor_latency, jitter,
+                                                    seed=sensor)
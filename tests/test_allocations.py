@@ -0,0 +1,23 @@
+import asyncio
+import unittest
+
+from Communication.benchmarks import traffic
+from Communication.benchmarks.allocations import measure
+
+#: Bytes the zero-copy receive path may allocate per packet; the asyncio transport allocates over 256 KiB.
+BOUND = 4096
+
+
+class AllocationTest(unittest.TestCase):
+    def test_zero_copy_stays_under_bound(self):
+        allocated, most, retained = asyncio.run(measure(traffic.synthetic(500), zero_copy=True))
+        self.assertLessEqual(allocated, BOUND)
+        self.assertLess(retained, 64)
+
+    def test_transport_allocates_receive_buffer(self):
+        allocated, most, retained = asyncio.run(measure(traffic.synthetic(100), zero_copy=False))
+        self.assertGreater(allocated, BOUND)
+
+
+if __name__ == '__main__':
+    unittest.main()
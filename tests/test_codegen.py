@@ -0,0 +1,82 @@
+import itertools
+import unittest
+
+from Communication import encoders, schema
+from Communication.codegen import main as codegen
+from Communication.commands import UPLINK_OPCODES, surface_commands
+from Communication.packed import PACKED_SPECS, PackedSpec, struct_range
+from Communication.protocol import SPECS, ProtocolError
+
+
+def boundaries(packed):
+    """``(valid, invalid)`` values of each field of ``packed``: its edges, and the values just past them."""
+    valid = [None] * len(packed.kinds)
+    invalid = [None] * len(packed.kinds)
+    for index, shift, mask, sign in packed.fixed:
+        low, high = (-sign, sign - 1) if sign else (0, mask)
+        valid[index] = sorted(set([low, high, 0, 1 if high else 0] + ([-1] if sign else [])))
+        invalid[index] = [low - 1, high + 1]
+    for index, signed, low, high in packed.varints:
+        valid[index] = sorted(set([low, high, 0, 1, 127, 128] + ([-1, -64, -65] if signed else [])))
+        invalid[index] = [low - 1, high + 1]
+    return valid, invalid
+
+
+def out_of_range(valid, invalid):
+    """Rows with one field just out of range and the others at their first valid value."""
+    for index, values in enumerate(invalid):
+        for value in values:
+            row = [field[0] for field in valid]
+            row[index] = value
+            yield tuple(row)
+
+
+class SpecializedTest(unittest.TestCase):
+    """The generated packed codecs must behave exactly like the generic :class:`PackedSpec` methods."""
+
+    def test_generated_modules_are_current(self):
+        self.assertIsNone(codegen(['--check']))
+
+    def test_every_command_is_specialized(self):
+        packed = [spec for spec in PACKED_SPECS if spec is not None]
+        self.assertEqual(sorted(spec.opcode for spec in packed), sorted(spec.opcode for spec in surface_commands()))
+        for spec in packed:
+            self.assertIn('encode', vars(spec), spec.name)
+            self.assertIn('decode', vars(spec), spec.name)
+
+    def test_matches_generic(self):
+        for packed in PACKED_SPECS:
+            if packed is None:
+                continue
+            valid, invalid = boundaries(packed)
+            for row in itertools.product(*valid):
+                payload = packed.encode(*row)
+                self.assertEqual(payload, PackedSpec.encode(packed, *row), (packed.name, row))
+                data = b'\xA5' + payload + b'\x5A'
+                self.assertEqual(packed.decode(data, 1), PackedSpec.decode(packed, data, 1))
+                self.assertEqual(packed.decode(data, 1), (row, 1 + len(payload)))
+                for end in range(1, len(payload)):
+                    self.assertRaises(ProtocolError, packed.decode, data[:end + 1], 1)
+                    self.assertRaises(ProtocolError, PackedSpec.decode, packed, data[:end + 1], 1)
+            for row in out_of_range(valid, invalid):
+                self.assertRaises(ProtocolError, packed.encode, *row)
+                self.assertRaises(ProtocolError, PackedSpec.encode, packed, *row)
+
+    def test_encoders_match_spec(self):
+        for packet in schema.PACKETS:
+            if packet.opcode >= UPLINK_OPCODES:
+                continue
+            spec, encode = SPECS[packet.opcode], getattr(encoders, packet.constant.lower())
+            ranges = [struct_range(fmt) for name, fmt in spec.fields]
+            for row in itertools.product(*[sorted(set([low, high, 0])) for low, high in ranges]):
+                self.assertEqual(encode(*row), spec.encode(*row), (spec.name, row))
+            for index, (low, high) in enumerate(ranges):
+                for value in (low - 1, high + 1):
+                    row = [0] * len(ranges)
+                    row[index] = value
+                    self.assertRaises(ProtocolError, encode, *row)
+                    self.assertRaises(ProtocolError, spec.encode, *row)
+
+
+if __name__ == '__main__':
+    unittest.main()
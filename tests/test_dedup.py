@@ -0,0 +1,113 @@
+import unittest
+
+from Communication.commands import GRIPPER
+from Communication.dedup import DedupCache
+from Communication.protocol import RELIABLE
+from Communication.reliable import HEADER, ReliableReceiver
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class DedupCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.cache = DedupCache(capacity=4, ttl=10.0, clock=self.clock)
+
+    def test_duplicate_within_ttl(self):
+        self.assertTrue(self.cache.add('a'))
+        self.clock.now = 10.0
+        self.assertIn('a', self.cache)
+        self.assertFalse(self.cache.add('a'))
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_expired_entry_counts_as_absent(self):
+        self.cache.add('a')
+        self.clock.now = 10.5
+        self.assertNotIn('a', self.cache)
+        self.assertTrue(self.cache.add('a'))
+        self.assertIn('a', self.cache)
+        self.assertEqual(self.cache.hits, 0)
+
+    def test_full_cache_reuses_oldest_slot(self):
+        for key in 'abcd':
+            self.assertTrue(self.cache.add(key))
+        self.assertTrue(self.cache.add('e'))
+        self.assertEqual(len(self.cache), 4)
+        self.assertNotIn('a', self.cache)
+        self.assertEqual(self.cache.keys, ['e', 'b', 'c', 'd'])
+        self.assertEqual(self.cache.early, 1)
+        # The overwritten key is new again.
+        self.assertTrue(self.cache.add('a'))
+        self.assertNotIn('b', self.cache)
+        self.assertEqual(self.cache.early, 2)
+
+    def test_expired_entries_are_not_early(self):
+        for key in 'abcd':
+            self.cache.add(key)
+        self.clock.now = 11.0
+        for key in 'efgh':
+            self.assertTrue(self.cache.add(key))
+        self.assertEqual(self.cache.early, 0)
+        self.assertEqual(len(self.cache), 4)
+
+    def test_re_added_key_keeps_its_new_slot(self):
+        self.cache.add('a')
+        self.clock.now = 11.0
+        self.cache.add('a')
+        self.cache.add('b')
+        self.cache.add('c')
+        # Overwriting slot 0 must not forget 'a', which now lives in slot 1.
+        self.cache.add('d')
+        self.assertEqual(self.cache.keys, ['d', 'a', 'b', 'c'])
+        self.assertIn('a', self.cache)
+        self.assertEqual(self.cache.early, 0)
+        self.assertEqual(len(self.cache), 4)
+
+
+def reliable(session, sequence):
+    return HEADER.pack(RELIABLE, session, sequence) + GRIPPER.encode(session, 1)
+
+
+class EvictedSessionTest(unittest.TestCase):
+    """A retransmit arriving after the receiver forgot its session."""
+
+    def setUp(self):
+        self.clock = Clock()
+        self.receiver = ReliableReceiver(sessions=1, seen=DedupCache(capacity=16, ttl=30.0, clock=self.clock))
+        self.dispatched = []
+
+    def receive(self, data):
+        inner = self.receiver.receive(data)
+        if inner is not None:
+            self.dispatched.append(inner)
+
+    def evict(self, session):
+        self.receive(reliable(2, 0))
+        self.assertNotIn(session, self.receiver.sessions)
+
+    def test_retransmit_is_dispatched_once(self):
+        self.receive(reliable(1, 0))
+        self.evict(1)
+        self.clock.now = 29.0
+        self.receive(reliable(1, 0))
+        self.assertEqual(self.dispatched, [GRIPPER.encode(1, 1), GRIPPER.encode(2, 1)])
+        self.assertEqual(self.receiver.seen.hits, 1)
+        self.assertEqual(self.receiver.duplicates, 1)
+
+    def test_retransmit_after_ttl_is_dispatched_twice(self):
+        self.receive(reliable(1, 0))
+        self.evict(1)
+        self.clock.now = 31.0
+        self.receive(reliable(1, 0))
+        self.assertEqual(self.dispatched, [GRIPPER.encode(1, 1), GRIPPER.encode(2, 1), GRIPPER.encode(1, 1)])
+        self.assertEqual(self.receiver.duplicates, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
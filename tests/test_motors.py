@@ -0,0 +1,81 @@
+import asyncio
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from Communication.commands import STOP
+from Communication.service import CommandProtocol
+from Peripherals import Motors
+from Peripherals.backends import SimulatedActuator
+from Peripherals.Motors import Thruster
+from Peripherals.Motors.setpoints import Setpoints
+
+
+class Interrupting(SimulatedActuator):
+    """Lets ``set_throttle`` run from another thread during the first write, as the loop can during a stop."""
+
+    def __init__(self, motor, throttle):
+        SimulatedActuator.__init__(self)
+        self.thread = threading.Thread(target=Thruster.set_throttle, args=(motor, throttle))
+
+    def write(self, channel, value):
+        if not self.thread.is_alive() and self.thread.ident is None:
+            self.thread.start()
+            self.thread.join(0.05)
+        SimulatedActuator.write(self, channel, value)
+
+
+class StopTest(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(setattr, Thruster, 'backend', Thruster.backend)
+        self.addCleanup(Thruster.throttles.clear)
+        self.addCleanup(Thruster.setpoints.clear)
+
+    def test_throttle_set_during_stop(self):
+        backend = Thruster.backend = Interrupting(9, 500)
+        Thruster.throttles.update({1: 1000, 2: -1000, 3: 2000})
+        Thruster.stop()
+        backend.thread.join()
+        self.assertEqual(backend.outputs, {1: 0, 2: 0, 3: 0})
+        self.assertEqual(Thruster.throttles, {1: 0, 2: 0, 3: 0, 9: 500})
+        self.assertEqual(Thruster.setpoints.take(), {9: 500})
+
+    def test_stop_has_its_own_executor(self):
+        Thruster.backend = SimulatedActuator()
+        Thruster.throttles[4] = 1000
+        protocol = CommandProtocol({STOP.opcode: Motors.stop})
+
+        async def run():
+            # Hold the service's executor, as slow bus writes would.
+            executor = ThreadPoolExecutor(1)
+            busy = threading.Event()
+            loop = asyncio.get_running_loop()
+            loop.run_in_executor(executor, busy.wait)
+            protocol.executor = executor
+            protocol.connection_made(None)
+            try:
+                protocol.handle(STOP.encode())
+                await asyncio.wait_for(asyncio.gather(*protocol.tasks), 1)
+            finally:
+                busy.set()
+                executor.shutdown()
+
+        asyncio.run(run())
+        self.assertEqual(Thruster.backend.outputs, {4: 0})
+
+
+class SetpointsTest(unittest.TestCase):
+    def test_describe(self):
+        setpoints = Setpoints()
+        self.assertEqual(setpoints.describe(), '0 setpoints received, 0 replaced before being written')
+        for value in range(3):
+            setpoints.set(2, value)
+        setpoints.set(1, 0)
+        setpoints.take()
+        setpoints.set(2, 5)
+        self.assertEqual(setpoints.describe(),
+                         '5 setpoints received, 2 replaced before being written (by channel 2: 2)')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+import random
+import unittest
+
+from Communication.commands import GRIPPER, MOTOR_THROTTLE, SERVO_POSITION, SUBSCRIBE_TOPIC
+from Communication.packed import (MAX_RUN, MAX_VARINT, RUN, PackedSpec, decode_packed, decode_varint,
+                                  encode_packed, encode_varint, struct_range, unzigzag, zigzag)
+from Communication.protocol import CHECKSUM, PacketSpec, ProtocolError, checksum
+
+#: Fixed-width kind holding every value of each struct format, where there is one.
+FIXED_KINDS = {'b': 'i8', 'B': 'u8', 'h': 'i16', 'H': 'u16', 'i': 'i32', 'I': 'u32'}
+
+
+def edges(fmt):
+    low, high = struct_range(fmt)
+    return sorted(set([low, low + 1, 0, 1, high - 1, high] + ([-1] if low < 0 else [])))
+
+
+def spec(kinds, formats):
+    """Unregistered :class:`PackedSpec` with one field per ``(kind, format)``, named ``f0``, ``f1``, ..."""
+    names = ['f{}'.format(index) for index in range(len(kinds))]
+    packet = PacketSpec('Test', 0x7F, list(zip(names, formats)))
+    return PackedSpec(packet, dict(zip(names, kinds)))
+
+
+def reframe(body):
+    """Recompute the checksum of a packed frame without one, so decoding gets past it."""
+    return bytes(body) + CHECKSUM.pack(checksum(body))
+
+
+class VarintTest(unittest.TestCase):
+    def test_zigzag(self):
+        self.assertEqual([zigzag(value) for value in (0, -1, 1, -2, 2)], [0, 1, 2, 3, 4])
+        for value in (0, -1, 1, -(1 << 63), (1 << 63) - 1):
+            self.assertEqual(unzigzag(zigzag(value)), value)
+        self.assertEqual(zigzag(-(1 << 63)), (1 << 64) - 1)
+
+    def test_roundtrip(self):
+        for value in (0, 1, 0x7F, 0x80, 0x3FFF, 0x4000, (1 << 32) - 1, (1 << 64) - 1):
+            data = encode_varint(value)
+            self.assertEqual(decode_varint(b'\x00' + data + b'\x00', 1), (value, 1 + len(data)))
+        self.assertEqual(len(encode_varint(0)), 1)
+        self.assertEqual(len(encode_varint((1 << 64) - 1)), MAX_VARINT)
+
+    def test_limits(self):
+        with self.assertRaises(ProtocolError):
+            decode_varint(b'\x80' * MAX_VARINT + b'\x01', 0)
+        with self.assertRaises(ProtocolError):
+            decode_varint(b'\x80\x80', 0)
+        with self.assertRaises(ProtocolError):
+            decode_varint(b'', 0)
+
+
+class PackedSpecTest(unittest.TestCase):
+    def test_struct_edges(self):
+        for fmt in 'bBhHiIqQ':
+            kinds = ['ivar' if fmt.islower() else 'uvar']
+            if fmt in FIXED_KINDS:
+                kinds.append(FIXED_KINDS[fmt])
+            for kind in kinds:
+                packed = spec([kind], [fmt])
+                for value in edges(fmt):
+                    payload = packed.encode(value)
+                    self.assertEqual(packed.decode(b'\xAA' + payload + b'\xAA', 1), ((value,), 1 + len(payload)),
+                                     (fmt, kind, value))
+                low, high = struct_range(fmt)
+                for value in (low - 1, high + 1):
+                    with self.assertRaises(ProtocolError):
+                        packed.check((value,))
+
+    def test_check(self):
+        packed = spec(['u4', 'i3', 'ivar'], ['B', 'b', 'h'])
+        packed.check((15, -4, -32768))
+        packed.check((0, 3, 32767))
+        for values in ((16, 0, 0), (-1, 0, 0), (0, 4, 0), (0, -5, 0), (0, 0, 32768), (0, 0)):
+            with self.assertRaises(ProtocolError):
+                packed.check(values)
+            with self.assertRaises(ProtocolError):
+                packed.encode(*values)
+
+    def test_kind_must_fit_format(self):
+        for kind, fmt in (('u9', 'B'), ('i8', 'B'), ('u8', 'b'), ('u33', 'Q'), ('u0', 'B'), ('x4', 'B')):
+            with self.assertRaises(ProtocolError):
+                spec([kind], [fmt])
+        with self.assertRaises(ProtocolError):
+            spec(['u8'], ['f'])
+
+    def test_decode_array_matches_decode(self):
+        rng = random.Random(0)
+        layouts = [
+            (['u4', 'u12'], ['B', 'H']),
+            (['i3', 'u1', 'i12'], ['b', 'B', 'h']),
+            (['i8', 'i16', 'u8'], ['b', 'h', 'B']),
+            (['i32', 'u32'], ['i', 'I']),
+            (['u1'], ['B']),
+        ]
+        for kinds, formats in layouts:
+            packed = spec(kinds, formats)
+            bounds = []
+            for index, shift, mask, sign in sorted(packed.fixed):
+                bounds.append((-sign, sign - 1) if sign else (0, mask))
+            rows = [tuple(bound[0] for bound in bounds), tuple(bound[1] for bound in bounds),
+                    tuple(-1 if low < 0 else 0 for low, high in bounds)]
+            rows += [tuple(rng.randint(low, high) for low, high in bounds) for _ in range(300)]
+            data = b'\x00' + b''.join(packed.encode(*row) for row in rows)
+            array = packed.decode_array(data, 1, len(rows))
+            self.assertEqual(array.tolist(), rows, kinds)
+            offset = 1
+            for row in rows:
+                values, offset = packed.decode(data, offset)
+                self.assertEqual(values, row)
+
+    def test_decode_array_needs_fixed_size(self):
+        with self.assertRaises(ProtocolError):
+            spec(['u4', 'ivar'], ['B', 'h']).decode_array(b'\x00' * 8, 0, 1)
+
+
+class PackedFrameTest(unittest.TestCase):
+    def commands(self, count=600):
+        rng = random.Random(1)
+        commands = [(SERVO_POSITION, (rng.randint(0, 15), rng.randint(0, 0xFFF))) for _ in range(count)]
+        commands += [(MOTOR_THROTTLE, (rng.randint(0, 15), rng.randint(-32768, 32767))) for _ in range(40)]
+        commands += [(GRIPPER, (1, 1)), (SUBSCRIBE_TOPIC, (255, 3, 65535, 3))]
+        return commands
+
+    def test_long_runs(self):
+        commands = self.commands()
+        frame = encode_packed(commands)
+        self.assertEqual(frame[1:3], RUN.pack(SERVO_POSITION.opcode, MAX_RUN))
+        vector = decode_packed(frame)
+        scalar = decode_packed(frame, vector_run=1 << 20)
+        self.assertEqual(vector, commands)
+        self.assertEqual(scalar, commands)
+
+    def test_truncated_frames(self):
+        frame = encode_packed(self.commands(40))
+        body = frame[:-CHECKSUM.size]
+        for end in range(len(frame)):
+            with self.assertRaises(ProtocolError):
+                decode_packed(frame[:end])
+        for end in range(1, len(body)):
+            try:
+                decode_packed(reframe(body[:end]))
+            except ProtocolError:
+                pass
+
+    def test_corrupt_frames(self):
+        rng = random.Random(2)
+        frame = encode_packed(self.commands(300))
+        body = bytearray(frame[:-CHECKSUM.size])
+        with self.assertRaises(ProtocolError):
+            decode_packed(frame[:-1] + bytes([frame[-1] ^ 1]))
+        for _ in range(2000):
+            corrupt = bytearray(body)
+            for _ in range(rng.randint(1, 4)):
+                corrupt[rng.randrange(1, len(corrupt))] = rng.randrange(256)
+            try:
+                decode_packed(reframe(corrupt))
+            except ProtocolError:
+                pass
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from Communication.commands import GRIPPER, SENSOR_STATS, SERVO_POSITION
+from Communication.packed import encode_packed
+from Communication.protocol import RELIABLE, encode_batch
+from Communication.recorder import INBOUND, OUTBOUND, FlightLog, FlightRecorder
+from Communication.reliable import HEADER as RELIABLE_HEADER
+from Peripherals.Sensors import IMU, stats_frame
+
+
+class ExtractTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'dive.log')
+        self.now = 0
+        self.flight = FlightRecorder(self.path, 1 << 20, clock=self.clock)
+        self.addCleanup(self.flight.close)
+
+    def clock(self):
+        self.now += 1000
+        return self.now
+
+    def record(self):
+        IMU.ring.push(range(len(IMU.FIELDS)))
+        self.flight.record(OUTBOUND, stats_frame(IMU.SENSOR_ID))
+        self.flight.record(INBOUND, SERVO_POSITION.encode(1, 1100))
+        self.flight.record(INBOUND, encode_batch([SERVO_POSITION.encode(2, 1200), GRIPPER.encode(0, 1)]))
+        self.flight.record(INBOUND, encode_packed([(SERVO_POSITION, (3, 1300)), (SERVO_POSITION, (4, 1400)),
+                                                   (GRIPPER, (1, 1))]))
+        self.flight.record(INBOUND, RELIABLE_HEADER.pack(RELIABLE, 7, 0) + SERVO_POSITION.encode(5, 1500))
+        self.flight.record(INBOUND, SERVO_POSITION.encode(6, 1600))
+
+    def check(self, flight):
+        stats = flight.extract(SENSOR_STATS, OUTBOUND)
+        self.assertEqual(len(stats), len(IMU.FIELDS))
+        self.assertEqual(stats['field'].tolist(), list(range(len(IMU.FIELDS))))
+        self.assertEqual(stats['last'].tolist(), list(range(len(IMU.FIELDS))))
+        servos = flight.extract(SERVO_POSITION, INBOUND)
+        self.assertEqual(servos['servo'].tolist(), [1, 2, 3, 4, 5, 6])
+        self.assertEqual(servos['position'].tolist(), [1100, 1200, 1300, 1400, 1500, 1600])
+        self.assertEqual(servos['timestamp'].tolist(), sorted(servos['timestamp'].tolist()))
+        self.assertEqual(flight.extract(GRIPPER, INBOUND)['gripper'].tolist(), [0, 1])
+        self.assertEqual(len(flight.extract(SERVO_POSITION, INBOUND, start=servos['timestamp'][2])), 4)
+
+    def test_extract_from_containers(self):
+        self.record()
+        self.flight.close()
+        flight = FlightLog(self.path)
+        self.addCleanup(flight.close)
+        self.check(flight)
+
+    def test_extract_without_index(self):
+        self.record()
+        # The recorder was not closed, as after a crash.
+        flight = FlightLog(self.path)
+        self.addCleanup(flight.close)
+        self.check(flight)
+
+    def test_empty_frames_are_not_recorded(self):
+        self.flight.record(INBOUND, b'')
+        self.flight.record(INBOUND, GRIPPER.encode(2, 1))
+        self.flight.record(OUTBOUND, bytearray())
+        self.assertEqual(self.flight.records, 1)
+        self.flight.close()
+        flight = FlightLog(self.path)
+        self.addCleanup(flight.close)
+        self.assertEqual(len(list(flight)), 1)
+        self.assertEqual(flight.extract(GRIPPER, INBOUND)['gripper'].tolist(), [2])
+
+    def test_close_while_recording(self):
+        recorded = []
+
+        def record():
+            for position in range(20000):
+                self.flight.record(INBOUND, SERVO_POSITION.encode(position % 16, position % 4096))
+                recorded.append(position)
+
+        thread = threading.Thread(target=record)
+        thread.start()
+        while len(recorded) < 1000:
+            time.sleep(0.001)
+        self.flight.close()
+        thread.join()
+        self.assertEqual(len(recorded), 20000)
+        flight = FlightLog(self.path)
+        self.addCleanup(flight.close)
+        servos = flight.extract(SERVO_POSITION, INBOUND)
+        self.assertEqual(len(servos), flight.records)
+        self.assertEqual(servos['position'].tolist(), [position % 4096 for position in range(len(servos))])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,233 @@
+import heapq
+import random
+import unittest
+
+from Communication.commands import GRIPPER
+from Communication.protocol import ACK
+from Communication.reliable import (ACK_FRAME, SACK_BITS, WINDOW, ReliableReceiver, ReliableSender, Window,
+                                    distance)
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Link(object):
+    """One direction of a link that loses a fraction of datagrams and delays the rest by a random amount."""
+
+    def __init__(self, clock, deliver, loss=0.0, delay=(0.01, 0.05), seed=0):
+        self.clock = clock
+        self.deliver = deliver
+        self.loss = loss
+        self.delay = delay
+        self.rng = random.Random(seed)
+        self.queue = []
+        self.count = 0
+
+    def send(self, data):
+        if self.rng.random() < self.loss:
+            return
+        self.count += 1
+        heapq.heappush(self.queue, (self.clock() + self.rng.uniform(*self.delay), self.count, data))
+
+    def run(self):
+        """Deliver every datagram due by now."""
+        while self.queue and self.queue[0][0] <= self.clock():
+            self.deliver(heapq.heappop(self.queue)[2])
+
+
+def ack(session, expected, bitmap=0):
+    return ACK_FRAME.pack(ACK, session, expected, bitmap)
+
+
+class DistanceTest(unittest.TestCase):
+    def test_wraparound(self):
+        self.assertEqual(distance(0, 0xFFFF), 1)
+        self.assertEqual(distance(0xFFFF, 0), -1)
+        self.assertEqual(distance(5, 0xFFFB), 10)
+        self.assertEqual(distance(0x7FFF, 0), 0x7FFF)
+        self.assertEqual(distance(0x8000, 0), -0x8000)
+
+
+class WindowTest(unittest.TestCase):
+    def test_selective_ack(self):
+        window = Window(0xFFFE)
+        self.assertTrue(window.accept(0))
+        self.assertTrue(window.accept(3))
+        self.assertEqual(window.expected, 0xFFFE)
+        self.assertEqual(window.bitmap(), 0b10010)
+        self.assertTrue(window.accept(0xFFFE))
+        self.assertTrue(window.accept(0xFFFF))
+        self.assertEqual(window.expected, 1)
+        self.assertEqual(window.bitmap(), 0b10)
+
+    def test_bitmap_covers_sack_bits(self):
+        window = Window(0)
+        window.accept(SACK_BITS)
+        window.accept(SACK_BITS + 1)
+        self.assertEqual(window.bitmap(), 1 << SACK_BITS - 1)
+
+    def test_duplicate_and_stale(self):
+        window = Window(10)
+        self.assertTrue(window.accept(12))
+        self.assertFalse(window.accept(12))
+        self.assertFalse(window.accept(9))
+        self.assertFalse(window.accept(10 + WINDOW))
+        self.assertTrue(window.accept(10))
+        self.assertFalse(window.accept(10))
+
+
+class ReceiverTest(unittest.TestCase):
+    def test_duplicates_are_dropped_and_acknowledged(self):
+        acks = []
+        receiver = ReliableReceiver(acks.append)
+        frames = []
+        sender = ReliableSender(frames.append, session=7)
+        for gripper in range(3):
+            sender.send(GRIPPER.encode(gripper, 1))
+        self.assertEqual(receiver.receive(frames[2]), GRIPPER.encode(2, 1))
+        self.assertEqual(acks[-1], ack(7, 0, 0b10))
+        self.assertIsNone(receiver.receive(frames[2]))
+        self.assertEqual(receiver.receive(frames[0]), GRIPPER.encode(0, 1))
+        self.assertEqual(acks[-1], ack(7, 1, 0b1))
+        self.assertIsNone(receiver.receive(frames[0]))
+        self.assertEqual(receiver.duplicates, 2)
+        self.assertEqual(len(acks), 4)
+
+
+class SenderTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.frames = []
+        self.sender = ReliableSender(self.frames.append, min_rto=0.01, max_rto=2.0, initial_rto=0.25, max_retries=3,
+                                     clock=self.clock, session=1)
+
+    def test_rtt_sample(self):
+        self.sender.send(b'\x01')
+        self.clock.now = 0.05
+        self.sender.ack(ack(1, 1))
+        self.assertEqual(self.sender.srtt, 0.05)
+        self.assertEqual(self.sender.rttvar, 0.025)
+        self.assertAlmostEqual(self.sender.rto, 0.15)
+        self.assertEqual(self.sender.next_timeout(), None)
+
+    def test_karn_rule(self):
+        self.sender.send(b'\x01')
+        self.clock.now = 0.25
+        self.sender.poll()
+        self.assertEqual(self.sender.retransmitted, 1)
+        self.clock.now = 0.3
+        self.sender.ack(ack(1, 1))
+        self.assertFalse(self.sender.pending)
+        self.assertIsNone(self.sender.srtt)
+        self.assertEqual(self.sender.rto, 0.25)
+
+    def test_backoff_and_give_up(self):
+        self.sender.send(b'\x01')
+        sent = []
+        with self.assertLogs('Communication.reliable', 'WARNING'):
+            while self.sender.pending:
+                self.clock.now += self.sender.next_timeout()
+                before = len(self.frames)
+                self.sender.poll()
+                if len(self.frames) > before:
+                    sent.append(self.clock.now)
+        self.assertEqual(sent, [0.25, 0.75, 1.75])
+        self.assertEqual(self.clock.now, 3.75)
+        self.assertEqual(len(self.frames), 1 + self.sender.max_retries)
+        self.assertEqual(self.sender.failed, 1)
+        self.assertIsNone(self.sender.next_timeout())
+
+    def test_timeout_is_capped(self):
+        self.sender.max_retries = 10
+        self.sender.send(b'\x01')
+        timeouts = []
+        for retries in range(6):
+            timeouts.append(self.sender.next_timeout())
+            self.clock.now += timeouts[-1]
+            self.sender.poll()
+        self.assertEqual(timeouts, [0.25, 0.5, 1.0, 2.0, 2.0, 2.0])
+
+    def test_holes_are_retransmitted_on_selective_ack(self):
+        for value in range(3):
+            self.sender.send(bytes([value]))
+        self.clock.now = 0.05
+        self.sender.ack(ack(1, 0, 0b11))
+        self.assertEqual(list(self.sender.pending), [0])
+        self.assertEqual(self.sender.retransmitted, 1)
+        self.assertEqual(self.frames[-1], self.frames[0])
+
+    def test_other_session_is_ignored(self):
+        self.sender.send(b'\x01')
+        self.sender.ack(ack(2, 1))
+        self.assertEqual(list(self.sender.pending), [0])
+
+
+class LossyLinkTest(unittest.TestCase):
+    """Frames sent over a link that loses and reorders datagrams both ways."""
+
+    def run_link(self, loss, first_sequence=0, count=2000, rate=500):
+        clock = Clock()
+        received = []
+        receiver = ReliableReceiver()
+        sender = ReliableSender(None, clock=clock, session=3)
+        sender.sequence = first_sequence
+        uplink = Link(clock, sender.ack, loss, seed=1)
+        downlink = Link(clock, lambda data: received.append(receiver.receive(data)), loss, seed=2)
+        receiver.send = uplink.send
+        sender.transmit = downlink.send
+        # The first frame gets through before any other, so the Pi's window starts at it.
+        downlink.loss = 0.0
+        sender.send(GRIPPER.encode(0, 1))
+        downlink.loss = loss
+        while downlink.queue:
+            clock.now += 1.0 / rate
+            downlink.run()
+        sent = 1
+        while sent < count or sender.pending or downlink.queue or uplink.queue:
+            clock.now += 1.0 / rate
+            if sent < count:
+                sender.send(GRIPPER.encode(sent % 256, 1) + sent.to_bytes(4, 'big'))
+                sent += 1
+            downlink.run()
+            uplink.run()
+            sender.poll()
+            self.assertLess(clock.now, 600)
+        return sender, receiver, [frame for frame in received if frame is not None]
+
+    def test_every_frame_arrives_once(self):
+        sender, receiver, frames = self.run_link(0.2, first_sequence=0xFF00)
+        expected = [GRIPPER.encode(0, 1)] + [GRIPPER.encode(n % 256, 1) + n.to_bytes(4, 'big')
+                                            for n in range(1, 2000)]
+        self.assertEqual(sorted(frames), sorted(expected))
+        self.assertEqual(len(set(frames)), len(frames))
+        self.assertEqual(sender.failed, 0)
+        self.assertGreater(sender.retransmitted, 0)
+        self.assertGreater(receiver.duplicates, 0)
+        self.assertEqual(sender.sequence, (0xFF00 + 2000) & 0xFFFF)
+
+    def test_without_loss(self):
+        sender, receiver, frames = self.run_link(0.0, count=200)
+        # Reordering alone sets off some early retransmissions, which are dropped.
+        self.assertEqual(len(frames), 200)
+        self.assertEqual(len(set(frames)), 200)
+        self.assertEqual(receiver.duplicates, sender.retransmitted)
+        self.assertEqual(sender.failed, 0)
+
+    def test_give_up_on_dead_link(self):
+        with self.assertLogs('Communication.reliable', 'WARNING') as logs:
+            sender, receiver, frames = self.run_link(1.0, count=5)
+        self.assertEqual(len(logs.records), 5)
+        self.assertEqual(frames, [GRIPPER.encode(0, 1)])
+        # The first frame arrived, but its acknowledgement never did.
+        self.assertEqual(sender.failed, 5)
+        self.assertEqual(sender.retransmitted, 5 * sender.max_retries)
+        self.assertEqual(sender.sent, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
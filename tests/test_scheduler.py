@@ -0,0 +1,130 @@
+import unittest
+
+from Communication.commands import LINK_STATS, SENSOR_STATS
+from Communication.protocol import ACK, HEARTBEAT, TELEMETRY, encode_batch
+from Communication.scheduler import (BULK, DEFAULT_LIMITS, DEFAULT_QUEUE_LIMITS, REPLY, SAFETY, PriorityScheduler,
+                                     TokenBucket, priority_of)
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def telemetry(serial, size=200):
+    return bytes([TELEMETRY]) + serial.to_bytes(4, 'big') + bytes(size - 5)
+
+
+class PriorityTest(unittest.TestCase):
+    def test_priority_of(self):
+        self.assertEqual(priority_of(bytes([ACK]) + bytes(9)), SAFETY)
+        self.assertEqual(priority_of(bytes([HEARTBEAT]) + bytes(8)), SAFETY)
+        self.assertEqual(priority_of(SENSOR_STATS.encode(1, 0, 5, 0, 0, 0, 0)), REPLY)
+        self.assertEqual(priority_of(LINK_STATS.encode(*[0] * 9)), REPLY)
+        self.assertEqual(priority_of(encode_batch([SENSOR_STATS.encode(1, 0, 5, 0, 0, 0, 0)])), REPLY)
+        self.assertEqual(priority_of(telemetry(0)), BULK)
+        self.assertEqual(priority_of(encode_batch([])), BULK)
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_rate_and_burst(self):
+        clock = Clock()
+        bucket = TokenBucket(1000, 100, clock)
+        self.assertTrue(bucket.take(60))
+        self.assertFalse(bucket.take(60))
+        self.assertAlmostEqual(bucket.wait_time(60), 0.02)
+        clock.now = 0.02
+        self.assertTrue(bucket.take(60))
+        clock.now = 10.0
+        self.assertEqual(bucket.wait_time(100), 0.0)
+        self.assertTrue(bucket.take(100))
+        self.assertFalse(bucket.take(1))
+
+    def test_frame_larger_than_burst(self):
+        clock = Clock()
+        bucket = TokenBucket(1000, 100, clock)
+        self.assertTrue(bucket.take(500))
+        self.assertAlmostEqual(bucket.wait_time(500), 0.1)
+        clock.now = 0.1
+        self.assertTrue(bucket.take(500))
+
+
+class FloodTest(unittest.TestCase):
+    """Telemetry floods the scheduler at several times its budget while safety frames and replies go out."""
+
+    def setUp(self):
+        self.clock = Clock()
+        self.sent = []
+        self.scheduler = PriorityScheduler(self.transmit, clock=self.clock)
+
+    def transmit(self, frame):
+        self.sent.append((self.clock.now, priority_of(frame), frame))
+
+    def flood(self, seconds, flood=200000, size=200):
+        """Submit telemetry at ``flood`` bytes per second, and an ack and a reply every 100 ms."""
+        steps = int(seconds * 1000)
+        serial = 0
+        urgent = []
+        for step in range(steps):
+            self.clock.now = step / 1000.0
+            for _ in range(flood // size // 1000):
+                self.scheduler.submit(telemetry(serial, size))
+                serial += 1
+            if step % 100 == 50:
+                for frame in (bytes([ACK]) + step.to_bytes(9, 'big'), SENSOR_STATS.encode(1, 0, step, 0, 0, 0, 0)):
+                    urgent.append((self.clock.now, frame))
+                    self.scheduler.submit(frame)
+            self.scheduler.flush()
+        return serial, urgent
+
+    def test_safety_and_replies_are_not_held_up(self):
+        serial, urgent = self.flood(2.0)
+        sent = {frame: when for when, priority, frame in self.sent}
+        for when, frame in urgent:
+            self.assertEqual(sent[frame], when)
+        self.assertEqual(self.scheduler.dropped[SAFETY], 0)
+        self.assertEqual(self.scheduler.dropped[REPLY], 0)
+        self.assertEqual(self.scheduler.pending()[:2], [0, 0])
+
+    def test_bulk_stays_within_budget(self):
+        rate, burst = DEFAULT_LIMITS[BULK]
+        self.flood(2.0)
+        for end in (0.5, 1.0, 1.999):
+            sent = sum(len(frame) for when, priority, frame in self.sent if priority == BULK and when <= end)
+            self.assertLessEqual(sent, burst + rate * end)
+            self.assertGreater(sent, rate * end * 0.9)
+
+    def test_oldest_bulk_frames_are_dropped(self):
+        serial, urgent = self.flood(2.0)
+        queued = list(self.scheduler.queues[BULK])
+        limit = DEFAULT_QUEUE_LIMITS[BULK]
+        self.assertEqual(len(queued), limit)
+        self.assertEqual([int.from_bytes(frame[1:5], 'big') for frame in queued], list(range(serial - limit, serial)))
+        serials = [int.from_bytes(frame[1:5], 'big') for when, priority, frame in self.sent if priority == BULK]
+        self.assertEqual(serials, sorted(serials))
+        self.assertEqual(self.scheduler.sent[BULK] + self.scheduler.dropped[BULK] + limit, serial)
+        self.assertGreater(self.scheduler.dropped[BULK], serial // 2)
+
+    def test_priority_order_within_flush(self):
+        scheduler = self.scheduler
+        scheduler.limit(BULK, 1000, 200)
+        scheduler.submit(telemetry(0))
+        scheduler.submit(telemetry(1))
+        self.assertEqual(scheduler.pending(), [0, 0, 1])
+        scheduler.limit(REPLY, 1000, 100)
+        reply = SENSOR_STATS.encode(1, 0, 1, 0, 0, 0, 0)
+        scheduler.submit(bytes(100), REPLY)
+        self.assertIsNotNone(scheduler.submit(reply))
+        ack = bytes([ACK]) + bytes(9)
+        scheduler.submit(ack)
+        self.assertEqual(self.sent[-1][2], ack)
+        self.clock.now = 1.0
+        self.assertIsNone(scheduler.flush())
+        self.assertEqual([frame for when, priority, frame in self.sent[-2:]], [reply, telemetry(1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+
+from Communication.subscriptions import subscriptions
+from Peripherals.Sensors import sampling
+from Peripherals.Sensors.bus import BusManager, BusSensor, SimulatedBus
+
+
+class RecordingBus(SimulatedBus):
+    def __init__(self):
+        SimulatedBus.__init__(self, overhead=0.0)
+        self.reads = []
+
+    def transfer(self, reads):
+        self.reads.append([read.address for read in reads])
+        return SimulatedBus.transfer(self, reads)
+
+
+class BusManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.bus = RecordingBus()
+        self.manager = BusManager(self.bus)
+        self.fast = BusSensor(self.manager, 0x28, 0x08, '<6h')
+        self.slow = BusSensor(self.manager, 0x76, 0x00, '>I')
+
+    def test_refresh_reads_expected_sensors(self):
+        self.fast.expect()
+        self.slow.expect()
+        self.fast.read()
+        self.slow.read()
+        self.fast.expect()
+        self.fast.read()
+        self.assertEqual(self.bus.reads, [[0x28, 0x76], [0x28]])
+
+    def test_poll_due_reads_only_due_sensors(self):
+        for sensor, backend, fields, rate in ((200, self.fast, 6, 1000.0), (201, self.slow, 1, 0.001)):
+            sampling.register(sensor, ('value',) * fields, backend)
+            subscriptions.subscribe(sensor, 'test', rate)
+            self.addCleanup(sampling.due.pop, sensor, None)
+            self.addCleanup(subscriptions.unsubscribe, sensor, 'test')
+            self.addCleanup(sampling.backends.pop, sensor)
+            self.addCleanup(sampling.buffers.pop, sensor)
+        sampling.poll_due()
+        sampling.due[200] = 0.0
+        sampling.poll_due()
+        self.assertEqual(self.bus.reads, [[0x28, 0x76], [0x28]])
+
+
+if __name__ == '__main__':
+    unittest.main()
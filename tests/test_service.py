@@ -0,0 +1,40 @@
+import asyncio
+import unittest
+
+from Communication.commands import SERVO_POSITION
+from Communication.packed import encode_packed
+from Communication.profiling import ON, Profiler
+from Communication.protocol import BATCH, PACKED, encode_batch
+from Communication.service import CommandProtocol
+
+
+class ProfilingTest(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.protocol = CommandProtocol({SERVO_POSITION.opcode: lambda *values: self.calls.append(values)},
+                                        profiler=Profiler())
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        loop.run_until_complete(self.connect())
+        self.protocol.profile(ON)
+
+    async def connect(self):
+        self.protocol.connection_made(None)
+
+    def test_empty_frames(self):
+        for frame in (encode_batch([]), encode_packed([])):
+            self.protocol.handle(frame)
+        self.assertEqual(self.protocol.dropped, 0)
+        self.assertEqual(self.calls, [])
+        self.assertEqual(self.protocol.profiler.profile(BATCH).parse.count, 1)
+        self.assertEqual(self.protocol.profiler.profile(PACKED).parse.count, 1)
+
+    def test_commands_are_timed(self):
+        self.protocol.handle(SERVO_POSITION.encode(2, 1500))
+        self.protocol.handle(encode_batch([SERVO_POSITION.encode(3, 1600)]))
+        self.assertEqual(self.calls, [(2, 1500), (3, 1600)])
+        self.assertEqual(self.protocol.profiler.profile(SERVO_POSITION.opcode).count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+
+import numpy as np
+
+from Communication.protocol import ProtocolError
+from Communication.telemetry import HEADER, KEYFRAME, TelemetryDecoder, TelemetryEncoder
+
+
+class RoundtripTest(unittest.TestCase):
+    def setUp(self):
+        self.encoder = TelemetryEncoder(10, keyframe_interval=5)
+        self.decoder = TelemetryDecoder(10)
+        self.values = np.arange(10, dtype=np.float32)
+
+    def send(self, values=None):
+        frame = self.encoder.encode(self.values if values is None else values)
+        return frame, self.decoder.decode(frame)
+
+    def test_keyframe_carries_every_channel(self):
+        frame, decoded = self.send()
+        self.assertTrue(frame[3] & KEYFRAME)
+        self.assertEqual(len(frame), HEADER.size + 2 + 10 * 4)
+        np.testing.assert_array_equal(decoded, self.values)
+
+    def test_unchanged_channels_are_left_out(self):
+        self.send()
+        frame, decoded = self.send()
+        self.assertFalse(frame[3] & KEYFRAME)
+        self.assertEqual(len(frame), HEADER.size + 2)
+        np.testing.assert_array_equal(decoded, self.values)
+
+        self.values[[0, 9]] = [-1.5, 100.25]
+        frame, decoded = self.send()
+        self.assertEqual(frame[HEADER.size:HEADER.size + 2], bytes([0b1, 0b10]))
+        self.assertEqual(len(frame), HEADER.size + 2 + 2 * 4)
+        np.testing.assert_array_equal(decoded, self.values)
+
+    def test_channels_without_samples(self):
+        self.values[3] = np.nan
+        np.testing.assert_array_equal(self.send()[1], self.values)
+        self.values[3] = 7.0
+        frame, decoded = self.send()
+        self.assertEqual(len(frame), HEADER.size + 2 + 4)
+        np.testing.assert_array_equal(decoded, self.values)
+
+    def test_deadband(self):
+        self.encoder = TelemetryEncoder(10, deadband=0.5, keyframe_interval=5)
+        self.send()
+        sent = self.values.copy()
+        self.values += 0.25
+        frame, decoded = self.send()
+        self.assertEqual(len(frame), HEADER.size + 2)
+        np.testing.assert_array_equal(decoded, sent)
+        self.values += 0.5
+        np.testing.assert_array_equal(self.send()[1], self.values)
+
+    def test_recovery_after_lost_frame(self):
+        self.send()
+        self.values[2] = 20.0
+        self.encoder.encode(self.values)  # lost
+        self.values[4] = 40.0
+        for tick in range(2, 5):
+            frame, decoded = self.send()
+            self.assertIsNone(decoded)
+        self.assertEqual(self.decoder.lost, 1)
+        frame, decoded = self.send()
+        self.assertTrue(frame[3] & KEYFRAME)
+        np.testing.assert_array_equal(decoded, self.values)
+        self.values[5] = 50.0
+        np.testing.assert_array_equal(self.send()[1], self.values)
+
+    def test_sequence_wraps(self):
+        self.encoder.sequence = 0xFFFA
+        for tick in range(10):
+            self.values[tick] += 1
+            np.testing.assert_array_equal(self.send()[1], self.values)
+        self.assertEqual(self.decoder.lost, 0)
+
+    def test_malformed_frames(self):
+        frame, decoded = self.send()
+        for data in (frame[:HEADER.size - 1], frame[:-1], frame + b'\x00'):
+            with self.assertRaises(ProtocolError):
+                self.decoder.decode(data)
+        with self.assertRaises(ProtocolError):
+            TelemetryDecoder(11).decode(frame)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,22 @@
+import unittest
+
+from Communication.protocol import ProtocolError
+from Communication.subscriptions import subscriptions
+from Communication.topics import MEAN, TopicPublisher
+from Peripherals.Sensors.sampling import RingBuffer
+
+
+class TopicPublisherTest(unittest.TestCase):
+    def test_bad_reduction_keeps_topic(self):
+        publisher = TopicPublisher(uplink=None)
+        ring = RingBuffer(('depth',), 16)
+        publisher.subscribe(7, 0, ring, 10, MEAN)
+        self.addCleanup(publisher.subscribe, 7, 0, ring, 0)
+        with self.assertRaises(ProtocolError):
+            publisher.subscribe(7, 0, ring, 20, 9)
+        self.assertEqual(publisher.topics[7].period, 0.1)
+        self.assertEqual(subscriptions.rate(0), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import signal
+import threading
+import unittest
+
+from Communication.commands import SERVO_POSITION, STOP, SUBSCRIBE
+from Communication.dispatch import build_registry
+from Communication.subscriptions import subscriptions
+from Communication.workers import WorkerProcess, parent_packages, run_worker
+from Peripherals.backends import SimulatedActuator
+from Peripherals.Motors import Servo, Thruster
+from Peripherals.Sensors import IMU
+
+
+class WorkerTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = build_registry()
+        handler = signal.getsignal(signal.SIGINT)
+        self.addCleanup(signal.signal, signal.SIGINT, handler)
+
+    def worker(self, modules):
+        worker = WorkerProcess(modules)
+        self.addCleanup(worker.stop)
+        return worker, worker.forwarders(self.registry, self.registry.handlers)
+
+    def run_worker(self, worker, seconds=0.2):
+        """Run the worker's main loop in this process for ``seconds``."""
+        worker.stopped.clear()
+        timer = threading.Timer(seconds, worker.stopped.set)
+        timer.start()
+        run_worker(worker.modules, worker.commands.name, worker.commands.lock, worker.readings.name,
+                   worker.readings.lock, worker.stopped)
+        timer.join()
+
+    def test_parent_packages(self):
+        self.assertEqual(parent_packages(['Peripherals.Motors.Servo', 'Peripherals.Motors.Thruster']),
+                         ['Peripherals', 'Peripherals.Motors'])
+        self.assertEqual(parent_packages(['Peripherals', 'Peripherals.Motors']), [])
+
+    def test_servo_position_is_written_by_worker(self):
+        worker, handlers = self.worker(['Peripherals.Motors.Servo'])
+        backend = SimulatedActuator()
+        self.addCleanup(setattr, Servo, 'backend', Servo.backend)
+        Servo.backend = backend
+
+        handlers[SERVO_POSITION.opcode](3, 1500)
+        self.assertEqual(len(worker.commands), 1)
+        self.assertEqual(backend.outputs, {})
+        self.run_worker(worker)
+        self.assertEqual(len(worker.commands), 0)
+        self.assertEqual(backend.outputs, {3: 1500})
+
+    def test_stop_runs_locally_and_is_forwarded(self):
+        worker, handlers = self.worker(['Peripherals.Motors'])
+        backend = SimulatedActuator()
+        self.addCleanup(setattr, Thruster, 'backend', Thruster.backend)
+        self.addCleanup(Thruster.throttles.clear)
+        Thruster.backend = backend
+        Thruster.throttles[2] = 1000
+
+        handlers[STOP.opcode]()
+        self.assertEqual(backend.outputs, {2: 0})
+        self.assertEqual(bytes(worker.commands.get()), STOP.encode())
+
+
+    def readings(self, worker):
+        count = 0
+        while worker.readings.peek() is not None:
+            worker.readings.advance()
+            count += 1
+        return count
+
+    def test_sensors_follow_subscriptions(self):
+        worker, handlers = self.worker(['Peripherals.Sensors.IMU'])
+        self.addCleanup(subscriptions.unsubscribe, IMU.SENSOR_ID, 'test')
+        self.run_worker(worker)
+        self.assertEqual(self.readings(worker), 0)
+
+        subscriptions.subscribe(IMU.SENSOR_ID, 'test', 49.5)
+        worker.subscribe()
+        worker.subscribe()
+        self.assertEqual(len(worker.commands), 1)
+        self.assertEqual(bytes(worker.commands.peek()), SUBSCRIBE.encode(IMU.SENSOR_ID, 50))
+        self.run_worker(worker)
+        self.assertTrue(5 <= self.readings(worker) <= 12)
+
+        subscriptions.unsubscribe(IMU.SENSOR_ID, 'test')
+        worker.subscribe()
+        self.run_worker(worker)
+        self.assertEqual(self.readings(worker), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()